@@ -30,6 +30,8 @@ class Config(SingletonClass):
     GOOGLE_SERVICE_KEY_FILE_NAME: str
 
     TELEGRAM_BOT_TOKEN: str
+    INFLUX_DB_HOST: str
+    INFLUX_DB_TOKEN: str
     MONGO_DB_HOST: str
     MONGO_DB_USERNAME: str
     MONGO_DB_PASSWORD: str
@@ -38,6 +40,8 @@ class Config(SingletonClass):
     TIMESCALE_DB_USERNAME: str
     TIMESCALE_DB_PASSWORD: str
     TIMESCALE_DB_INIT_SQL_FILE: str
+    TIMESCALE_DB_POOL_MIN_SIZE: int
+    TIMESCALE_DB_POOL_MAX_SIZE: int
     DATA_COLLECTOR_ITEMS_COUNT: str
     ORACLE_SYMBOLS_COUNT: int
     ORACLE_TFS: List[str]
@@ -54,7 +58,12 @@ class Config(SingletonClass):
     @staticmethod
     def get_timescale_db_params() -> Dict[str, Any]:
         return dict(host=Config.TIMESCALE_DB_HOST, username=Config.TIMESCALE_DB_USERNAME,
-                    password=Config.TIMESCALE_DB_PASSWORD)
+                    password=Config.TIMESCALE_DB_PASSWORD, pool_min_size=Config.TIMESCALE_DB_POOL_MIN_SIZE,
+                    pool_max_size=Config.TIMESCALE_DB_POOL_MAX_SIZE)
+
+    @staticmethod
+    def get_influx_db_params() -> Dict[str, Any]:
+        return dict(host=Config.INFLUX_DB_HOST, token=Config.INFLUX_DB_TOKEN)
 
     @staticmethod
     def load_from_env(root_path: Optional[str] = ".", env_file_name: Optional[str] = '.env'):
@@ -71,8 +80,8 @@ class Config(SingletonClass):
         Config.GOOGLE_SERVICE_KEY_FILE_NAME = os.getenv("GOOGLE_SERVICE_KEY_FILE_NAME")
 
         Config.TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-        # INFLUX_DB_HOST = os.getenv("INFLUX_DB_HOST")
-        # INFLUX_DB_TOKEN = os.getenv("INFLUX_DB_TOKEN")
+        Config.INFLUX_DB_HOST = os.getenv("INFLUX_DB_HOST")
+        Config.INFLUX_DB_TOKEN = os.getenv("INFLUX_DB_TOKEN")
         Config.MONGO_DB_HOST = os.getenv("MONGO_DB_HOST")
         Config.MONGO_DB_USERNAME = os.getenv("MONGO_DB_USERNAME")
         Config.MONGO_DB_PASSWORD = os.getenv("MONGO_DB_PASSWORD")
@@ -81,6 +90,8 @@ class Config(SingletonClass):
         Config.TIMESCALE_DB_USERNAME = os.getenv("POSTGRES_USER")
         Config.TIMESCALE_DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
         Config.TIMESCALE_DB_INIT_SQL_FILE = os.getenv("TIMESCALE_DB_INIT_SQL_FILE")
+        Config.TIMESCALE_DB_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", 2))
+        Config.TIMESCALE_DB_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", 10))
         Config.DATA_COLLECTOR_ITEMS_COUNT = os.getenv("DATA_COLLECTOR_ITEMS_COUNT", 2)
         Config.ORACLE_SYMBOLS_COUNT = int(os.getenv("ORACLE_SYMBOLS_COUNT", 20))
         Config.ORACLE_TFS = os.getenv("ORACLE_TFS", "1d,4h,1h,15m").split(",")
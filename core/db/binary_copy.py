@@ -0,0 +1,157 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+COPY_HEADER_SIZE = len(COPY_SIGNATURE) + 8  # + flags int32 + header extension length int32
+PG_EPOCH_US = 946684800000000  # 2000-01-01 in unix microseconds
+BINARY_COPY_CAPACITY = 4096
+BINARY_COPY_MAX_CAPACITY = 1000000  # max rows preallocated from a hint, more - columns grow
+
+# postgres type -> big endian wire dtype
+BINARY_TYPES: Dict[str, str] = {
+    "timestamp": ">i8",  # microseconds since 2000-01-01, TIMESTAMP without time zone
+    "float8": ">f8",
+    "int8": ">i8",
+    "int4": ">i4",
+    "bool": "?",
+}
+
+CANDLES_BINARY_COLUMNS = [("timestamp", "timestamp"), ("o", "float8"), ("h", "float8"), ("l", "float8"),
+                          ("c", "float8"), ("v", "float8")]
+CANDLES_COPY_COLUMNS = [("timestamp", "timestamp"), ("symbol_tf_id", "int4"), ("o", "float8"), ("h", "float8"),
+                        ("l", "float8"), ("c", "float8"), ("v", "float8")]
+TRADES_BINARY_COLUMNS = [("timestamp", "timestamp"), ("symbol_tf_id", "int4"), ("price", "float8"),
+                         ("volume", "float8"), ("is_buyer", "bool")]
+
+
+def get_row_dtype(columns: List[Tuple[str, str]]) -> np.dtype:
+    # int16 field count, then int32 size + value of every field
+    fields = [("fields", ">i2")]
+    for name, pg_type in columns:
+        fields += [(f"{name}_size", ">i4"), (name, BINARY_TYPES[pg_type])]
+    return np.dtype(fields)
+
+
+def encode_binary_copy(columns: List[Tuple[str, str]], values: Dict[str, np.ndarray]) -> bytes:
+    # numpy columns -> `COPY table FROM STDIN (FORMAT binary)` stream (no NULLs)
+    size = len(values[columns[0][0]])
+    rows = np.empty(size, dtype=get_row_dtype(columns))
+    rows["fields"] = len(columns)
+    for name, pg_type in columns:
+        rows[f"{name}_size"] = np.dtype(BINARY_TYPES[pg_type]).itemsize
+        if pg_type == "timestamp":
+            rows[name] = values[name].astype("datetime64[us]").astype(np.int64) - PG_EPOCH_US
+        else:
+            rows[name] = values[name]
+
+    return COPY_SIGNATURE + bytes(8) + rows.tobytes() + (-1).to_bytes(2, "big", signed=True)
+
+
+class BinaryCopyParser(object):
+    # `COPY (query) TO STDOUT (FORMAT binary)` -> preallocated numpy columns, no per row python objects.
+    # Without NULLs every row has the same size (int16 field count + int32 length and value per field),
+    # so each received chunk is parsed at once with a structured big endian dtype.
+    def __init__(self, columns: List[Tuple[str, str]], capacity: int = BINARY_COPY_CAPACITY):
+        self.names = [name for name, _ in columns]
+        self.row_dtype = get_row_dtype(columns)
+        self.types = dict(columns)
+        self.value_sizes = {name: np.dtype(BINARY_TYPES[pg_type]).itemsize for name, pg_type in columns}
+
+        capacity = max(capacity, 1)
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.empty(capacity, dtype=self.row_dtype[name].newbyteorder("=")) for name in self.names
+        }
+        self.count = 0
+        self._buffer = bytearray()
+        self._header_parsed = False
+
+    def _parse_header(self) -> bool:
+        if len(self._buffer) < COPY_HEADER_SIZE:
+            return False
+
+        if bytes(self._buffer[:len(COPY_SIGNATURE)]) != COPY_SIGNATURE:
+            raise ValueError("Not a binary COPY stream")
+
+        extension_size = int.from_bytes(self._buffer[COPY_HEADER_SIZE - 4:COPY_HEADER_SIZE], "big")
+        if len(self._buffer) < COPY_HEADER_SIZE + extension_size:
+            return False
+
+        del self._buffer[:COPY_HEADER_SIZE + extension_size]
+        self._header_parsed = True
+        return True
+
+    def _reserve(self, size: int):
+        capacity = len(self.columns[self.names[0]])
+        if size <= capacity:
+            return
+
+        capacity = max(size, capacity * 2)
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            self.columns[name] = grown
+
+    def write(self, chunk: bytes):
+        self._buffer += chunk
+        if not self._header_parsed and not self._parse_header():
+            return
+
+        # the trailer (int16 -1) is shorter than a row and stays in the buffer
+        n = len(self._buffer) // self.row_dtype.itemsize
+        if n == 0:
+            return
+
+        rows = np.frombuffer(self._buffer, dtype=self.row_dtype, count=n)
+        if (rows["fields"] != len(self.names)).any():
+            raise ValueError("Unexpected number of fields in binary COPY stream")
+        for name in self.names:
+            if (rows[f"{name}_size"] != self.value_sizes[name]).any():
+                raise ValueError(f"NULL or variable size value in column {name}")
+
+        self._reserve(self.count + n)
+        for name in self.names:
+            self.columns[name][self.count:self.count + n] = rows[name]
+        self.count += n
+
+        del rows  # release the buffer export before resizing it
+        del self._buffer[:n * self.row_dtype.itemsize]
+
+    async def feed(self, chunk: bytes):
+        # output for asyncpg copy_from_query
+        self.write(chunk)
+
+    def column(self, name: str) -> np.ndarray:
+        values = self.columns[name][:self.count]
+        if self.types[name] == "timestamp":
+            return (values + PG_EPOCH_US).astype("datetime64[us]").astype("datetime64[ns]")
+        return values
+
+    def to_data_frame(self, index: Optional[str] = None) -> pd.DataFrame:
+        df = pd.DataFrame({name: self.column(name) for name in self.names}, copy=False)
+        return df.set_index(index) if index is not None else df
+
+
+if __name__ == "__main__":
+    # hand made binary COPY stream fed in uneven chunks, encoder round trip
+    import struct
+    from datetime import datetime, timedelta
+
+    rows_ = [(datetime(2022, 1, 1) + timedelta(minutes=i), 1.0 + i, 2.0, 0.5, 1.5, 10.0 * i) for i in range(1000)]
+    stream = bytearray(COPY_SIGNATURE + struct.pack(">ii", 0, 0))
+    for ts, *values in rows_:
+        us = int((ts - datetime(2000, 1, 1)).total_seconds() * 1e6)
+        stream += struct.pack(">hiq", 6, 8, us) + b"".join(struct.pack(">id", 8, v) for v in values)
+    stream += struct.pack(">h", -1)
+
+    parser = BinaryCopyParser(CANDLES_BINARY_COLUMNS, capacity=16)
+    for i in range(0, len(stream), 1001):
+        parser.write(bytes(stream[i:i + 1001]))
+
+    expected = pd.DataFrame(rows_, columns=["timestamp", "o", "h", "l", "c", "v"]).set_index("timestamp")
+    pd.testing.assert_frame_equal(parser.to_data_frame("timestamp"), expected, check_index_type=False)
+
+    values_ = {name: parser.column(name) for name in parser.names}
+    assert encode_binary_copy(CANDLES_BINARY_COLUMNS, values_) == bytes(stream)
+    print(parser.to_data_frame("timestamp").tail())
@@ -1,15 +1,13 @@
 import asyncio
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 import pandas as pd
 from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
-from influxdb_client.client.influxdb_client import InfluxDBClient
 from influxdb_client.client.write_api import PointSettings
 
 from config import Config
-from core.exchange.common.mappers import symbol_to_binance
-from core.types import Singleton, Symbol, Tf
+from core.types import Singleton, SymbolStr, Tf
 from core.utils.data import candles_to_data_frame
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import logging
@@ -17,7 +15,11 @@ CANDLES_TABLE_NAME = "candles"
 BUCKET_NAME = "dasein_bucket"
 ORG_NAME = "daseincore_org"
 ABSOLUTE_BEGIN_DATE = "2017-02-10T00:00:00Z"
-SYNC_MODE = True
+INFLUX_DB_PORT = 8086
+INFLUX_DB_TIMEOUT = 30000  # ms
+INFLUX_WRITE_BATCH_SIZE = 5000  # rows per write request (line protocol is built from the DataFrame at once)
+CANDLES_COLUMNS = ["o", "h", "l", "c", "v"]
+
 
 def get_time_where_condition(
         ts_from: Optional[datetime] = None, ts_to: Optional[datetime] = None
@@ -32,70 +34,84 @@ def get_time_where_condition(
     return f"range(start: {ABSOLUTE_BEGIN_DATE})"
 
 
+def get_measurement(symbol: SymbolStr, tf: Tf) -> str:
+    return f'{CANDLES_TABLE_NAME}.{symbol}.{tf}'
+
+
 class InfluxDb(object, metaclass=Singleton):
-    def __init__(self, host: str, token: str):
+    # InfluxDBClientAsync only - writes and queries are awaited on aiohttp, nothing blocks the event loop
+    def __init__(self, host: str, token: str, port: int = INFLUX_DB_PORT, timeout: int = INFLUX_DB_TIMEOUT,
+                 write_batch_size: int = INFLUX_WRITE_BATCH_SIZE):
         self.host = host
         self.token = token
-        self.client: Optional[InfluxDBClientAsync, InfluxDBClient] = None
+        self.url = f"http://{host}:{port}/"
+        self.timeout = timeout
+        self.write_batch_size = write_batch_size
+        self.client: Optional[InfluxDBClientAsync] = None
         self.init_time = datetime.utcnow()
 
     async def init(self):
-        self.client = self._get_client()
-
-    def _get_client(self):
-        if SYNC_MODE:
-            return InfluxDBClient(
-                url=f"mongodb://{self.host}:8086/", token=self.token, org=ORG_NAME, enable_gzip=False,
-            )
+        if self.client is None:
+            logging.info(f"Init InfluxDB at {self.url}")
+            # the async client must be created inside the running loop
+            self.client = InfluxDBClientAsync(url=self.url, token=self.token, org=ORG_NAME,
+                                              timeout=self.timeout, enable_gzip=False)
 
-        return InfluxDBClientAsync(
-            url=f"http://{self.host}:8086/", token=self.token, org=ORG_NAME, enable_gzip=False,
-        )
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
 
     @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=2, max=10),
            retry=retry_if_exception_type(asyncio.exceptions.TimeoutError))
-    async def save_candles(self, symbol: Symbol, tf: Tf, candles: pd.DataFrame):
-        point_settings = PointSettings(tf=tf, symbol=symbol_to_binance(symbol))
+    async def save_candles(self, symbol: SymbolStr, tf: Tf, candles: pd.DataFrame):
         logging.info(f"Save candles {symbol} {tf} - {len(candles)} {datetime.utcnow() - self.init_time}")
-        measurement = f'{CANDLES_TABLE_NAME}.{symbol_to_binance(symbol)}.{tf}'
-        self.client.write_api(point_settings=point_settings).write(
-            bucket=BUCKET_NAME,
-            record=candles,
-            data_frame_measurement_name=measurement,
-        )
+        write_api = self.client.write_api(point_settings=PointSettings(tf=tf, symbol=symbol))
+        measurement = get_measurement(symbol, tf)
+        candles = candles[CANDLES_COLUMNS]
+        for i in range(0, len(candles), self.write_batch_size):
+            await write_api.write(
+                bucket=BUCKET_NAME,
+                record=candles.iloc[i:i + self.write_batch_size],
+                data_frame_measurement_name=measurement,
+            )
+
+    async def save_candles_many(self, candles_by_symbol: Dict[Tuple[SymbolStr, Tf], pd.DataFrame]):
+        await asyncio.gather(*[self.save_candles(symbol, tf, candles)
+                               for (symbol, tf), candles in candles_by_symbol.items()])
 
     @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=2, max=10),
            retry=retry_if_exception_type(asyncio.exceptions.TimeoutError))
     async def load_candles(
             self,
-            symbol: Symbol,
+            symbol: SymbolStr,
             tf: Tf,
             start_time: Optional[datetime] = None,
             end_time: Optional[datetime] = None,
     ) -> pd.DataFrame:
-        symbol_str = symbol_to_binance(symbol)
         timestamp_range = get_time_where_condition(start_time, end_time)
         logging.info(f"Load candles {symbol} {tf} -  {datetime.utcnow() - self.init_time}")
-        measurement = f'{CANDLES_TABLE_NAME}.{symbol_to_binance(symbol)}.{tf}'
+        measurement = get_measurement(symbol, tf)
 
         query = f'from(bucket:"{BUCKET_NAME}")\
         |> {timestamp_range}\
         |> filter(fn:(r) => r._measurement == "{measurement}")\
         |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")\
         |> keep(columns: ["_time", "o", "h", "l", "c", "v"])'
-        data = self.client.query_api().query_data_frame(query)
 
-        if len(data) == 0:
+        # response is parsed while it is received, a DataFrame per chunk
+        chunks = [chunk async for chunk in await self.client.query_api().query_data_frame_stream(query)]
+        chunks = [chunk for chunk in chunks if len(chunk) > 0]
+        if len(chunks) == 0:
             return candles_to_data_frame([])
 
-        del data["result"]
-        del data["table"]
+        data = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
         data["_time"] = data["_time"].dt.tz_localize(None)
-        return data.set_index("_time")
+        data = data.rename(columns={"_time": "timestamp"}).set_index("timestamp")[CANDLES_COLUMNS]
+        return data.sort_index() if not data.index.is_monotonic_increasing else data
 
-    async def load_last_candle_timestamp(self, symbol: Symbol, tf: Tf):
-        symbol_str = symbol_to_binance(symbol)
-        measurement = f'{CANDLES_TABLE_NAME}.{symbol_to_binance(symbol)}.{tf}'
+    async def load_last_candle_timestamp(self, symbol: SymbolStr, tf: Tf) -> Optional[datetime]:
+        measurement = get_measurement(symbol, tf)
 
         query = f'from(bucket:"{BUCKET_NAME}")\
         |> range(start: 0)\
@@ -103,20 +119,22 @@ class InfluxDb(object, metaclass=Singleton):
         |> filter(fn: (r) => r["_field"] == "c")\
         |> last()'
 
-        data = self.client.query_api().query(query)
+        data = await self.client.query_api().query(query)
         if len(data) == 0:
             return None
 
-        return data[0].records[0].values["_time"]
+        return data[0].records[0].values["_time"].replace(tzinfo=None)
 
 
 if __name__ == "__main__":
     async def main():
         logging.getLogger().setLevel(logging.INFO)
-        db = InfluxDb()
+        Config.load_from_env()
+        db = InfluxDb(**Config.get_influx_db_params())
         await db.init()
-        item = await db.load_candles(("BNB", "USDT"), Tf("1d"))
+        item = await db.load_candles("BNBUSDT", Tf("1d"))
         print(item)
+        await db.close()
 
 
     asyncio.run(main())
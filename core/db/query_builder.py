@@ -0,0 +1,46 @@
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Union
+
+
+class Where(object):
+    # WHERE conditions with $n parameters instead of inlined values - the query text depends only on
+    # which conditions are used, so prepared statements are reused (asyncpg statement cache).
+    # Lists are passed as one array parameter: `column = ANY($n)`.
+    def __init__(self, *args: Any):
+        self.conditions: List[str] = []
+        self.args: List[Any] = list(args)  # args of the query placed before the conditions
+
+    def param(self, value: Any) -> str:
+        self.args.append(value)
+        return f"${len(self.args)}"
+
+    def add(self, condition: str) -> "Where":
+        self.conditions.append(condition)
+        return self
+
+    def eq(self, column: str, value: Any) -> "Where":
+        return self.add(f"{column} = {self.param(value)}")
+
+    def any(self, column: str, values: Sequence[Any]) -> "Where":
+        return self.add(f"{column} = ANY({self.param(list(values))})")
+
+    def eq_or_any(self, column: str, value: Union[Any, Sequence[Any]]) -> "Where":
+        if isinstance(value, (list, tuple, set)):
+            return self.any(column, value)
+        return self.eq(column, value)
+
+    def time_range(self, ts_from: Optional[datetime] = None, ts_to: Optional[datetime] = None,
+                   column: str = "timestamp") -> "Where":
+        # [ts_from, ts_to) - plain comparisons on the column, so the (symbol_tf_id, timestamp) index is used
+        if ts_from is not None:
+            self.add(f"{column} >= {self.param(ts_from)}")
+        if ts_to is not None:
+            self.add(f"{column} < {self.param(ts_to)}")
+        return self
+
+    @property
+    def sql(self) -> str:
+        return " AND ".join(self.conditions) if len(self.conditions) > 0 else "TRUE"
+
+    def __str__(self):
+        return self.sql
@@ -1,37 +1,44 @@
 import asyncio
+import io
 import asyncpg
+from contextlib import asynccontextmanager
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, Union, Dict, Any, List
 from urllib.parse import quote_plus
 
+import numpy as np
 import pandas as pd
 
 from config import Config
 from core.base import CoreBase
 
+from core.db.binary_copy import (
+    BINARY_COPY_CAPACITY,
+    BINARY_COPY_MAX_CAPACITY,
+    CANDLES_BINARY_COLUMNS,
+    CANDLES_COPY_COLUMNS,
+    TRADES_BINARY_COLUMNS,
+    BinaryCopyParser,
+    encode_binary_copy,
+)
+from core.db.query_builder import Where
+from core.db.trades_writer import TradesWriter, TradeRecord
 from core.types import Singleton, SymbolStr, Tf, Tuple, TaLevels
 from core.utils.data import candles_to_data_frame
+from core.utils.timeframe import tf_size_minutes
 import logging
 
-
-def get_timestamp_condition(ts_from: Optional[datetime] = None, ts_to: Optional[datetime] = None) -> str:
-    def format_date(date: datetime):
-        return date.strftime("%Y-%m-%d %H:%M:%S")
-
-    if ts_from is not None and ts_to is not None:
-        return f" timestamp >= '{format_date(ts_from)}' AND timestamp < '{format_date(ts_to)}' "
-    elif ts_from is not None and ts_to is None:
-        return f" timestamp >= '{format_date(ts_from)}' "
-    elif ts_from is None and ts_to is not None:
-        return f" timestamp < '{format_date(ts_to)}' "
-
-    return " 1=1"
+DB_POOL_MIN_SIZE = 2
+DB_POOL_MAX_SIZE = 10
+DB_STATEMENT_CACHE_SIZE = 256  # prepared statements per connection (asyncpg LRU by query text)
+CANDLES_VALUE_COLUMNS = ["o", "h", "l", "c", "v"]
 
 
 class TimesScaleDb(object, metaclass=Singleton):
     def __init__(self, host: str, username: str,
-                 password: str, use_pool=False):
+                 password: str, use_pool=False, pool_min_size: int = DB_POOL_MIN_SIZE,
+                 pool_max_size: int = DB_POOL_MAX_SIZE, statement_cache_size: int = DB_STATEMENT_CACHE_SIZE):
         self.host = host
         self.username = username
         self.password = password
@@ -40,6 +47,11 @@ class TimesScaleDb(object, metaclass=Singleton):
         self.init_time = datetime.utcnow()
         self.symbol_tf: Dict[Tuple[SymbolStr, Tf], int] = {}
         self.use_pool = use_pool
+        self.pool_min_size = pool_min_size
+        self.pool_max_size = pool_max_size
+        self.statement_cache_size = statement_cache_size
+        self._conn_lock: Optional[asyncio.Lock] = None
+        self.trades_writer = TradesWriter(self.save_trades)
 
     async def init(self, simple=False):
         if self.conn is None:
@@ -48,9 +60,11 @@ class TimesScaleDb(object, metaclass=Singleton):
                           password=self.password,
                           database="timescaledb",
                           host=self.host,
-                          port="5432")
+                          port="5432",
+                          statement_cache_size=self.statement_cache_size)
             if self.use_pool:
-                self.conn = await asyncpg.create_pool(**params)
+                self.conn = await asyncpg.create_pool(**params, min_size=self.pool_min_size,
+                                                      max_size=self.pool_max_size)
             else:
                 self.conn = await asyncpg.connect(**params)
 
@@ -58,29 +72,82 @@ class TimesScaleDb(object, metaclass=Singleton):
                 # await self.init_migration()
                 await self.init_symbols()
 
+    async def close(self):
+        await self.trades_writer.close()
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    @asynccontextmanager
+    async def acquire(self):
+        # pool - connection per caller (parallel queries), single connection - callers take turns
+        if self.use_pool:
+            async with self.conn.acquire() as conn:
+                yield conn
+        else:
+            if self._conn_lock is None:
+                self._conn_lock = asyncio.Lock()
+            async with self._conn_lock:
+                yield self.conn
+
+    # statements go through the connection statement cache - same query text is prepared once per connection
+    async def execute(self, sql: str, *args) -> str:
+        async with self.acquire() as conn:
+            return await conn.execute(sql, *args)
+
+    async def fetch(self, sql: str, *args) -> List[asyncpg.Record]:
+        async with self.acquire() as conn:
+            return await conn.fetch(sql, *args)
+
+    async def fetchrow(self, sql: str, *args) -> Optional[asyncpg.Record]:
+        async with self.acquire() as conn:
+            return await conn.fetchrow(sql, *args)
+
+    async def fetchval(self, sql: str, *args) -> Any:
+        async with self.acquire() as conn:
+            return await conn.fetchval(sql, *args)
+
+    async def copy_records_to_table(self, table: str, records: List[Tuple], columns: List[str], timeout: float = 10):
+        async with self.acquire() as conn:
+            return await conn.copy_records_to_table(table, records=records, columns=columns, timeout=timeout)
+
     async def init_migration(self):
         try:
             sql_file = open(Config.TIMESCALE_DB_INIT_SQL_FILE, 'r')
             sql = sql_file.read()
-            await self.conn.execute(sql)
+            await self.execute(sql)
         except Exception as e:
             logging.warning(e)
 
     async def fetch_as_dataframe(self, sql: str, *args):
-        if self.use_pool:
-            async with self.conn.acquire() as conn:
+        async with self.acquire() as conn:
+            data = await conn.fetch(sql, *args)
+            if len(data) > 0:
+                columns = list(data[0].keys())
+            else:
+                # no rows to take column names from
                 stmt = await conn.prepare(sql)
                 columns = [a.name for a in stmt.get_attributes()]
-                data = await stmt.fetch(*args)
-        else:
-            stmt = await self.conn.prepare(sql)
-            columns = [a.name for a in stmt.get_attributes()]
-            data = await stmt.fetch(*args)
         return pd.DataFrame(data, columns=columns)
 
+    async def copy_as_dataframe(self, sql: str, columns: List[Tuple[str, str]], *args,
+                                index: Optional[str] = None, capacity: int = BINARY_COPY_CAPACITY) -> pd.DataFrame:
+        # binary COPY parsed straight into numpy columns, `columns` - (name, postgres type) of the query.
+        # Falls back to fetch_as_dataframe when the result has NULLs
+        parser = BinaryCopyParser(columns, capacity)
+        try:
+            async with self.acquire() as conn:
+                await conn.copy_from_query(sql, *args, output=parser.feed, format="binary")
+        except ValueError as e:
+            logging.warning(f"Binary copy fallback: {e}")
+            df = await self.fetch_as_dataframe(sql, *args)
+            return df.set_index(index) if index is not None else df
+
+        return parser.to_data_frame(index)
+
     async def add_symbol(self, symbol: SymbolStr, tf: Tf):
         try:
-            id = await self.conn.fetchval(f"INSERT INTO symbol_tf(symbol, tf) VALUES('{symbol}', '{tf}') RETURNING id")
+            id = await self.fetchval("INSERT INTO symbol_tf(symbol, tf) VALUES($1, $2) RETURNING id", symbol, tf)
             logging.warning(f"{symbol}, {tf} ADDED id: {id}")
 
             self.symbol_tf[(symbol, tf)] = id
@@ -95,7 +162,7 @@ class TimesScaleDb(object, metaclass=Singleton):
         VALUES($1, $2, $3, $4) 
         ON CONFLICT (symbol_tf_id) DO UPDATE SET last_sync=$2, last_volume=$3, active=$4;"""
 
-        await self.conn.execute(statement, symbol_tf_id, last_sync, last_volume, active)
+        await self.execute(statement, symbol_tf_id, last_sync, last_volume, active)
 
     async def update_symbol_status_one_value(self, symbol: SymbolStr, last_sync: Optional[datetime] = None,
                                              last_volume: Optional[float] = None, active: Optional[bool] = None,
@@ -116,7 +183,7 @@ class TimesScaleDb(object, metaclass=Singleton):
             column = "cluster_size"
             value = cluster_size
 
-        await self.conn.execute(
+        await self.execute(
             f'UPDATE symbol_status SET {column}=$2 WHERE symbol_tf_id=$1', symbol_tf_id, value)
 
     async def get_symbol_status(self, active: Optional[bool] = None,
@@ -126,11 +193,11 @@ class TimesScaleDb(object, metaclass=Singleton):
         symbol_status.last_volume, symbol_status.active, symbol_status.cluster_size
         FROM symbol_status JOIN symbol_tf ON symbol_status.symbol_tf_id = symbol_tf.id """
         if symbol is not None:
-            statement += f" WHERE symbol='{symbol}' and tf='1d'"
-            return await self.conn.fetchrow(statement)
+            where = Where().eq("symbol", symbol).eq("tf", "1d")
+            return await self.fetchrow(f"{statement} WHERE {where}", *where.args)
         elif active is not None:
-            statement += f" WHERE active={str(active).lower()}"
-            return await self.conn.fetch(statement)
+            where = Where().eq("active", active)
+            return await self.fetch(f"{statement} WHERE {where}", *where.args)
 
     async def get_symbol_tf_id(self, symbol: SymbolStr, tf: Optional[Tf] = '1d'):
         if (symbol, tf) not in self.symbol_tf.keys():
@@ -142,48 +209,45 @@ class TimesScaleDb(object, metaclass=Singleton):
 
     async def init_symbols(self):
         self.symbol_tf = {(SymbolStr(i['symbol']), Tf(i['tf'])): i['id']
-                          for i in await self.conn.fetch(f'SELECT * from symbol_tf')}
+                          for i in await self.fetch(f'SELECT * from symbol_tf')}
 
         return self.symbol_tf
 
     async def save_candles(self, symbol: SymbolStr, tf: Tf, candles: pd.DataFrame):
-        logging.info(f"Save candles {symbol} {tf} - {len(candles)} {datetime.utcnow() - self.init_time}")
-        candles['timestamp'] = candles.index
-        candles['symbol_tf_id'] = await self.get_symbol_tf_id(symbol, tf)
-
-        tuples = [tuple(x) for x in candles.values]
-        columns = list(candles.columns)
-        candles.drop(['timestamp', 'symbol_tf_id'], axis=1)
-        try:
-            # INSERT ON CONFLICT DO UPDATE
-            # await self.conn.execute("CREATE TEMPORARY TABLE _candles (timestamp TIMESTAMP,"
-            #                         "symbol_tf_id INTEGER,"
-            #                         "o   DOUBLE PRECISION,"
-            #                         "h   DOUBLE PRECISION,"
-            #                         "l   DOUBLE PRECISION,"
-            #                         "c   DOUBLE PRECISION,"
-            #                         "v   DOUBLE PRECISION)")
-            try:
-                await self.conn.copy_records_to_table("candles", records=tuples, columns=columns,
-                                                      timeout=10)
-            except asyncpg.exceptions.UniqueViolationError as e:
-                statement = f"""INSERT INTO candles ({",".join(columns)}) 
-                VALUES($1, $2, $3, $4, $5, $6, $7) 
-                ON CONFLICT (timestamp, symbol_tf_id) DO NOTHING;"""
-                await self.conn.executemany(statement, tuples)
-
-            # await conn.execute('''CREATE TEMPORARY TABLE _data(
-            #     timestamp TIMESTAMP, value NUMERIC
-            # )''')
-            # await conn.copy_records_to_table('_data', records=values)
-            # await conn.execute('''
-            #     INSERT INTO {table}(timestamp, value)
-            #     SELECT * FROM _data
-            #     ON CONFLICT (timestamp)
-            #     DO UPDATE SET value=EXCLUDED.value
-            # '''.format(table=table))
-        except asyncpg.exceptions.UniqueViolationError as e:
-            logging.warning(f"save candles error {e}")
+        await self.save_candles_many({(symbol, tf): candles})
+
+    async def save_candles_many(self, candles_by_symbol: Dict[Tuple[SymbolStr, Tf], pd.DataFrame]):
+        # upsert of many symbols in one transaction: binary COPY of numpy columns into a staging table,
+        # then one INSERT ... ON CONFLICT DO UPDATE. Input frames are not modified
+        columns: Dict[str, List[np.ndarray]] = {name: [] for name, _ in CANDLES_COPY_COLUMNS}
+        for (symbol, tf), candles in candles_by_symbol.items():
+            logging.info(f"Save candles {symbol} {tf} - {len(candles)} {datetime.utcnow() - self.init_time}")
+            if len(candles) == 0:
+                continue
+
+            # same candle twice in one statement is an error for ON CONFLICT DO UPDATE
+            candles_ = candles[~candles.index.duplicated(keep="last")]
+            symbol_tf_id = await self.get_symbol_tf_id(symbol, tf)
+            columns["timestamp"].append(candles_.index.values)
+            columns["symbol_tf_id"].append(np.full(len(candles_), symbol_tf_id, dtype=np.int32))
+            for name in CANDLES_VALUE_COLUMNS:
+                columns[name].append(candles_[name].to_numpy(dtype=np.float64))
+
+        if len(columns["timestamp"]) == 0:
+            return
+
+        data = encode_binary_copy(CANDLES_COPY_COLUMNS, {name: np.concatenate(v) for name, v in columns.items()})
+        names = [name for name, _ in CANDLES_COPY_COLUMNS]
+        updates = ",".join([f"{name}=EXCLUDED.{name}" for name in CANDLES_VALUE_COLUMNS])
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("CREATE TEMPORARY TABLE IF NOT EXISTS _candles_staging "
+                                   "(LIKE candles INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+                await conn.copy_to_table("_candles_staging", source=io.BytesIO(data), columns=names,
+                                         format="binary")
+                await conn.execute(f"INSERT INTO candles ({','.join(names)}) "
+                                   f"SELECT {','.join(names)} FROM _candles_staging "
+                                   f"ON CONFLICT (symbol_tf_id, timestamp) DO UPDATE SET {updates};")
 
     async def load_candles(
             self,
@@ -196,32 +260,89 @@ class TimesScaleDb(object, metaclass=Singleton):
         if (symbol, tf) not in self.symbol_tf.keys():
             return candles_to_data_frame([])
 
-        symbol_tf_id = self.symbol_tf[(symbol, tf)]
-
-        statement = f"SELECT * FROM candles WHERE symbol_tf_id = {symbol_tf_id} AND " \
-                    f"{get_timestamp_condition(start_time, end_time)} " \
-                    f"ORDER BY timestamp ASC"
+        where = Where().eq("symbol_tf_id", self.symbol_tf[(symbol, tf)]).time_range(start_time, end_time)
+        statement = f"SELECT timestamp, o, h, l, c, v FROM candles WHERE {where} ORDER BY timestamp ASC"
 
         # logging.info(f"Load candles {symbol} {tf} -  {statement}")
 
-        df = await self.fetch_as_dataframe(statement)
+        capacity = BINARY_COPY_CAPACITY
+        if start_time is not None and end_time is not None:
+            capacity = int((end_time - start_time).total_seconds() // (tf_size_minutes(tf) * 60)) + 1
+            capacity = min(capacity, BINARY_COPY_MAX_CAPACITY)
+
+        return await self.copy_as_dataframe(statement, CANDLES_BINARY_COLUMNS, *where.args,
+                                            index="timestamp", capacity=capacity)
+
+    async def load_candles_many(
+            self,
+            symbols: List[SymbolStr],
+            tf: Tf,
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None,
+    ) -> Dict[SymbolStr, pd.DataFrame]:
+        # one round-trip for all symbols
+        logging.info(f"Load candles {len(symbols)} symbols {tf} -  {datetime.utcnow() - self.init_time}")
+        ids = {self.symbol_tf[(symbol, tf)]: symbol for symbol in symbols if (symbol, tf) in self.symbol_tf}
+        result = {symbol: candles_to_data_frame([]) for symbol in symbols}
+        if len(ids) == 0:
+            return result
+
+        where = Where().any("symbol_tf_id", list(ids.keys())).time_range(start_time, end_time)
+        statement = f"SELECT symbol_tf_id, timestamp, o, h, l, c, v FROM candles WHERE {where} " \
+                    f"ORDER BY symbol_tf_id, timestamp ASC"
+
+        df = await self.fetch_as_dataframe(statement, *where.args)
+        for symbol_tf_id, candles in df.groupby("symbol_tf_id", sort=False):
+            result[ids[symbol_tf_id]] = candles.drop(columns="symbol_tf_id").set_index("timestamp")
 
-        return df.set_index("timestamp")
+        return result
 
     async def load_last_candle_timestamp(self, symbol: SymbolStr, tf: Tf):
         if (symbol, tf) not in self.symbol_tf.keys():
             return None
 
         symbol_tf_id = self.symbol_tf[(symbol, tf)]
-        result = await self.conn.fetchval(f"SELECT timestamp FROM CANDLES where symbol_tf_id = {symbol_tf_id} ")
+        result = await self.fetchval("SELECT timestamp FROM candles WHERE symbol_tf_id = $1 "
+                                     "ORDER BY timestamp DESC LIMIT 1", symbol_tf_id)
         return result
 
+    async def load_candle_gaps(
+            self,
+            symbol: SymbolStr,
+            tf: Tf,
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None,
+    ) -> List[Tuple[datetime, datetime]]:
+        # missing candles between stored ones as [first missing, last missing] ranges,
+        # only the gaps leave the server (lag() over the (symbol_tf_id, timestamp) index)
+        if (symbol, tf) not in self.symbol_tf.keys():
+            return []
+
+        candle_size = timedelta(minutes=tf_size_minutes(tf))
+        where = Where().eq("symbol_tf_id", self.symbol_tf[(symbol, tf)]).time_range(start_time, end_time)
+        statement = f"SELECT prev_timestamp, timestamp FROM (" \
+                    f"SELECT timestamp, lag(timestamp) OVER (ORDER BY timestamp) AS prev_timestamp " \
+                    f"FROM candles WHERE {where}) t " \
+                    f"WHERE timestamp - prev_timestamp > {where.param(candle_size)} ORDER BY timestamp"
+
+        rows = await self.fetch(statement, *where.args)
+        return [(row["prev_timestamp"] + candle_size, row["timestamp"] - candle_size) for row in rows]
+
     async def add_trade(self, symbol: SymbolStr, price: float, volume: float, is_buyer: bool, timestamp: datetime):
+        # queued - written in batches by trades_writer (see save_trades)
         symbol_tf_id = await self.get_symbol_tf_id(symbol)
-
-        await self.conn.execute("INSERT INTO trades (symbol_tf_id, price, volume, is_buyer, timestamp) "
-                                "VALUES ($1, $2, $3, $4, $5) ON CONFLICT (timestamp, symbol_tf_id) DO NOTHING;",
-                                symbol_tf_id, price, volume, is_buyer, timestamp)
+        await self.trades_writer.put((symbol_tf_id, price, volume, is_buyer, timestamp))
+
+    async def save_trades(self, records: List[TradeRecord]):
+        columns = ["symbol_tf_id", "price", "volume", "is_buyer", "timestamp"]
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("CREATE TEMPORARY TABLE IF NOT EXISTS _trades_staging "
+                                   "(LIKE trades INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+                await conn.copy_records_to_table("_trades_staging", records=records, columns=columns)
+                await conn.execute(f"INSERT INTO trades ({','.join(columns)}) "
+                                   f"SELECT {','.join(columns)} FROM _trades_staging "
+                                   f"ON CONFLICT (timestamp, symbol_tf_id) DO NOTHING;")
 
     async def load_trades(
             self,
@@ -232,10 +353,10 @@ class TimesScaleDb(object, metaclass=Singleton):
         logging.info(f"Load trades {symbol} - {start_time} - {end_time} | {datetime.utcnow() - self.init_time}")
         symbol_tf_id = await self.get_symbol_tf_id(symbol)
 
-        df = await self.fetch_as_dataframe(f"SELECT * FROM trades WHERE symbol_tf_id = {symbol_tf_id} AND "
-                                           f"{get_timestamp_condition(start_time, end_time)}")
-
-        return df.set_index("timestamp")
+        where = Where().eq("symbol_tf_id", symbol_tf_id).time_range(start_time, end_time)
+        columns = ",".join([name for name, _ in TRADES_BINARY_COLUMNS])
+        return await self.copy_as_dataframe(f"SELECT {columns} FROM trades WHERE {where}", TRADES_BINARY_COLUMNS,
+                                            *where.args, index="timestamp")
 
     async def save_clusters(self, symbol_tf_id: int, timestamp: datetime, step: float, clusters: pd.DataFrame):
         # logging.info(f"Save clusters {symbol_tf_id} - {timestamp}")
@@ -246,55 +367,37 @@ class TimesScaleDb(object, metaclass=Singleton):
 
         tuples = [tuple(x) for x in clusters.values]
         columns = list(clusters.columns)
-        await self.conn.copy_records_to_table("clusters", records=tuples, columns=columns, timeout=10)
+        await self.copy_records_to_table("clusters", records=tuples, columns=columns, timeout=10)
 
     async def load_clusters(self, symbol: SymbolStr, tf: Optional[Tf] = "15m",
                             start_time: Optional[datetime] = None, end_time: Optional[datetime] = None):
 
+        where = Where().eq("symbol", symbol).eq("tf", tf).time_range(start_time, end_time)
         statement = f"""SELECT * FROM clusters JOIN symbol_tf ON clusters.symbol_tf_id = symbol_tf.id 
-                    WHERE symbol='{symbol}' and tf='{tf}' AND {get_timestamp_condition(start_time, end_time)}"""
+                    WHERE {where}"""
 
-        df = await self.fetch_as_dataframe(statement)
+        df = await self.fetch_as_dataframe(statement, *where.args)
         return df
 
     async def save_levels(self, symbol_tf_id: int, timestamp: datetime, level_type: TaLevels, level_value: float):
         # logging.info(f"Save levels {symbol_tf_id} - {timestamp} {level_type} = {level_value}")
-        delete_sql = f"DELETE FROM levels WHERE symbol_tf_id={symbol_tf_id} AND " \
-                     f"level_type={level_type.value}"
+        delete_sql = "DELETE FROM levels WHERE symbol_tf_id = $1 AND level_type = $2"
         insert_sql = "INSERT INTO levels (symbol_tf_id, level_type, level_value, timestamp) " \
                      "VALUES ($1, $2, $3, $4);"
-        if self.use_pool:
-            async with self.conn.acquire() as conn:
-                async with conn.transaction():
-                    await conn.execute(delete_sql)
-                    await conn.execute(insert_sql, symbol_tf_id, level_type.value, level_value, timestamp)
-        else:
-            async with self.conn.transaction():
-                await self.conn.execute(delete_sql)
-                await self.conn.execute(insert_sql, symbol_tf_id, level_type.value, level_value, timestamp)
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(delete_sql, symbol_tf_id, level_type.value)
+                await conn.execute(insert_sql, symbol_tf_id, level_type.value, level_value, timestamp)
 
     async def load_levels(self, symbol: Union[SymbolStr, List[SymbolStr]], tf: Union[Tf, List[Tf]],
                           level_type: Optional[TaLevels] = None):
-        statement = f"""SELECT * FROM levels JOIN symbol_tf ON levels.symbol_tf_id = symbol_tf.id 
-                    WHERE """
-        if type(symbol) is SymbolStr:
-            statement += f" symbol='{symbol}' "
-        else:
-            symbols_str = [f"'{s}'" for s in symbol]
-            statement += f" symbol IN ({','.join(symbols_str)}) "
-
-        if type(tf) is Tf:
-            statement += f" and tf='{tf}' "
-        else:
-            tf_str = [f"'{s}'" for s in tf]
-            statement += f" and tf IN ({','.join(tf_str)}) "
-
+        where = Where().eq_or_any("symbol", symbol).eq_or_any("tf", tf)
         if level_type is not None:
-            statement += f" and level_type={level_type.value} "
+            where.eq("level_type", level_type.value)
 
-            # statement = f"""SELECT * FROM levels JOIN symbol_tf ON clusters.symbol_tf_id = symbol_tf.id
-        #             WHERE symbol='{symbol}' and tf='{tf}' AND level_type={level_type.value}"""
-        items = await self.conn.fetch(statement)
+        statement = f"""SELECT * FROM levels JOIN symbol_tf ON levels.symbol_tf_id = symbol_tf.id 
+                    WHERE {where}"""
+        items = await self.fetch(statement, *where.args)
         return items
 
     async def save_arbitrage_deltas(self, timestamp: datetime, data: pd.DataFrame):
@@ -304,7 +407,7 @@ class TimesScaleDb(object, metaclass=Singleton):
 
         tuples = [tuple(x) for x in data.values]
         columns = list(data.columns)
-        await self.conn.copy_records_to_table("arbitrage_delta", records=tuples, columns=columns, timeout=10)
+        await self.copy_records_to_table("arbitrage_delta", records=tuples, columns=columns, timeout=10)
 
     async def load_last_arbitrage_deltas(self):
         statement = f"""select distinct on(s.symbol) *
@@ -318,14 +421,15 @@ class TimesScaleDb(object, metaclass=Singleton):
 
     async def load_last_arbitrage_deltas_stats(self, start_time: Optional[datetime] = None,
                                                end_time: Optional[datetime] = None):
+        where = Where().time_range(start_time, end_time)
         statement = f"""select s.symbol, avg(a.delta) as avg_delta, avg(a.delta_perc) as avg_delta_perc,
                     max(a.delta) as max_delta, max(a.delta_perc) as max_delta_perc,
                     min(a.delta) as min_delta, min(a.delta_perc) as min_delta_perc
                     from arbitrage_delta as a join symbol_tf as s on s.id = a.symbol_tf_id 
-                    WHERE {get_timestamp_condition(start_time, end_time)} 
+                    WHERE {where} 
                     GROUP BY s.symbol;"""
 
-        df = await self.fetch_as_dataframe(statement)
+        df = await self.fetch_as_dataframe(statement, *where.args)
         df.set_index("symbol", inplace=True)
 
         return df
@@ -333,17 +437,17 @@ class TimesScaleDb(object, metaclass=Singleton):
     async def load_arbitrage_deltas(self, symbol: Optional[SymbolStr] = None,
                                     start_time: Optional[datetime] = None,
                                     end_time: Optional[datetime] = None):
-        symbol_cond = ""
+        where = Where().time_range(start_time, end_time)
         if symbol is not None:
-            symbol_cond = f"AND symbol='{symbol}' "
+            where.eq("symbol", symbol)
 
         statement = f"""select timestamp, s.symbol, a.delta_perc
                         from arbitrage_delta as a join symbol_tf as s on s.id = a.symbol_tf_id 
-                    WHERE {get_timestamp_condition(start_time, end_time)} {symbol_cond}
+                    WHERE {where}
                     group by timestamp, s.symbol, a.delta_perc
                     order by timestamp;"""
 
-        df = await self.fetch_as_dataframe(statement)
+        df = await self.fetch_as_dataframe(statement, *where.args)
         # df.set_index("symbol", inplace=True)
 
         return df
@@ -356,18 +460,18 @@ class TimesScaleDb(object, metaclass=Singleton):
     async def add_key_players_sentiment(self, timestamp: datetime, symbol: str, sentiment: int, value: int):
         statement = f"""INSERT INTO key_players_sentiment (symbol, timestamp, sentiment, value) 
         VALUES($1, $2, $3, $4);"""
-        await self.conn.execute(statement, symbol, timestamp, sentiment, value)
+        await self.execute(statement, symbol, timestamp, sentiment, value)
 
     async def list_key_players_sentiment(self, symbol: Optional[str]=None):
-        symbol_cond = "1=1 "
+        where = Where()
         if symbol is not None:
-            symbol_cond = f"AND symbol='{symbol}' "
+            where.eq("symbol", symbol)
 
         statement = f"""select timestamp, symbol,sentiment, value
-                        from key_players_sentiment WHERE {symbol_cond} 
+                        from key_players_sentiment WHERE {where} 
                     order by timestamp;"""
 
-        df = await self.fetch_as_dataframe(statement)
+        df = await self.fetch_as_dataframe(statement, *where.args)
 
         return df
 
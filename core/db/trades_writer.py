@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from core.utils.logs import add_traceback
+
+TRADES_BATCH_SIZE = 5000
+TRADES_FLUSH_INTERVAL = 1.0
+TRADES_MAX_QUEUE_SIZE = 100000
+
+# (symbol_tf_id, price, volume, is_buyer, timestamp)
+TradeRecord = Tuple[int, float, float, bool, datetime]
+
+
+class TradesWriter(object):
+    # Buffers trades in a bounded queue and writes them in batches (by size or by time).
+    # `put` waits when the queue is full - backpressure instead of unbounded memory.
+    def __init__(self, save: Callable[[List[TradeRecord]], Awaitable[Any]],
+                 batch_size: int = TRADES_BATCH_SIZE, flush_interval: float = TRADES_FLUSH_INTERVAL,
+                 max_queue_size: int = TRADES_MAX_QUEUE_SIZE):
+        self.save = save
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_lag = 0.0
+        self.last_flush_time = 0.0
+        self.started_at = time.monotonic()
+
+    @property
+    def is_running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        if not self.is_running:
+            self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self.started_at = time.monotonic()
+            self.task = asyncio.get_event_loop().create_task(self._run())
+
+    async def put(self, record: TradeRecord):
+        self.start()
+        await self.queue.put((time.monotonic(), record))
+
+    async def _next_batch(self) -> Tuple[List[Tuple[float, TradeRecord]], bool]:
+        # returns batch and `stop` flag (None in queue = close requested)
+        item = await self.queue.get()
+        if item is None:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    async def _flush(self, batch: List[Tuple[float, TradeRecord]]):
+        if len(batch) == 0:
+            return
+
+        start = time.monotonic()
+        try:
+            await self.save([record for _, record in batch])
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logging.error(f"Trades writer: {len(batch)} trades not saved. {add_traceback(e)}")
+
+        self.flushes += 1
+        self.last_lag = start - batch[0][0]
+        self.last_flush_time = time.monotonic() - start
+
+    async def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = await self._next_batch()
+            await self._flush(batch)
+
+    async def close(self):
+        # everything queued before close is flushed
+        if not self.is_running:
+            return
+
+        await self.queue.put(None)
+        await self.task
+        self.task = None
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        uptime = time.monotonic() - self.started_at
+        return dict(
+            queued=self.queue.qsize() if self.queue is not None else 0,
+            written=self.written,
+            failed=self.failed,
+            flushes=self.flushes,
+            trades_per_second=self.written / uptime if uptime > 0 else 0.0,
+            lag=self.last_lag,
+            last_flush_time=self.last_flush_time,
+        )
@@ -17,7 +17,8 @@ from core.exchange.binance.public import BASE_URI, MARGIN_URI
 from core.exchange.common.exchange import PrivateExchange
 from core.exchange.common.mappers import binance_to_symbol, symbol_to_binance
 from core.exchange.common.websocket import WebSocketBase
-from core.types import RestMethod, Symbol, OrderType, Side, SymbolStr, TimeInForce, SideEffectType, ExchangeType
+from core.types import (OverflowPolicy, RestMethod, Symbol, OrderType, Side, SymbolStr, TimeInForce, SideEffectType,
+                        ExchangeType)
 from core.utils.logs import setup_logger, add_traceback
 from config import Config
 import logging
@@ -54,6 +55,7 @@ class PrivateBinance(PrivateExchange):
             self.ws_on_private_message,
             timeout=0,
             on_before_connect=self.before_connect_private_streams,
+            overflow_policy=OverflowPolicy.BLOCK,  # order / balance updates are never dropped
         )
 
         await asyncio.sleep(0)
@@ -262,13 +264,7 @@ class PrivateBinance(PrivateExchange):
             ws_order = Order().from_ws(msg)
             self.orders[symbol][ws_order.id] = ws_order
 
-            await asyncio.gather(
-                *[
-                    asyncio.create_task(c.callback(symbol, ws_order))
-                    for c in self.callbacks
-                    if c.feed == f"executionReport" and c.symbol == symbol
-                ]
-            )
+            await self.dispatch_callbacks(self.get_callbacks("executionReport", symbol), symbol, ws_order)
 
         # if msg['e'] == 'outboundAccountPosition':
         #     self._update_balances(msg)
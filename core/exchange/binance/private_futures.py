@@ -73,19 +73,13 @@ class PrivateFuturesBinance(PrivateBinance):
         if channel == "ACCOUNT_UPDATE":
             positions_ws = msg.get("a", {}).get("P", [])
             trade_update_time = msg["T"]
-            callbacks = []
+            callbacks = self.get_feed_callbacks("position")
             for p in positions_ws:
                 symbol = binance_to_symbol(p["s"])
                 position = self._get_position(symbol).update_from_ws(
                     p, trade_update_time
                 )
-                callbacks += [
-                    asyncio.create_task(c.callback(position))
-                    for c in self.callbacks
-                    if c.feed == f"position"
-                ]
-
-            await asyncio.gather(*callbacks)
+                await self.dispatch_callbacks(callbacks, position)
 
         elif channel == "ORDER_TRADE_UPDATE":
             trade_update_time = msg["T"]
@@ -94,13 +88,7 @@ class PrivateFuturesBinance(PrivateBinance):
             order = Order().from_ws(order_ws, trade_update_time)
             position = self._get_position(symbol).update_order(order)
 
-            await asyncio.gather(
-                *[
-                    asyncio.create_task(c.callback(position, order))
-                    for c in self.callbacks
-                    if c.feed == f"position"
-                ]
-            )
+            await self.dispatch_callbacks(self.get_feed_callbacks("position"), position, order)
 
             # if position was closed = clear
             if position.closed:
@@ -1,7 +1,9 @@
 import asyncio
 import logging
+import os
+import time
 from datetime import timedelta
-from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Type
+from typing import Any, Callable, Coroutine, Dict, Hashable, List, Optional, Tuple, Type
 
 import pandas as pd
 import ujson
@@ -11,17 +13,23 @@ from config import Config, MAX_CANDLES
 # from config import MAX_CANDLES
 from core.base import CoreBase
 from core.exchange.binance.common import get_filter_value
+from core.exchange.common.candles_buffer import CandlesBuffer
 from core.exchange.common.exchange import PublicExchange, SymbolInfo
 from core.exchange.common.mappers import binance_to_symbol, symbol_to_binance
 from core.exchange.common.order_book import OrderBook
+from core.exchange.common.trades_buffer import TradesBuffer
 from core.exchange.common.websocket import WebSocketBase
-from core.exchange.protectors.binance_request_limiter import BinanceRequestLimiter
-from core.types import RestMethod, Singleton, Symbol, Tf
-from core.utils.data import candles_to_data_frame
+from core.exceptions import ExchangeApiException
+from core.exchange.protectors.binance_request_limiter import BinanceRequestLimiter, SPOT_ENDPOINT_WEIGHTS
+from core.ta.extrema import SwingDetector
+from core.ta.volume_levels import VolumeLevelTracker
+from core.types import OverflowPolicy, RestMethod, Singleton, Symbol, Tf
+from core.utils.data import candles_to_data_frame, klines_to_data_frame
 from core.utils.logs import setup_logger, add_traceback
-from core.utils.timeframe import tf_size_minutes, round_time_to_tf, get_time_shift
+from core.utils.resample import CandlesResampler, can_resample, resample_candles
+from core.utils.timeframe import tf_size_minutes, round_time_to_tf, get_time_shift, get_time_pages, find_gaps
 from datetime import timezone, datetime
-from core.providers.data_provider import DataProvider, TimescaleDataProvider
+from core.providers.data_provider import DataProvider
 import math
 
 CANDLES_FEED_NAMES = ["kline_1m", "kline_1h"]
@@ -32,7 +40,17 @@ MARGIN_URI = "https://api.binance.com/sapi/v1/margin"
 WSS_URL = "wss://stream.binance.com:443/ws/"
 
 MAX_TRADES = 500
+MAX_REQUEST_ATTEMPTS = 3
+PRELOAD_CONCURRENCY = 8
+DEPTH_SNAPSHOT_LIMIT = 1000
+DEPTH_SNAPSHOT_ATTEMPTS = 5
+DEPTH_SNAPSHOT_RETRY_DELAY = 1  # seconds, doubled after every failed snapshot request
 WS_TIMEOUT = 0
+# set (e.g. "15m") with a data provider - higher kline tfs are rolled up from the base candles (preload and live),
+# only the base tf is requested and streamed
+CANDLES_BASE_TIMEFRAME = os.getenv("CANDLES_BASE_TIMEFRAME", None)
+# only tfs whose lookback fits into this many base kline pages are derived, longer ones (e.g. 1d) keep native klines
+MAX_DERIVED_BASE_PAGES = 10
 WS_MSG_TIME = 0.25
 
 LEVEL_CANDLES_LENGTH = {
@@ -52,6 +70,16 @@ def side_data_to_float(data):
     return [(float(i[0]), float(i[1])) for i in data]
 
 
+def ws_message_key(msg) -> Optional[Hashable]:
+    # queued messages replaced by newer ones of the same key: all prices snapshots and updates of an open kline.
+    # Trades, depth diffs and closed klines are never replaced
+    if type(msg) is list:
+        return "all_prices"
+    if msg.get("e") == "kline" and not msg["k"]["x"]:
+        return "kline", msg["s"], msg["k"]["i"], msg["k"]["t"]
+    return None
+
+
 def get_symbol_info(symbol_info: Dict[str, Any], is_futures: bool = False):
     filter = symbol_info["filters"]
     tick = float(get_filter_value(filter, "PRICE_FILTER", "tickSize"))
@@ -82,12 +110,11 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
     logger_name = "public_binance"
     base_uri = BASE_URI
     wss_url = WSS_URL
-    request_limiter = BinanceRequestLimiter()
-    last_url_response = None
+    request_limiter = BinanceRequestLimiter(SPOT_ENDPOINT_WEIGHTS)
 
     def __init__(self, on_trade_callback: Optional[Callable] = None, on_candle_callback: Optional[Callable] = None,
                  on__all_price_callback: Optional[Callable] = None,
-                 data_provider: Optional[TimescaleDataProvider] = None):
+                 data_provider: Optional[DataProvider] = None):
         super().__init__()
         self.wsb: Optional[WebSocketBase] = None
         self.debug = 0
@@ -96,6 +123,8 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
         self.on_all_price_callback = on__all_price_callback
         self.logger = setup_logger(self.logger_name)
         self.data_provider = data_provider
+        self.order_book_reloads: Dict[Symbol, asyncio.Task] = {}
+        self.resamplers: Dict[Symbol, CandlesResampler] = {}
 
     async def async_init(
             self, on_connect_callback: Optional[Callable[[], Coroutine]] = None
@@ -109,6 +138,8 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
             on_reconnect=self.reconnect_streams,
             on_connect=on_connect_callback,
             logger=self.logger,
+            overflow_policy=OverflowPolicy.COALESCE,
+            coalesce_key=ws_message_key,
         )
         # Important - load_exchange_info also set-up Request Balancer
         await self.load_exchange_info()
@@ -172,45 +203,156 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
     async def subscribe(
             self, symbols: List[Symbol], feeds: List[str] = DETAILS_FEED_NAMES
     ):
-        tasks = []
         # if "markPrice" in feeds:
         #     tasks.append(loop.create_task(self.load_mark_prices()))
         self.logger.info("Preload data...")
 
+        kline_tfs = [Tf(f.split("_")[1]) for f in feeds if "kline" in f]
+        ws_feeds = self.get_ws_feeds(feeds)
         for symbol in symbols:
-            if "depth" in feeds:
-                tasks.append(CoreBase.get_loop().create_task(self.load_order_books(symbol)))
             # if "trade" in feeds:
             #     tasks.append(CoreBase.get_loop().create_task(self.load_trades(symbol)))
 
-            self.candle_unclosed[symbol] = {}
+            self.candle_unclosed[symbol] = {Tf(f.split("_")[1]): None for f in set(feeds + ws_feeds) if "kline" in f}
 
-            kline_tfs = [Tf(f.split("_")[1]) for f in feeds if "kline" in f]
-            now_ = datetime.utcnow()
-            for tf in kline_tfs:
-                delta = timedelta(**LEVEL_CANDLES_LENGTH[tf])
-                await self.load_candles(
-                    symbol, tf, start_time=now_ - delta, end_time=now_
-                )
-                self.candle_unclosed[symbol][tf] = None
-        self.logger.info("Do Subscribe to WS...")
-        await self.send_message(symbols=symbols, feeds=feeds, method="SUBSCRIBE")
+        def load_order_books(symbols_: List[Symbol]):
+            # snapshots after SUBSCRIBE - diff updates received meanwhile are buffered and replayed
+            if "depth" in feeds:
+                for symbol_ in symbols_:
+                    self.reload_order_book(symbol_)
+
+        if len(kline_tfs) == 0:
+            self.logger.info("Do Subscribe to WS...")
+            await self.send_message(symbols=symbols, feeds=ws_feeds, method="SUBSCRIBE")
+            load_order_books(symbols)
+            return
+
+        # subscribe symbols in batches as soon as their history is loaded
+        ready_symbols: asyncio.Queue = asyncio.Queue()
+
+        async def subscribe_ready():
+            while True:
+                batch = [await ready_symbols.get()]
+                while not ready_symbols.empty():
+                    batch.append(ready_symbols.get_nowait())
+
+                symbols_ = [s for s in batch if s is not None]
+                if len(symbols_) > 0:
+                    self.logger.info(f"Do Subscribe to WS {len(symbols_)} symbols...")
+                    await self.send_message(symbols=symbols_, feeds=ws_feeds, method="SUBSCRIBE")
+                    load_order_books(symbols_)
+
+                if None in batch:
+                    return
+
+        subscriber = CoreBase.get_loop().create_task(subscribe_ready())
+        await self.preload_candles(symbols, kline_tfs, on_symbol_ready=ready_symbols.put)
+        await ready_symbols.put(None)
+        await subscriber
+
+    async def preload_candles(self, symbols: List[Symbol], tfs: List[Tf],
+                              on_symbol_ready: Optional[Callable[[Symbol], Coroutine]] = None,
+                              concurrency: int = PRELOAD_CONCURRENCY):
+        # symbols keep their order (first symbols get ready first), higher timeframes go first within a symbol.
+        # Derived tfs are one job - rolled up from the same base candles
+        derived_tfs = self.get_derived_tfs(tfs)
+        groups = [[tf] for tf in tfs if tf not in derived_tfs] + ([derived_tfs] if len(derived_tfs) > 0 else [])
+        jobs = sorted([(i, -max(tf_size_minutes(tf) for tf in group), symbol, group)
+                       for i, symbol in enumerate(symbols) for group in groups])
+        remaining = {symbol: len(groups) for symbol in symbols}
+        total = len(jobs)
+        done = 0
+        start = time.monotonic()
+
+        async def worker():
+            nonlocal done
+            while len(jobs) > 0:
+                _, _, symbol, group = jobs.pop(0)
+                job_start = time.monotonic()
+                now_ = datetime.utcnow()
+                name = ",".join(group)
+                try:
+                    if group is not derived_tfs:
+                        delta = timedelta(**LEVEL_CANDLES_LENGTH[group[0]])
+                        await self.load_candles(symbol, group[0], start_time=now_ - delta, end_time=now_)
+                    else:
+                        await self.derive_candles(symbol, group, Tf(CANDLES_BASE_TIMEFRAME), end_time=now_)
+                except Exception as e:
+                    self.logger.error(f"Preload candles: {symbol}_{name} failed. {add_traceback(e)}")
+                    for tf in group + ([Tf(CANDLES_BASE_TIMEFRAME)] if group is derived_tfs else []):
+                        self.candles.setdefault(symbol, {}).setdefault(tf, CandlesBuffer())
+
+                done += 1
+                remaining[symbol] -= 1
+                self.logger.info(f"Preload progress {done}/{total}: {symbol}_{name} "
+                                 f"in {time.monotonic() - job_start:.2f}s, total {time.monotonic() - start:.2f}s")
+
+                if remaining[symbol] == 0 and on_symbol_ready is not None:
+                    await on_symbol_ready(symbol)
+
+        await asyncio.gather(*[worker() for _ in range(min(concurrency, total))])
+        self.logger.info(f"Preload {len(symbols) * len(tfs)} candle series of {len(symbols)} symbols "
+                         f"DONE in {time.monotonic() - start:.2f}s.")
+
+    def get_derived_tfs(self, tfs: List[Tf]) -> List[Tf]:
+        # kline tfs rolled up from CANDLES_BASE_TIMEFRAME instead of own requests and streams
+        if not CANDLES_BASE_TIMEFRAME or self.data_provider is None:
+            return []
+        base_tf = Tf(CANDLES_BASE_TIMEFRAME)
+        max_base_window = timedelta(minutes=tf_size_minutes(base_tf) * MAX_CANDLES * MAX_DERIVED_BASE_PAGES)
+        return [tf for tf in tfs if can_resample(tf, base_tf) and tf in LEVEL_CANDLES_LENGTH
+                and timedelta(**LEVEL_CANDLES_LENGTH[tf]) <= max_base_window]
+
+    def get_ws_feeds(self, feeds: List[str]) -> List[str]:
+        # derived kline feeds are replaced by the base one
+        derived_tfs = self.get_derived_tfs([Tf(f.split("_")[1]) for f in feeds if "kline" in f])
+        if len(derived_tfs) == 0:
+            return feeds
+
+        ws_feeds = [f for f in feeds if not ("kline" in f and Tf(f.split("_")[1]) in derived_tfs)]
+        base_feed = f"kline_{CANDLES_BASE_TIMEFRAME}"
+        return ws_feeds if base_feed in ws_feeds else ws_feeds + [base_feed]
+
+    async def derive_candles(self, symbol: Symbol, tfs: List[Tf], base_tf: Tf,
+                             end_time: Optional[datetime] = None):
+        # base candles of the longest window (stored + requested missing ones) are loaded once, tfs are rolled up
+        # from them and kept updated by the resampler from live base klines
+        end_time = end_time or datetime.utcnow()
+        starts = {tf: end_time - timedelta(**LEVEL_CANDLES_LENGTH[tf]) for tf in tfs + [base_tf]}
+        start_time = round_time_to_tf(min(starts.values()), max(tfs, key=tf_size_minutes))
+        base = await self.fetch_candles(symbol, base_tf, start_time, end_time)
+
+        self.set_candles(symbol, base_tf, base[base.index >= starts[base_tf]])
+        for tf in tfs:
+            candles = resample_candles(base, tf, base_tf)
+            self.set_candles(symbol, tf, candles[candles.index >= starts[tf]])
+        self.resamplers[symbol] = CandlesResampler.from_candles(base, tfs, base_tf)
 
     async def unsubscribe(
             self, symbols: List[Symbol], feeds: List[str] = DETAILS_FEED_NAMES
     ):
         for symbol in symbols:
             if "trade" in feeds:
-                self.trades[symbol] = []
+                self.trades[symbol] = TradesBuffer(MAX_TRADES)
             if "depth" in feeds:
+                reload = self.order_book_reloads.pop(symbol, None)
+                if reload is not None:
+                    reload.cancel()
                 self.order_books[symbol] = OrderBook()
 
             kline_tfs = [f.split("_")[1] for f in feeds if "kline" in f]
 
             for tf in kline_tfs:
-                self.candles[symbol][Tf(tf)] = []
+                self.candles[symbol][Tf(tf)] = CandlesBuffer()
 
-        return await self.send_message(symbols=symbols, feeds=feeds, method="UNSUBSCRIBE")
+            resampler = self.resamplers.get(symbol)
+            if resampler is not None:
+                resampler.tfs = [tf for tf in resampler.tfs if tf not in kline_tfs]
+
+        # the base kline stream is kept for other derived tfs, unless it is unsubscribed itself
+        derived_tfs = self.get_derived_tfs([Tf(f.split("_")[1]) for f in feeds if "kline" in f])
+        ws_feeds = [f for f in feeds if not ("kline" in f and Tf(f.split("_")[1]) in derived_tfs)]
+        return await self.send_message(symbols=symbols, feeds=ws_feeds, method="UNSUBSCRIBE")
 
     async def unsubscribe_by_id(self, stream_id: Any):
         symbols = []
@@ -242,6 +384,7 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
         return conn
 
     async def ws_on_message(self, msg):
+        # called by the websocket consumer task (see ws_message_key for messages replaced in the queue)
         try:
             if type(msg) is list:
                 if self.on_all_price_callback is not None:
@@ -263,14 +406,22 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
                     await self.on_trade_callback(msg["s"].upper(), float(msg["p"]), float(msg["q"]), msg["m"],
                                                  datetime.utcfromtimestamp(msg["T"] / 1e3))
                 else:
-                    item = (float(msg["p"]), float(msg["q"]), msg["m"])
-                    self.trades[symbol].append(item)
-                    self.trades[symbol] = self.trades[symbol][-MAX_TRADES:]
+                    if symbol not in self.trades:
+                        self.trades[symbol] = TradesBuffer(MAX_TRADES)
+                    self.trades[symbol].append(float(msg["p"]), float(msg["q"]), msg["m"], msg["T"])
 
             elif channel == "depthUpdate":
-                self.order_books[symbol].update_sides(
-                    side_data_to_float(msg["b"]), side_data_to_float(msg["a"])
+                if symbol not in self.order_books:
+                    self.order_books[symbol] = OrderBook()
+
+                # pu - futures streams only (events are chained by it)
+                synced = self.order_books[symbol].apply_update(
+                    msg["U"], msg["u"], side_data_to_float(msg["b"]), side_data_to_float(msg["a"]), msg.get("pu")
                 )
+                if not synced:
+                    self.logger.warning(f"{symbol} order book out of sync - reload snapshot")
+                if not self.order_books[symbol].is_synced:
+                    self.reload_order_book(symbol)  # also after a reload which gave up
 
             elif channel == "kline":
                 c = msg["k"]
@@ -283,28 +434,13 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
                 c_time = datetime.utcfromtimestamp(c["t"] / 1e3)
 
                 self.mark_prices[symbol] = c_
-                self.update_candles_dnv(symbol, tf, c_, v_)
                 candle_closed = c["x"]
-
                 candle_item = [c_time, o_, h_, l_, c_, v_]
-                self.candle_unclosed[symbol][tf] = candle_item
-                if candle_closed:
-                    self.candles[symbol][tf] = pd.concat(
-                        [self.candles[symbol][tf], candles_to_data_frame([candle_item])]
-                    )
-
-                if self.on_candle_callback is not None:
-                    await self.on_candle_callback(msg["s"].upper(), tf, candle_closed, candle_item,
-                                                  datetime.utcfromtimestamp(c["T"] / 1e3))
-                else:
-                    if candle_closed:
-                        await asyncio.gather(
-                            *[
-                                asyncio.create_task(c.callback(symbol, tf, c_time))
-                                for c in self.callbacks
-                                if c.feed == f"kline_{tf}" and c.symbol == symbol
-                            ]
-                        )
+                await self.on_kline(symbol, tf, candle_item, candle_closed, datetime.utcfromtimestamp(c["T"] / 1e3))
+
+                resampler = self.resamplers.get(symbol)
+                if resampler is not None and tf == resampler.base_tf:
+                    await self.on_base_kline(symbol, resampler, candle_item, candle_closed)
 
             # elif channel == "markPriceUpdate":
             #     p = float(data["p"])
@@ -315,18 +451,75 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
         except Exception as e:
             self.logger.error(add_traceback(e))
 
-    async def load_order_books(self, symbol: Symbol):
-        content, _ = await self.request_url(
-            f"/depth",
-            RestMethod.GET,
-            params={"symbol": f"{symbol_to_binance(symbol).upper()}"},
-        )
+    async def on_kline(self, symbol: Symbol, tf: Tf, candle_item: List[Any], candle_closed: bool,
+                       close_time: datetime):
+        # [timestamp, o, h, l, c, v] of a streamed or derived kline
+        c_time, _, _, _, c_, v_ = candle_item
+        self.update_candles_dnv(symbol, tf, c_, v_)
+        self.candle_unclosed[symbol][tf] = candle_item
+        if candle_closed:
+            self.candles[symbol][tf].append_item(candle_item)
+            self.update_volume_levels(symbol, tf, candle_item)
+            self.update_swings(symbol, tf, candle_item)
+
+        if self.on_candle_callback is not None:
+            await self.on_candle_callback(symbol_to_binance(symbol).upper(), tf, candle_closed, candle_item,
+                                          close_time)
+        else:
+            if candle_closed:
+                await self.dispatch_callbacks(self.get_callbacks(f"kline_{tf}", symbol), symbol, tf, c_time)
+
+    async def on_base_kline(self, symbol: Symbol, resampler: CandlesResampler, candle_item: List[Any],
+                            candle_closed: bool):
+        # derived tfs: buckets closed by a closed base candle, then open buckets with the live base candle
+        def close_time(candle: List[Any], tf: Tf) -> datetime:
+            return candle[0] + timedelta(minutes=tf_size_minutes(tf)) - timedelta(milliseconds=1)
+
+        if candle_closed:
+            for tf, candle in resampler.update(candle_item):
+                await self.on_kline(symbol, tf, candle, True, close_time(candle, tf))
+
+        for tf in resampler.tfs:
+            candle = resampler.unclosed(tf, None if candle_closed else candle_item)
+            if candle is not None:
+                await self.on_kline(symbol, tf, candle, False, close_time(candle, tf))
+
+    def reload_order_book(self, symbol: Symbol):
+        # one snapshot reload per symbol in flight
+        reload = self.order_book_reloads.get(symbol)
+        if reload is None or reload.done():
+            self.order_book_reloads[symbol] = CoreBase.get_loop().create_task(self.load_order_books(symbol))
+
+    async def load_order_books(self, symbol: Symbol) -> bool:
+        delay = DEPTH_SNAPSHOT_RETRY_DELAY
+        for attempt in range(1, DEPTH_SNAPSHOT_ATTEMPTS + 1):
+            try:
+                content, _ = await self.request_url(
+                    f"/depth",
+                    RestMethod.GET,
+                    params={"symbol": f"{symbol_to_binance(symbol).upper()}", "limit": DEPTH_SNAPSHOT_LIMIT},
+                )
+                last_update_id = content["lastUpdateId"]
+                bids, asks = side_data_to_float(content["bids"]), side_data_to_float(content["asks"])
+            except Exception as e:
+                self.logger.error(f"{symbol} order book snapshot failed ({attempt}/{DEPTH_SNAPSHOT_ATTEMPTS}). "
+                                  f"{add_traceback(e)}")
+                if attempt < DEPTH_SNAPSHOT_ATTEMPTS:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+                continue
+
+            # keep the existing book - it buffers diff updates received while the snapshot was loading
+            if symbol not in self.order_books:
+                self.order_books[symbol] = OrderBook()
 
-        self.order_books[symbol] = OrderBook()
-        self.order_books[symbol].update_sides(
-            side_data_to_float(content["bids"]), side_data_to_float(content["asks"])
-        )
-        pass
+            if self.order_books[symbol].set_snapshot(last_update_id, bids, asks):
+                return True
+            self.logger.warning(f"{symbol} order book snapshot is behind the stream - reload snapshot")
+
+        # the next diff update of the unsynced book starts a new reload
+        self.logger.error(f"{symbol} order book snapshot failed {DEPTH_SNAPSHOT_ATTEMPTS} times.")
+        return False
 
     async def get_24h_statistics(self) -> pd.DataFrame:
         content, _ = await self.request_url(f"/ticker/24hr", RestMethod.GET)
@@ -342,10 +535,10 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
             },
         )
         # also : time, 'isBestMatch', quoteQty
-        self.trades[symbol] = [
-            (float(i["price"]), float(i["qty"]), i["isBuyerMaker"]) for i in content
-        ]
-        pass
+        self.trades[symbol] = TradesBuffer(MAX_TRADES)
+        self.trades[symbol].extend(
+            [(float(i["price"]), float(i["qty"]), i["isBuyerMaker"], i["time"]) for i in content]
+        )
 
     async def load_mark_prices(self):
         content, _ = await self.request_url(f"/ticker/price", RestMethod.GET)
@@ -358,8 +551,9 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
                                       tf: str = "1m",
                                       start_time: Optional[datetime] = None,
                                       end_time: Optional[datetime] = None,
+                                      extended: bool = False,
                                       ):
-        candles = await self._load_candles(symbol, tf, start_time, end_time)
+        candles = await self._load_candles(symbol, tf, start_time, end_time, extended)
 
         return candles
 
@@ -369,6 +563,7 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
             tf: str = "1m",
             start_time: Optional[datetime] = None,
             end_time: Optional[datetime] = None,
+            extended: bool = False,
     ):
 
         params = {
@@ -384,26 +579,10 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
         if end_time is not None:
             params["endTime"] = int(int(end_time.replace(tzinfo=timezone.utc).timestamp()) * 1e3)
 
+        # non-200 responses raise in request_url, an unexpected body raises ValueError - a failed page is
+        # never stored as an empty history
         content, _ = await self.request_url(f"/klines", RestMethod.GET, params=params)
-        if _.status != 200:
-            logging.error(f"{_.url}")
-            # raise KeyError(content['msg'])
-        try:
-            candles = [
-                [
-                    datetime.utcfromtimestamp(c[0] / 1e3),
-                    float(c[1]),
-                    float(c[2]),
-                    float(c[3]),
-                    float(c[4]),
-                    float(c[5]),
-                ]
-                for c in content
-            ]
-        except Exception as e:
-            self.logger.error(e)
-            candles = []
-        return candles_to_data_frame(candles)
+        return klines_to_data_frame(content, extended)
 
     async def load_candles(
             self,
@@ -412,19 +591,18 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
             start_time: Optional[datetime] = None,
             end_time: Optional[datetime] = None,
     ):
-        candle_size_minutes = tf_size_minutes(tf)
-
-        async def load_candles_with_cache(from_time, to_time):
-            if (to_time - from_time) <= timedelta(minutes=candle_size_minutes):  # *2
-                return candles_to_data_frame([])
-
-            candles_batch = await self._load_candles(symbol, tf, from_time, to_time)
-            if len(candles_batch) == 0:
-                return candles_to_data_frame([])
+        candles = await self.fetch_candles(symbol, tf, start_time, end_time)
+        return self.set_candles(symbol, tf, candles)
 
-            if self.data_provider is not None:
-                await self.data_provider.save_candles(symbol=symbol_to_binance(symbol), tf=tf, candles=candles_batch)
-            return candles_batch
+    async def fetch_candles(
+            self,
+            symbol: Symbol,
+            tf: Tf = "1m",
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None,
+    ) -> pd.DataFrame:
+        # stored candles + requested missing ones (saved to the data provider)
+        candle_size_minutes = tf_size_minutes(tf)
 
         end_time = round_time_to_tf(
             end_time or datetime.utcnow(), tf
@@ -434,30 +612,47 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
         start_time = start_time or get_time_shift(end_time, candle_size_minutes)
 
         self.logger.info(f"Preload candles: {symbol}_{tf} - {start_time} - {end_time}.")
-        candles_db = pd.DataFrame()
+        candles_db = candles_to_data_frame([])
         if self.data_provider is not None:
             candles_db = await self.data_provider.load_candles(symbol_to_binance(symbol), tf,
                                                                start_time, end_time)
 
         start_time_ = (
-            candles_db.index[-1] if len(candles_db) > 0 else get_time_shift(end_time, candle_size_minutes)
+            candles_db.index[-1] + timedelta(minutes=candle_size_minutes) if len(candles_db) > 0 else start_time
         )
 
-        candles = await load_candles_with_cache(start_time_, end_time)
-
-        candles_total = pd.concat([candles_db, candles])
+        # all pages are known up front - fetch them concurrently, the request limiter paces them.
+        # Holes inside stored candles are fetched too, not only the tail
+        pages = [page for gap_from, gap_to in find_gaps(candles_db.index, tf)
+                 for page in get_time_pages(gap_from, gap_to, candle_size_minutes)]
+        pages += get_time_pages(start_time_, end_time, candle_size_minutes)
+        batches = await asyncio.gather(*[self._load_candles(symbol, tf, f, t) for f, t in pages])
+        batches = [b for b in batches if len(b) > 0]
+
+        candles_total = candles_db
+        if len(batches) > 0:
+            candles = pd.concat(batches)
+            candles_total = pd.concat([candles_db, candles])
+            if self.data_provider is not None:
+                await self.data_provider.save_candles(symbol=symbol_to_binance(symbol), tf=tf, candles=candles)
 
-        while len(candles) > 0 and candles.index[0] > start_time_:
-            end_time = candles.index[0] - timedelta(minutes=1)
-            start_time_ = get_time_shift(end_time, candle_size_minutes)
+        if not candles_total.index.is_monotonic_increasing:
+            candles_total = candles_total.sort_index()
 
-            candles = await load_candles_with_cache(start_time_, end_time)
-            candles_total = pd.concat([candles_total, candles])
+        return candles_total
 
+    def set_candles(self, symbol: Symbol, tf: Tf, candles_total: pd.DataFrame) -> pd.DataFrame:
+        # preloaded history -> candles buffer, volume levels and swings of tf
         if symbol not in self.candles:
             self.candles[symbol] = {}
 
-        self.candles[symbol][tf] = candles_total
+        self.candles[symbol][tf] = CandlesBuffer.from_data_frame(candles_total)
+        self.volume_levels.setdefault(symbol, {})[tf] = VolumeLevelTracker.from_candles(candles_total)
+        self.swings.setdefault(symbol, {})[tf] = SwingDetector.from_candles(candles_total)
+
+        if len(candles_total) == 0:
+            self.logger.warning(f"Preload candles: {symbol}_{tf} - no candles.")
+            return candles_total
 
         last_candle = candles_total.iloc[-1]
         self.update_candles_dnv(
@@ -479,23 +674,7 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
         #  {'rateLimitType': 'RAW_REQUESTS', 'interval': 'MINUTE', 'intervalNum': 5, 'limit': 6100}]
         content, _ = await self.request_url("/exchangeInfo")
 
-        rate_limits = content["rateLimits"]
-        weight_limit_1m = int(
-            get_filter_value(
-                rate_limits, "REQUEST_WEIGHT", "limit", name_of_filter="rateLimitType"
-            )
-        )
-        raw_requests_5m = int(
-            get_filter_value(
-                rate_limits,
-                "RAW_REQUESTS",
-                "limit",
-                name_of_filter="rateLimitType",
-                default=weight_limit_1m,
-            )
-        )
-
-        self.request_limiter.init(weight_limit_1m, raw_requests_5m)
+        self.request_limiter.init(content["rateLimits"])
         symbols_str_list = []
         for s in content["symbols"]:
             if s["isSpotTradingAllowed"]:
@@ -517,14 +696,20 @@ class PublicBinance(PublicExchange, metaclass=Singleton):
             headers: Dict[str, str] = {},
             base_uri: Optional[str] = None
     ) -> Tuple[Any, Any]:
-        await self.request_limiter.delay(self.last_url_response)
-
-        content, _ = await super().request_url(
-            url, method, params=params, headers=headers, base_uri=base_uri
-        )
-        self.last_url_response = _
-
-        return content, _
+        for attempt in range(MAX_REQUEST_ATTEMPTS):
+            await self.request_limiter.acquire(url, params, method)
+            try:
+                content, _ = await super().request_url(
+                    url, method, params=params, headers=headers, base_uri=base_uri
+                )
+            except ExchangeApiException as e:
+                self.request_limiter.update(e.response)
+                if e.status == 429 and attempt < MAX_REQUEST_ATTEMPTS - 1:
+                    continue  # limiter holds next request until retry-after
+                raise
+
+            self.request_limiter.update(_)
+            return content, _
 
 
 if __name__ == "__main__":
@@ -1,6 +1,10 @@
-from core.exchange.binance.common import get_filter_value
 from core.exchange.binance.public import PublicBinance, get_symbol_info
 from core.exchange.common.mappers import binance_to_symbol, symbol_to_binance
+from core.exchange.protectors.binance_request_limiter import (
+    BinanceRequestLimiter,
+    FUTURES_DEFAULT_LIMITS,
+    FUTURES_ENDPOINT_WEIGHTS,
+)
 from core.types import RestMethod, Singleton
 
 BASE_FUTURES_URI = "https://fapi.binance.com/fapi/v1"
@@ -10,6 +14,7 @@ WSS_URL = "wss://fstream.binance.com/ws/"
 class PublicFuturesBinance(PublicBinance, metaclass=Singleton):
     base_uri = BASE_FUTURES_URI
     wss_url = WSS_URL  # TODO: refactor ANOTHER approach each URL onw stream
+    request_limiter = BinanceRequestLimiter(FUTURES_ENDPOINT_WEIGHTS, FUTURES_DEFAULT_LIMITS)
 
     async def load_mark_prices(self):
         content, _ = await self.request_url(f"/premiumIndex", RestMethod.GET)
@@ -20,23 +25,7 @@ class PublicFuturesBinance(PublicBinance, metaclass=Singleton):
     async def load_exchange_info(self):
         content, _ = await self.request_url("/exchangeInfo")
 
-        rateLimits = content["rateLimits"]
-        weight_limit_1m = int(
-            get_filter_value(
-                rateLimits, "REQUEST_WEIGHT", "limit", name_of_filter="rateLimitType"
-            )
-        )
-        raw_requests_5m = int(
-            get_filter_value(
-                rateLimits,
-                "RAW_REQUESTS",
-                "limit",
-                name_of_filter="rateLimitType",
-                default=weight_limit_1m,
-            )
-        )
-
-        self.request_limiter.init(weight_limit_1m, raw_requests_5m)
+        self.request_limiter.init(content["rateLimits"])
 
         for s in content["symbols"]:
             if s["status"] == "TRADING":
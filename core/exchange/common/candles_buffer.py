@@ -0,0 +1,97 @@
+from datetime import datetime
+from typing import Any, List, Optional
+
+import numpy as np
+import pandas as pd
+
+CANDLES_COLUMNS = ["o", "h", "l", "c", "v"]
+CANDLES_BUFFER_SIZE = 2500
+
+
+class CandlesBuffer(object):
+    # Fixed capacity ring of closed candles. Every row is written twice (at `pos` and `pos + capacity`),
+    # so the last `capacity` rows are always one contiguous slice (view_data_frame needs no copy).
+    def __init__(self, capacity: int = CANDLES_BUFFER_SIZE):
+        self.capacity = capacity
+        self._timestamps = np.zeros(capacity * 2, dtype="datetime64[ns]")
+        self._values = np.zeros((capacity * 2, len(CANDLES_COLUMNS)), dtype=np.float64)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def _window(self) -> slice:
+        if self._count < self.capacity:
+            return slice(0, self._count)
+
+        start = self._count % self.capacity
+        return slice(start, start + self.capacity)
+
+    def _write(self, pos: int, timestamps: np.ndarray, values: np.ndarray):
+        for p in (pos, pos + self.capacity):
+            self._timestamps[p:p + len(timestamps)] = timestamps
+            self._values[p:p + len(timestamps)] = values
+
+    def append(self, timestamp: datetime, o: float, h: float, low: float, c: float, v: float):
+        ts = np.datetime64(timestamp, "ns")
+        row = np.array([(o, h, low, c, v)], dtype=np.float64)
+        last_pos = (self._count - 1) % self.capacity
+        if self._count > 0 and self._timestamps[last_pos] == ts:
+            # same candle closed again (e.g. after reconnect) - overwrite instead of duplicate
+            self._write(last_pos, np.array([ts]), row)
+            return
+
+        self._write(self._count % self.capacity, np.array([ts]), row)
+        self._count += 1
+
+    def append_item(self, candle_item: List[Any]):
+        self.append(*candle_item)
+
+    def extend(self, candles: pd.DataFrame):
+        candles_ = candles.iloc[-self.capacity:]
+        timestamps = candles_.index.values.astype("datetime64[ns]")
+        values = candles_[CANDLES_COLUMNS].to_numpy(dtype=np.float64)
+
+        pos = self._count % self.capacity
+        first = min(len(candles_), self.capacity - pos)
+        self._write(pos, timestamps[:first], values[:first])
+        if first < len(candles_):
+            self._write(0, timestamps[first:], values[first:])
+
+        self._count += len(candles_)
+
+    @property
+    def index(self) -> np.ndarray:
+        return self._timestamps[self._window()]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[self._window()]
+
+    def column(self, name: str) -> np.ndarray:
+        return self._values[self._window(), CANDLES_COLUMNS.index(name)]
+
+    def last(self) -> Optional[List[Any]]:
+        if self._count == 0:
+            return None
+
+        pos = (self._count - 1) % self.capacity
+        return [pd.Timestamp(self._timestamps[pos]).to_pydatetime(), *self._values[pos].tolist()]
+
+    def to_data_frame(self) -> pd.DataFrame:
+        # owned copy - safe to keep across awaits and to modify
+        window = self._window()
+        index = pd.DatetimeIndex(self._timestamps[window].copy(), name="timestamp")
+        return pd.DataFrame(self._values[window].copy(), index=index, columns=CANDLES_COLUMNS, copy=False)
+
+    def view_data_frame(self) -> pd.DataFrame:
+        # zero copy view of the ring: read it right away, the next append / extend shifts its rows and index
+        window = self._window()
+        index = pd.DatetimeIndex(self._timestamps[window], name="timestamp")
+        return pd.DataFrame(self._values[window], index=index, columns=CANDLES_COLUMNS, copy=False)
+
+    @staticmethod
+    def from_data_frame(candles: pd.DataFrame, capacity: int = CANDLES_BUFFER_SIZE) -> "CandlesBuffer":
+        buffer = CandlesBuffer(max(capacity, len(candles)))
+        buffer.extend(candles)
+        return buffer
@@ -1,15 +1,22 @@
+import asyncio
+import inspect
 from datetime import datetime
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import pandas as pd
 
 from core.base import CoreBase
+from core.exchange.common.candles_buffer import CandlesBuffer
 from core.exchange.common.order_book import OrderBook
+from core.exchange.common.trades_buffer import TradesBuffer
+from core.ta.extrema import SwingDetector
+from core.ta.volume_levels import VolumeLevelTracker
 from core.exchange.binance.entities import Order
 
 # from  new.exchange.common.order_book_partial import OrderBookBase
 from core.types import Asset, RestMethod, Symbol, Tf, SymbolStr, OrderId
 from core.utils.data import candles_to_data_frame
+from core.utils.dict_ import append_item_to_dict_list
 from core.exceptions import apiExceptionFactory
 
 
@@ -65,6 +72,8 @@ class BaseExchange:
 
     def __init__(self):
         self.callbacks: List[ExchangeCallback] = []
+        self.callbacks_by_feed: Dict[str, List[ExchangeCallback]] = {}
+        self.callbacks_by_symbol: Dict[Tuple[str, Optional[Symbol]], List[ExchangeCallback]] = {}
         self.streams: Dict[str, datetime] = {}
 
     async def async_init(self):
@@ -88,6 +97,10 @@ class BaseExchange:
 
         return content, _
 
+    def _index_callback(self, ec: ExchangeCallback):
+        append_item_to_dict_list(ec.feed, self.callbacks_by_feed, ec)
+        append_item_to_dict_list((ec.feed, ec.symbol), self.callbacks_by_symbol, ec)
+
     def add_callback(
         self,
         id: Any,
@@ -100,9 +113,35 @@ class BaseExchange:
             id=id, symbol=symbol, channel=channel, callback=callback, data=data
         )
         self.callbacks.append(ec)
+        self._index_callback(ec)
 
     def remove_callback(self, id: Any):
         self.callbacks = [ec for ec in self.callbacks if ec.id != id]
+        self.callbacks_by_feed = {}
+        self.callbacks_by_symbol = {}
+        for ec in self.callbacks:
+            self._index_callback(ec)
+
+    def get_callbacks(self, feed: str, symbol: Optional[Symbol] = None) -> List[ExchangeCallback]:
+        return self.callbacks_by_symbol.get((feed, symbol), [])
+
+    def get_feed_callbacks(self, feed: str) -> List[ExchangeCallback]:
+        return self.callbacks_by_feed.get(feed, [])
+
+    @staticmethod
+    async def dispatch_callbacks(callbacks: List[ExchangeCallback], *args: Any):
+        # plain functions run inline, without a task per message. Anything returning an awaitable (async functions,
+        # partials / lambdas wrapping them, objects with async __call__) is awaited
+        coroutines = []
+        for c in callbacks:
+            result = c.callback(*args)
+            if inspect.isawaitable(result):
+                coroutines.append(result)
+
+        if len(coroutines) == 1:
+            await coroutines[0]
+        elif len(coroutines) > 1:
+            await asyncio.gather(*coroutines)
 
     async def subscribe(self, symbol: Symbol, feeds: List[str]):
         raise NotImplemented
@@ -133,15 +172,17 @@ class PublicExchange(BaseExchange):
         super().__init__()
         self.assets: List[Asset] = []
         self.order_books: Dict[Symbol, OrderBook] = {}
-        self.trades: Dict[Symbol, List[Tuple[float, float, bool]]] = {}
-        self.candles: Dict[Symbol, Dict[Tf, pd.DataFrame]] = {}
+        self.trades: Dict[Symbol, TradesBuffer] = {}
+        self.candles: Dict[Symbol, Dict[Tf, CandlesBuffer]] = {}
         self.candle_unclosed: Dict[Symbol, Dict[Tf, Optional[List[Any]]]] = {}
         self.symbol_info: Dict[Symbol, SymbolInfo] = {}
         self.mark_prices: Dict[Symbol, float] = {}
         self.candle_dnv: Dict[Symbol, Dict[Tf, float]] = {}
+        self.volume_levels: Dict[Symbol, Dict[Tf, VolumeLevelTracker]] = {}
+        self.swings: Dict[Symbol, Dict[Tf, SwingDetector]] = {}
 
-    def get_candles(self, symbol: SymbolStr, tf: Tf):
-        candles_ = self.candles[symbol][tf]
+    def get_candles(self, symbol: SymbolStr, tf: Tf) -> pd.DataFrame:
+        candles_ = self.candles[symbol][tf].to_data_frame()
         unclosed_candle = self.candle_unclosed[symbol][tf]
         if unclosed_candle is not None:
             return pd.concat([candles_, candles_to_data_frame([unclosed_candle])])
@@ -156,3 +197,23 @@ class PublicExchange(BaseExchange):
             self.candle_dnv[symbol][tf] = 0
 
         self.candle_dnv[symbol][tf] = price * volume
+
+    def update_volume_levels(self, symbol: Symbol, tf: Tf, candle_item: List[Any]):
+        # closed candles only
+        if symbol not in self.volume_levels:
+            self.volume_levels[symbol] = {}
+
+        if tf not in self.volume_levels[symbol]:
+            self.volume_levels[symbol][tf] = VolumeLevelTracker()
+
+        self.volume_levels[symbol][tf].update_item(candle_item)
+
+    def update_swings(self, symbol: Symbol, tf: Tf, candle_item: List[Any]):
+        # closed candles only, confirmed swings go to swings[symbol][tf].store
+        if symbol not in self.swings:
+            self.swings[symbol] = {}
+
+        if tf not in self.swings[symbol]:
+            self.swings[symbol][tf] = SwingDetector()
+
+        self.swings[symbol][tf].update_item(candle_item)
@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from core.types import OverflowPolicy
+
+MESSAGE_QUEUE_SIZE = 10000
+MESSAGE_BATCH_SIZE = 100
+
+
+class MessageQueue(object):
+    # Bounded queue between a socket reader and its consumers. Items are (received monotonic time, message).
+    # Overflow: DROP_OLDEST - oldest message is dropped, COALESCE - a message with the key of a queued one replaces
+    # it in place, a full queue evicts the oldest keyed message and `put` waits while only keyless ones are queued,
+    # BLOCK - `put` waits for free space.
+    def __init__(self, max_size: int = MESSAGE_QUEUE_SIZE, policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 coalesce_key: Optional[Callable[[Any], Optional[Hashable]]] = None):
+        self.max_size = max_size
+        self.policy = policy
+        self.coalesce_key = coalesce_key
+        self._items: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._keyed: OrderedDict[Hashable, None] = OrderedDict()  # queued coalescable keys, oldest first
+        self._seq = 0  # key of messages which are not coalesced
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+
+        self.received = 0
+        self.consumed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.lag = 0.0  # seconds in the queue of the last consumed message
+        self.max_lag = 0.0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _key(self, message: Any) -> Tuple[Hashable, bool]:
+        if self.coalesce_key is not None and self.policy == OverflowPolicy.COALESCE:
+            key = self.coalesce_key(message)
+            if key is not None:
+                return key, True
+
+        self._seq += 1
+        return self._seq, False
+
+    def _is_full(self) -> bool:
+        return len(self._items) >= self.max_size
+
+    def put_nowait(self, message: Any):
+        # never waits: on a full queue without keyed messages the oldest one is dropped (use `put` to wait)
+        self._put(message, *self._key(message))
+
+    def _put(self, message: Any, key: Hashable, keyed: bool):
+        self.received += 1
+        if key in self._items:
+            # in place - the queue order of other messages is kept
+            self._items[key] = (self._items[key][0], message)
+            self.coalesced += 1
+            return
+
+        if self._is_full():
+            if len(self._keyed) > 0:
+                del self._items[self._keyed.popitem(last=False)[0]]
+            else:
+                self._items.popitem(last=False)
+            self.dropped += 1
+
+        self._items[key] = (time.monotonic(), message)
+        if keyed:
+            self._keyed[key] = None
+        self.max_depth = max(self.max_depth, len(self._items))
+        self._not_empty.set()
+        if self._is_full():
+            self._not_full.clear()
+
+    async def put(self, message: Any):
+        key, keyed = self._key(message)
+        if self.policy == OverflowPolicy.BLOCK:
+            while self._is_full():
+                await self._not_full.wait()
+        elif self.policy == OverflowPolicy.COALESCE:
+            # trades, depth diffs, closed klines are never dropped - wait until a keyed message can be evicted
+            while self._is_full() and len(self._keyed) == 0 and key not in self._items:
+                self._not_full.clear()
+                await self._not_full.wait()
+        self._put(message, key, keyed)
+
+    async def get_batch(self, max_size: int = MESSAGE_BATCH_SIZE) -> List[Any]:
+        # waits for the first message, returns up to max_size queued ones
+        while len(self._items) == 0:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        batch = []
+        for _ in range(min(max_size, len(self._items))):
+            key, item = self._items.popitem(last=False)
+            self._keyed.pop(key, None)
+            batch.append(item)
+        self.lag = time.monotonic() - batch[0][0]  # oldest message of the batch
+        self.max_lag = max(self.max_lag, self.lag)
+        self.consumed += len(batch)
+        if len(self._items) < self.max_size:
+            self._not_full.set()
+        return [message for _, message in batch]
+
+    def metrics(self, reset: bool = False) -> Dict[str, Any]:
+        # counters since start, max_depth / max_lag since the last reset
+        result = dict(depth=len(self._items), max_depth=self.max_depth, lag=self.lag, max_lag=self.max_lag,
+                      received=self.received, consumed=self.consumed, dropped=self.dropped, coalesced=self.coalesced)
+        if reset:
+            self.max_depth = len(self._items)
+            self.max_lag = 0.0
+        return result
@@ -1,12 +1,75 @@
-import operator
-from collections import OrderedDict
-from typing import Callable, Dict, List, Tuple, Union
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+MAX_PENDING_UPDATES = 1000
+
+
+class OrderBookSide(object):
+    # price levels kept in a sorted key list (negated for bids) + price -> qty dict,
+    # top of book is keys[0], depth(k) is a slice of the first k keys
+    def __init__(self, reverse: bool = False):
+        self.reverse = reverse
+        self.levels: Dict[float, float] = {}
+        self._keys: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _key(self, price: float) -> float:
+        return -price if self.reverse else price
+
+    def _price(self, key: float) -> float:
+        return -key if self.reverse else key
+
+    def replace(self, items: List[Tuple[float, float]]):
+        self.levels = {p: q for p, q in items if q != 0}
+        self._keys = sorted(self._key(p) for p in self.levels.keys())
+
+    def update(self, price: float, quantity: float):
+        if quantity == 0:
+            if self.levels.pop(price, None) is not None:
+                key = self._key(price)
+                del self._keys[bisect_left(self._keys, key)]
+            return
+
+        if price not in self.levels:
+            insort(self._keys, self._key(price))
+        self.levels[price] = quantity
+
+    def update_many(self, items: List[Tuple[float, float]]):
+        for price, quantity in items:
+            self.update(price, quantity)
+
+    def top(self) -> Tuple[float, float]:
+        price = self._price(self._keys[0])
+        return price, self.levels[price]
+
+    def depth(self, k: int) -> List[Tuple[float, float]]:
+        prices = [self._price(key) for key in self._keys[:k]]
+        return [(p, self.levels[p]) for p in prices]
 
 
 class OrderBook(object):
+    # Local book kept in sync with the diff depth stream:
+    # snapshot (lastUpdateId) from /depth + `depthUpdate` events (U - first update id, u - final update id).
+    # Spot events are chained by U == previous u + 1, futures events by pu (previous final update id) == previous u
     def __init__(self):
-        self.bids: Dict = OrderedDict()
-        self.asks: Dict = OrderedDict()
+        self.bids = OrderBookSide(reverse=True)
+        self.asks = OrderBookSide()
+        self.last_update_id: Optional[int] = None
+        self._from_snapshot = False  # no event applied since the snapshot yet
+        self._pending: Deque[
+            Tuple[int, int, List[Tuple[float, float]], List[Tuple[float, float]], Optional[int]]
+        ] = deque(maxlen=MAX_PENDING_UPDATES)
+
+    @property
+    def is_synced(self) -> bool:
+        return self.last_update_id is not None
+
+    def reset(self):
+        self.last_update_id = None
+        self._pending.clear()
 
     def update_sides(
         self, bids: List[Tuple[float, float]], asks: List[Tuple[float, float]]
@@ -15,16 +78,74 @@ class OrderBook(object):
         self.update_bids(bids)
 
     def update_asks(self, asks: List[Tuple[float, float]]):
-        self.asks = OrderedDict(sorted(asks, key=operator.itemgetter(0)))
+        self.asks.replace(asks)
 
     def update_bids(self, bids: List[Tuple[float, float]]):
-        self.bids = OrderedDict(sorted(bids, key=operator.itemgetter(0), reverse=True))
+        self.bids.replace(bids)
+
+    def set_snapshot(
+        self, last_update_id: int, bids: List[Tuple[float, float]], asks: List[Tuple[float, float]]
+    ) -> bool:
+        self.update_sides(bids, asks)
+        self.last_update_id = last_update_id
+        self._from_snapshot = True
+
+        # replay updates received while the snapshot was loading
+        pending = list(self._pending)
+        self._pending.clear()
+        for i, update in enumerate(pending):
+            if not self.apply_update(*update):
+                # gap - the rest stays buffered for the next snapshot
+                self._pending.extend(pending[i + 1:])
+                return False
+
+        return True
+
+    def apply_update(
+        self,
+        first_update_id: int,
+        final_update_id: int,
+        bids: List[Tuple[float, float]],
+        asks: List[Tuple[float, float]],
+        prev_final_update_id: Optional[int] = None,
+    ) -> bool:
+        # prev_final_update_id (pu) is given by futures streams only
+        update = (first_update_id, final_update_id, bids, asks, prev_final_update_id)
+        if not self.is_synced:
+            self._pending.append(update)
+            return True
 
-    def _get_first_item(self, side: str) -> Tuple[float, float]:
-        return next(iter(self.__dict__[side].items()))
+        if prev_final_update_id is None or self._from_snapshot:
+            if final_update_id < self.last_update_id or \
+                    (prev_final_update_id is None and final_update_id == self.last_update_id):
+                return True  # already in snapshot
+            gap = first_update_id > self.last_update_id + (1 if prev_final_update_id is None else 0)
+        else:
+            gap = prev_final_update_id != self.last_update_id
+
+        if gap:
+            # gap in the stream - book must be reloaded from a fresh snapshot
+            self.reset()
+            self._pending.append(update)
+            return False
+
+        self.bids.update_many(bids)
+        self.asks.update_many(asks)
+        self.last_update_id = final_update_id
+        self._from_snapshot = False
+        return True
+
+    def top_bid(self) -> Tuple[float, float]:
+        return self.bids.top()
+
+    def top_ask(self) -> Tuple[float, float]:
+        return self.asks.top()
 
     def top_bid_price(self) -> float:
-        return self._get_first_item("bids")[0]
+        return self.top_bid()[0]
 
     def top_ask_price(self) -> float:
-        return self._get_first_item("asks")[0]
+        return self.top_ask()[0]
+
+    def depth(self, k: int) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
+        return self.bids.depth(k), self.asks.depth(k)
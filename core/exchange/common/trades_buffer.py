@@ -0,0 +1,72 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+TRADES_BUFFER_SIZE = 500
+TRADES_COLUMNS: Dict[str, str] = {"price": "float64", "quantity": "float64", "is_buyer_maker": "bool", "time": "int64"}
+
+
+class TradesBuffer(object):
+    # Columnar fixed capacity ring of last trades, mirrored like CandlesBuffer:
+    # every row is written at `pos` and `pos + capacity`, so column views are contiguous slices.
+    def __init__(self, capacity: int = TRADES_BUFFER_SIZE):
+        self.capacity = capacity
+        self._columns = {name: np.zeros(capacity * 2, dtype=dtype) for name, dtype in TRADES_COLUMNS.items()}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def _window(self) -> slice:
+        if self._count < self.capacity:
+            return slice(0, self._count)
+
+        start = self._count % self.capacity
+        return slice(start, start + self.capacity)
+
+    def append(self, price: float, quantity: float, is_buyer_maker: bool, time: int = 0):
+        pos = self._count % self.capacity
+        for p in (pos, pos + self.capacity):
+            self._columns["price"][p] = price
+            self._columns["quantity"][p] = quantity
+            self._columns["is_buyer_maker"][p] = is_buyer_maker
+            self._columns["time"][p] = time
+        self._count += 1
+
+    def extend(self, trades: List[Tuple[float, float, bool, int]]):
+        for trade in trades[-self.capacity:]:
+            self.append(*trade)
+
+    def column(self, name: str) -> np.ndarray:
+        return self._columns[name][self._window()]
+
+    @property
+    def price(self) -> np.ndarray:
+        return self.column("price")
+
+    @property
+    def quantity(self) -> np.ndarray:
+        return self.column("quantity")
+
+    @property
+    def is_buyer_maker(self) -> np.ndarray:
+        return self.column("is_buyer_maker")
+
+    @property
+    def time(self) -> np.ndarray:
+        return self.column("time")
+
+    def volume(self) -> float:
+        return float(self.quantity.sum())
+
+    def buy_volume(self) -> float:
+        # buyer is maker -> aggressive side is seller
+        return float(self.quantity[~self.is_buyer_maker].sum())
+
+    def sell_volume(self) -> float:
+        return float(self.quantity[self.is_buyer_maker].sum())
+
+    def vwap(self) -> float:
+        quantity = self.quantity
+        total = quantity.sum()
+        return float(np.dot(self.price, quantity) / total) if total > 0 else np.nan
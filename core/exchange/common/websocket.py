@@ -1,15 +1,18 @@
 import asyncio
 import time
 import traceback
-from typing import Callable, Coroutine, Dict, Optional, Any
+from typing import Callable, Coroutine, Dict, Hashable, List, Optional, Any
 
 import ujson
 import websockets
 
 from core.base import CoreBase
+from core.exchange.common.message_queue import MESSAGE_BATCH_SIZE, MESSAGE_QUEUE_SIZE, MessageQueue
+from core.types import OverflowPolicy
 from core.utils.logs import setup_logger, add_traceback
 from datetime import datetime
 WARMUP_TIME = 15
+WS_METRICS_INTERVAL = 60  # seconds between queue metrics reports
 
 
 class WebSocketBase:
@@ -23,9 +26,19 @@ class WebSocketBase:
         on_before_connect: Optional[Callable[[], Coroutine]] = None,
         on_connect: Optional[Callable[[], Coroutine]] = None,
         logger=None,
+        queue_size: int = MESSAGE_QUEUE_SIZE,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        coalesce_key: Optional[Callable[[Any], Optional[Hashable]]] = None,
+        batch_size: int = MESSAGE_BATCH_SIZE,
+        on_batch: Optional[Callable[[List[Any]], Coroutine]] = None,
     ):
+        # the reader only decodes messages into the queue, the consumer task calls on_message (or on_batch)
+        # for every queued batch - slow handlers don't stop socket reads
         self.connect = connect
         self.on_message = on_message
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        self.queue = MessageQueue(queue_size, overflow_policy, coalesce_key)
         self.name = name
         self.ws: websockets.WebSocketClientProtocol = None
         self.timeout = timeout
@@ -36,6 +49,8 @@ class WebSocketBase:
         self.logger = setup_logger(self.name)
 
         CoreBase.get_loop().create_task(self.run())
+        CoreBase.get_loop().create_task(self.consume())
+        CoreBase.get_loop().create_task(self.report_metrics())
         if self.timeout:
             CoreBase.get_loop().create_task(self.manage_timeout())
 
@@ -74,8 +89,7 @@ class WebSocketBase:
                 message = await self.ws.recv()
                 try:
                     for line in str(message).splitlines():
-                        # msg = ujson.loads(line)
-                        await self.on_message(ujson.loads(line))
+                        await self.queue.put(ujson.loads(line))
                 except Exception as e:
                     self.logger.error(add_traceback(e))
                     # traceback.print_exc()
@@ -89,6 +103,38 @@ class WebSocketBase:
             self.logger.info(f"WS {self.name} Connection Lost at {datetime.utcnow()}")
             # logging.error(add_traceback(e))
 
+    async def consume(self):
+        while True:
+            batch = await self.queue.get_batch(self.batch_size)
+            if self.on_batch is not None:
+                try:
+                    await self.on_batch(batch)
+                except Exception as e:
+                    self.logger.error(add_traceback(e))
+                continue
+
+            for msg in batch:
+                try:
+                    await self.on_message(msg)
+                except Exception as e:
+                    self.logger.error(add_traceback(e))
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        return self.queue.metrics()
+
+    async def report_metrics(self):
+        dropped = 0
+        while True:
+            await asyncio.sleep(WS_METRICS_INTERVAL)
+            metrics = self.queue.metrics(reset=True)
+            if metrics["dropped"] > dropped:
+                self.logger.warning(f"WS {self.name} consumers are behind, {metrics['dropped'] - dropped} "
+                                    f"messages dropped: {metrics}")
+            else:
+                self.logger.info(f"WS {self.name} queue: {metrics}")
+            dropped = metrics["dropped"]
+
     async def run(self):
         while True:
             if self.on_before_connect is not None:
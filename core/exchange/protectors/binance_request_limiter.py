@@ -1,68 +1,169 @@
 import asyncio
-from typing import Any
-from time import sleep
+import logging
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl
+
+from core.types import RestMethod
 from core.utils.dict_ import dict_any_value
 
+# rateLimits from /exchangeInfo:
+# [{'rateLimitType': 'REQUEST_WEIGHT', 'interval': 'MINUTE', 'intervalNum': 1, 'limit': 1200},
+#  {'rateLimitType': 'ORDERS', 'interval': 'SECOND', 'intervalNum': 10, 'limit': 50},
+#  {'rateLimitType': 'ORDERS', 'interval': 'DAY', 'intervalNum': 1, 'limit': 160000},
+#  {'rateLimitType': 'RAW_REQUESTS', 'interval': 'MINUTE', 'intervalNum': 5, 'limit': 6100}]
+
+# 'x-mbx-used-weight': '1', 'x-mbx-used-weight-1m': '1', 'x-mbx-order-count-10s': '1', 'retry-after': '7' ...
+
+INTERVAL_SECONDS = {"SECOND": 1, "MINUTE": 60, "HOUR": 60 * 60, "DAY": 60 * 60 * 24}
+USED_HEADERS_PREFIXES = {
+    "REQUEST_WEIGHT": ["x-mbx-used-weight-", "x-sapi-used-ip-weight-"],
+    "ORDERS": ["x-mbx-order-count-"],
+}
+ORDER_ENDPOINTS = ["/order"]
+DEFAULT_WEIGHT = 1
+DEFAULT_RETRY_AFTER = 60
+
+# weight of endpoint or [(max "limit" param, weight), ...] for endpoints weighted by limit
+EndpointWeights = Dict[str, Union[int, List[Tuple[int, int]]]]
+
+SPOT_ENDPOINT_WEIGHTS: EndpointWeights = {
+    "/exchangeInfo": 20,
+    "/klines": 2,
+    "/depth": [(100, 5), (500, 25), (1000, 50), (5000, 250)],
+    "/trades": 25,
+    "/ticker/price": 4,
+    "/ticker/24hr": 80,
+    "/allOrders": 20,
+    "/account": 20,
+    "/userDataStream": 2,
+}
+
+FUTURES_ENDPOINT_WEIGHTS: EndpointWeights = {
+    "/exchangeInfo": 1,
+    "/klines": [(99, 1), (499, 2), (1000, 5), (1500, 10)],
+    "/depth": [(50, 2), (100, 5), (500, 10), (1000, 20)],
+    "/premiumIndex": 10,
+    "/allOrders": 5,
+    "/listenKey": 1,
+}
+
+# "limit" used by binance when the param is not sent (weighted by it)
+SPOT_DEFAULT_LIMITS: Dict[str, int] = {"/depth": 100}
+FUTURES_DEFAULT_LIMITS: Dict[str, int] = {"/klines": 500, "/depth": 500}
+
+
+class RateLimitWindow(object):
+    # fixed window as counted by binance: `used` is reset at every interval boundary (e.g. each calendar minute)
+    # and synced from the used weight / order count headers
+    def __init__(self, limit_type: str, interval: str, interval_num: int, limit: int):
+        self.limit_type = limit_type
+        self.limit = limit
+        self.seconds = INTERVAL_SECONDS[interval] * interval_num
+        self.used = 0
+        self.window_start = 0.0
+        suffix = f"{interval_num}{interval[0].lower()}"
+        self.used_headers = [f"{prefix}{suffix}" for prefix in USED_HEADERS_PREFIXES.get(limit_type, [])]
+
+    def roll(self, now: float):
+        window_start = math.floor(now / self.seconds) * self.seconds
+        if window_start != self.window_start:
+            self.window_start = window_start
+            self.used = 0
+
+    def wait_time(self, cost: int, now: float) -> float:
+        # request bigger than the limit goes alone in a fresh window
+        if self.used + min(cost, self.limit) <= self.limit:
+            return 0.0
+        return self.window_start + self.seconds - now
 
-# used_weight_1m = int(dictAnyValueOf(['x-mbx-used-weight-1m', 'x-sapi-used-weight-1m', 'x-mbx-used-weight'],
-#                                     headers, BinanceRestApi.weight_limit_1m))
-#
-# slow_down_time = used_weight_1m / BinanceRestApi.weight_limit_1m
-# second = pd.to_datetime(headers['date']).second
-# delay = slow_down_time if 'retry-after' not in client.response.headers else int(headers['retry-after'])
-# BinanceRestApi.rate_limit_info = f'Delay: {round(delay, 3)}s  ' \
-#                                  f'Weight: {used_weight_1m}/{BinanceRestApi.weight_limit_1m} ' \
-#                                  f'Seconds: {60 - second}'
-# sleep(delay)
+    def sync_used(self, used: int, now: float):
+        self.roll(now)
+        self.used = used
 
-# 'x-mbx-used-weight': '1', 'x-mbx-used-weight-1m': '1', 'Content-Encoding': 'gzip', 'Strict-Transport-Security': 'max-age=31536000; includeSubdomains', 'X-Frame-Options': 'SAMEORIGIN', 'X-Xss-Protection': '1; mode=block', 'X-Content-Type-Options': 'nosniff', 'Content-Security-Policy': "default-src 'self'", 'X-Content-Security-Policy': "default-src 'self'", 'X-WebKit-CSP': "default-src 'self'", 'Cache-Control': 'no-cache, no-store, must-revalidate', 'Pragma': 'no-cache', 'Expires': '0', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': 'GET, HEAD, OPTIONS', 'X-Cache': 'Miss from cloudfront', 'Via': '1.1 a8f46a0f81ad5be499efe8a1372dd92a.cloudfront.net (CloudFront)', 'X-Amz-Cf-Pop': 'BOM78-P4', 'X-Amz-Cf-Id': '6L3i7UY6FWQDdgdATqZoLzT9vSs5VsfDcrgLYfEd-AD1sFqqBEHzpQ==')>
+    def __str__(self):
+        return f"{self.limit_type}: {self.used}/{self.limit}"
 
 
 class BinanceRequestLimiter(object):
-    weight_limit_1m = 10
-    raw_requests_5m = 2000
-    info = ""
-    initialized = False
-
-    def __init__(self):
-        super().__init__()
-        # BinanceRestApi.weight_limit_1m = int(
-        #     [v['limit'] for v in exchange_info['rateLimits'] if v['rateLimitType'] == 'REQUEST_WEIGHT'][0])
-        #
-
-    def init(self, weight_limit_1m: int, raw_requests_5m: int):
-        self.weight_limit_1m = weight_limit_1m
-        self.raw_requests_5m = raw_requests_5m
+    def __init__(self, endpoint_weights: Optional[EndpointWeights] = None,
+                 default_limits: Optional[Dict[str, int]] = None):
+        self.endpoint_weights = endpoint_weights or SPOT_ENDPOINT_WEIGHTS
+        self.default_limits = default_limits if default_limits is not None else SPOT_DEFAULT_LIMITS
+        self.windows: List[RateLimitWindow] = []
+        self.blocked_until = 0.0
+        self.initialized = False
+        self.info = ""
+        self._lock: Optional[asyncio.Lock] = None
+
+    def init(self, rate_limits: List[Dict[str, Any]]):
+        self.windows = [
+            RateLimitWindow(r["rateLimitType"], r["interval"], int(r["intervalNum"]), int(r["limit"]))
+            for r in rate_limits
+        ]
         self.initialized = True
 
-    async def delay(self, resp: Any):
-        if not self.initialized or resp is None:
+    def get_weight(self, url: str, params: Optional[Dict] = None) -> int:
+        path, _, query = url.partition("?")
+        weight = self.endpoint_weights.get(path, DEFAULT_WEIGHT)
+        if isinstance(weight, int):
+            return weight
+
+        params_ = {**dict(parse_qsl(query)), **(params or {})}
+        limit = int(params_.get("limit", self.default_limits.get(path, 0)))
+        return next((w for max_limit, w in weight if limit <= max_limit), weight[-1][1])
+
+    def _get_lock(self) -> asyncio.Lock:
+        # lazy - lock must be created inside the running loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _cost(self, window: RateLimitWindow, weight: int, is_order: bool) -> int:
+        if window.limit_type == "REQUEST_WEIGHT":
+            return weight
+        if window.limit_type == "ORDERS":
+            return 1 if is_order else 0
+        return 1  # RAW_REQUESTS
+
+    async def acquire_weight(self, weight: int = DEFAULT_WEIGHT, is_order: bool = False):
+        # FIFO: waiters queue on the lock, the head sleeps until every window can pay for the request
+        async with self._get_lock():
+            while True:
+                now = time.time()
+                delay = self.blocked_until - now
+                if delay <= 0:
+                    for window in self.windows:
+                        window.roll(now)
+                    delay = max([w.wait_time(self._cost(w, weight, is_order), now) for w in self.windows],
+                                default=0.0)
+
+                if delay <= 0:
+                    for window in self.windows:
+                        window.used += self._cost(window, weight, is_order)
+                    return
+
+                await asyncio.sleep(delay)
+
+    async def acquire(self, url: str, params: Optional[Dict] = None, method: RestMethod = RestMethod.GET):
+        is_order = method == RestMethod.POST and url.partition("?")[0] in ORDER_ENDPOINTS
+        await self.acquire_weight(self.get_weight(url, params), is_order)
+
+    def update(self, resp: Any):
+        if resp is None:
             return
 
         headers = resp.headers
-        used_weight_1m = int(
-            dict_any_value(
-                ["x-mbx-used-weight-1m", "x-sapi-used-weight-1m", "x-mbx-used-weight"],
-                headers,
-                self.weight_limit_1m,
-            )
-        )
-
-        slow_down_time = used_weight_1m / self.weight_limit_1m
-        # second = pd.to_datetime(headers['date']).second
-        # f'Seconds: {60 - second}'
-
-        delay = (
-            slow_down_time
-            if "retry-after" not in headers
-            else int(headers["retry-after"])
-        )
-
-        self.info = (
-            f"Delay: {round(delay, 3)}s  "
-            f"Weight: {used_weight_1m}/{self.weight_limit_1m} "
-            f"Raw: /{self.raw_requests_5m} "
-        )
-        print(self.info)
-        sleep(delay)
-        # await asyncio.sleep(delay)
+        now = time.time()
+        for window in self.windows:
+            used = dict_any_value(window.used_headers, headers)
+            if used is not None:
+                window.sync_used(int(used), now)
+
+        if resp.status in [418, 429]:
+            retry_after = int(headers.get("retry-after", DEFAULT_RETRY_AFTER))
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+            logging.warning(f"Request limit exceeded [{resp.status}] - blocked for {retry_after}s")
+
+        self.info = " ".join([str(w) for w in self.windows])
@@ -1 +1,6 @@
-from .data_provider import TimescaleDataProvider, DataProvider
+from .data_provider import TimescaleDataProvider, InfluxDataProvider, DataProvider
+from .cached_data_provider import CachedDataProvider
+from .memory_cached_data_provider import MemoryCachedDataProvider
+
+__all__ = ["DataProvider", "TimescaleDataProvider", "InfluxDataProvider", "CachedDataProvider",
+           "MemoryCachedDataProvider"]
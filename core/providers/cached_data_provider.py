@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from core.providers.data_provider import DataProvider
+from core.types import SymbolStr, Tf
+from core.utils.timeframe import round_time_to_tf, tf_size_minutes
+
+CANDLES_CACHE_DIR = "candles_cache"
+CANDLES_CACHE_MAX_SIZE = 2 * 1024 ** 3  # bytes on disk, least recently used keys are removed above it
+CACHE_COLUMNS = ["o", "h", "l", "c", "v"]
+RANGE_FILE = "range.npy"  # [covered from, covered to) - every stored candle of this range is in the cache
+
+
+class CachedDataProvider(DataProvider):
+    # Closed candles of every (symbol, tf) kept on local disk as raw .npy columns, read back memory mapped.
+    # Ranges inside the cached one are served from disk, only the tail is loaded from the wrapped provider.
+    # The cached range ends at the last candle returned by the provider (not at the requested end), so
+    # candles saved later behind it (exchange preload) extend the cache instead of invalidating it.
+    def __init__(self, provider: DataProvider, path: Optional[str] = None, max_size: int = CANDLES_CACHE_MAX_SIZE):
+        super().__init__()
+        self.provider = provider
+        self.path = path or os.path.join(Config.DATA_PATH or ".", CANDLES_CACHE_DIR)
+        self.max_size = max_size
+        self.locks: Dict[Tuple[SymbolStr, Tf], asyncio.Lock] = {}
+
+    async def init(self):
+        os.makedirs(self.path, exist_ok=True)
+        await self.provider.init()
+
+    def _key_path(self, symbol: SymbolStr, tf: Tf) -> str:
+        return os.path.join(self.path, f"{symbol}_{tf}")
+
+    def _lock(self, symbol: SymbolStr, tf: Tf) -> asyncio.Lock:
+        return self.locks.setdefault((symbol, tf), asyncio.Lock())
+
+    def _read_range(self, symbol: SymbolStr, tf: Tf) -> Optional[Tuple[np.datetime64, np.datetime64]]:
+        try:
+            covered_from, covered_to = np.load(os.path.join(self._key_path(symbol, tf), RANGE_FILE))
+        except (FileNotFoundError, ValueError):
+            return None
+        return covered_from, covered_to
+
+    def _read(self, symbol: SymbolStr, tf: Tf, start: np.datetime64, end: np.datetime64) -> pd.DataFrame:
+        # memory mapped - only the pages of [start, end) are read
+        path = self._key_path(symbol, tf)
+        timestamps = np.load(os.path.join(path, "timestamp.npy"), mmap_mode="r")
+        first, last = np.searchsorted(timestamps, [start, end])
+        df = pd.DataFrame(
+            {column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")[first:last]
+             for column in CACHE_COLUMNS},
+            index=pd.DatetimeIndex(timestamps[first:last], name="timestamp"),
+        )
+        os.utime(os.path.join(path, RANGE_FILE))  # recently used
+        return df
+
+    def _write(self, symbol: SymbolStr, tf: Tf, candles: pd.DataFrame, covered_from: np.datetime64,
+               covered_to: np.datetime64):
+        # new column files are written next to the old ones and swapped in, the range file goes last
+        path = self._key_path(symbol, tf)
+        os.makedirs(path, exist_ok=True)
+        os.utime(path)
+        columns = {"timestamp": candles.index.values.astype("datetime64[ns]")}
+        columns.update({column: candles[column].to_numpy(dtype=np.float64) for column in CACHE_COLUMNS})
+        for name, values in columns.items():
+            np.save(os.path.join(path, f"{name}.tmp.npy"), values)
+            os.replace(os.path.join(path, f"{name}.tmp.npy"), os.path.join(path, f"{name}.npy"))
+
+        cache_range = np.array([covered_from, covered_to], dtype="datetime64[ns]")
+        np.save(os.path.join(path, "range.tmp.npy"), cache_range)
+        os.replace(os.path.join(path, "range.tmp.npy"), os.path.join(path, RANGE_FILE))
+
+    def _store(self, symbol: SymbolStr, tf: Tf, candles: pd.DataFrame, covered_from: np.datetime64,
+               covered_to: np.datetime64):
+        # merged with the cached range when they touch, replaced otherwise
+        cached_range = self._read_range(symbol, tf)
+        if cached_range is not None and cached_range[0] <= covered_to and covered_from <= cached_range[1]:
+            cached = self._read(symbol, tf, *cached_range)
+            candles = pd.concat([cached[cached.index < covered_from], candles, cached[cached.index >= covered_to]])
+            covered_from, covered_to = min(covered_from, cached_range[0]), max(covered_to, cached_range[1])
+
+        self._write(symbol, tf, candles, covered_from, covered_to)
+        self._evict()
+
+    def _evict(self):
+        # least recently used keys above max_size
+        keys = []
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            if not os.path.isdir(path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+            range_file = os.path.join(path, RANGE_FILE)
+            used = os.stat(range_file).st_mtime if os.path.exists(range_file) else 0
+            keys.append((used, size, path))
+
+        total = sum(size for _, size, _ in keys)
+        for _, size, path in sorted(keys):
+            if total <= self.max_size:
+                break
+            logging.info(f"Candles cache: evict {path}")
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    async def _run(self, func, *args):
+        # file io off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def load_candles(
+            self,
+            symbol: SymbolStr,
+            tf: Tf,
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None,
+    ) -> pd.DataFrame:
+        if start_time is None:
+            return await self.provider.load_candles(symbol, tf, start_time, end_time)
+
+        # only closed candles are cached
+        closed_to = round_time_to_tf(datetime.utcnow(), tf)
+        end_time = end_time or closed_to
+        start, end = np.datetime64(start_time, "ns"), np.datetime64(end_time, "ns")
+
+        async with self._lock(symbol, tf):
+            cached_range = await self._run(self._read_range, symbol, tf)
+            if cached_range is not None and cached_range[0] <= start <= cached_range[1]:
+                cached = await self._run(self._read, symbol, tf, start, min(end, cached_range[1]))
+                if end <= cached_range[1]:
+                    return cached
+                fetch_from = cached_range[1].astype("datetime64[us]").item()
+            else:
+                cached = None
+                fetch_from = start_time
+
+            tail = await self.provider.load_candles(symbol, tf, fetch_from, end_time)
+            closed = tail[tail.index < closed_to]
+            if len(closed) > 0:
+                covered_to = np.datetime64(closed.index[-1] + timedelta(minutes=tf_size_minutes(tf)), "ns")
+                await self._run(self._store, symbol, tf, closed, np.datetime64(fetch_from, "ns"), covered_to)
+
+        if cached is None or len(cached) == 0:
+            return tail
+        return pd.concat([cached, tail]) if len(tail) > 0 else cached
+
+    def _truncate(self, symbol: SymbolStr, tf: Tf, timestamp: np.datetime64):
+        # candles from `timestamp` are overwritten - the cached range ends before them
+        cached_range = self._read_range(symbol, tf)
+        if cached_range is None or timestamp >= cached_range[1]:
+            return
+        if timestamp <= cached_range[0]:
+            shutil.rmtree(self._key_path(symbol, tf), ignore_errors=True)
+            return
+
+        cached = self._read(symbol, tf, cached_range[0], timestamp)
+        self._write(symbol, tf, cached, cached_range[0], timestamp)
+
+    async def save_candles(self, symbol: SymbolStr, tf: Tf, candles: pd.DataFrame):
+        await self.save_candles_many({(symbol, tf): candles})
+
+    async def save_candles_many(self, candles_by_symbol: Dict[Tuple[SymbolStr, Tf], pd.DataFrame]):
+        await self.provider.save_candles_many(candles_by_symbol)
+        for (symbol, tf), candles in candles_by_symbol.items():
+            if len(candles) > 0:
+                async with self._lock(symbol, tf):
+                    await self._run(self._truncate, symbol, tf, np.datetime64(candles.index.min(), "ns"))
@@ -9,6 +9,7 @@ from config import Config
 from core.types import Singleton, SymbolStr, Tf, Tuple, TaLevels
 from core.utils.data import candles_to_data_frame
 from core.db import TimesScaleDb
+from core.db.influxdb import InfluxDb
 from core.base import CoreBase
 
 
@@ -19,6 +20,10 @@ class DataProvider(object):
     async def save_candles(self, symbol: SymbolStr, tf: Tf, candles: pd.DataFrame):
         logging.warning(f"save_candles - not implemented")
 
+    async def save_candles_many(self, candles_by_symbol: Dict[Tuple[SymbolStr, Tf], pd.DataFrame]):
+        for (symbol, tf), candles in candles_by_symbol.items():
+            await self.save_candles(symbol, tf, candles)
+
     async def load_candles(
             self,
             symbol: SymbolStr,
@@ -39,11 +44,39 @@ class DataProvider(object):
 class TimescaleDataProvider(DataProvider):
     def __init__(self, config: Optional[Config] = None, db: Optional[TimesScaleDb] = None):
         super().__init__()
-        self.db: Optional[TimesScaleDb] = db or TimesScaleDb(**config.get_timescale_db_params())
+        # pool - the exchange preloads many symbols concurrently
+        self.db: Optional[TimesScaleDb] = db or TimesScaleDb(**config.get_timescale_db_params(), use_pool=True)
 
     async def save_candles(self, symbol: SymbolStr, tf: Tf, candles: pd.DataFrame):
         await self.db.save_candles(symbol, tf, candles)
 
+    async def save_candles_many(self, candles_by_symbol: Dict[Tuple[SymbolStr, Tf], pd.DataFrame]):
+        await self.db.save_candles_many(candles_by_symbol)
+
+    async def load_candles(
+            self,
+            symbol: SymbolStr,
+            tf: Tf,
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None,
+    ) -> pd.DataFrame:
+        return await self.db.load_candles(symbol, tf, start_time, end_time)
+
+    async def init(self):
+        await self.db.init()
+
+
+class InfluxDataProvider(DataProvider):
+    def __init__(self, config: Optional[Config] = None, db: Optional[InfluxDb] = None):
+        super().__init__()
+        self.db: Optional[InfluxDb] = db or InfluxDb(**config.get_influx_db_params())
+
+    async def save_candles(self, symbol: SymbolStr, tf: Tf, candles: pd.DataFrame):
+        await self.db.save_candles(symbol, tf, candles)
+
+    async def save_candles_many(self, candles_by_symbol: Dict[Tuple[SymbolStr, Tf], pd.DataFrame]):
+        await self.db.save_candles_many(candles_by_symbol)
+
     async def load_candles(
             self,
             symbol: SymbolStr,
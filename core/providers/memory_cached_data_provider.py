@@ -0,0 +1,190 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from core.providers.data_provider import DataProvider
+from core.types import SymbolStr, Tf
+from core.utils.data import candles_to_data_frame
+from core.utils.timeframe import round_time_to_tf, tf_size_minutes
+
+MEMORY_CACHE_MAX_SIZE = 512 * 1024 ** 2  # bytes of cached DataFrames
+
+# [covered from, covered to) and candles of that range
+Segment = Tuple[datetime, datetime, pd.DataFrame]
+
+
+def slice_candles(candles: pd.DataFrame, start_time: datetime, end_time: datetime) -> pd.DataFrame:
+    first, last = candles.index.searchsorted([start_time, end_time])
+    return candles.iloc[first:last]
+
+
+class MemoryCachedDataProvider(DataProvider):
+    # In-process range cache in front of any DataProvider: contiguous segments of closed candles per
+    # (symbol, tf), overlapping / adjacent ranges are merged, only the uncovered parts of a request are queried.
+    # Concurrent queries of the same range share one request (single-flight). Keys are evicted least recently
+    # used first above max_size bytes.
+    def __init__(self, provider: DataProvider, max_size: int = MEMORY_CACHE_MAX_SIZE):
+        super().__init__()
+        self.provider = provider
+        self.max_size = max_size
+        self.segments: OrderedDict[Tuple[SymbolStr, Tf], List[Segment]] = OrderedDict()
+        self.sizes: Dict[Tuple[SymbolStr, Tf], int] = {}
+        self.versions: Dict[Tuple[SymbolStr, Tf], int] = {}  # bumped by saves
+        self.in_flight: Dict[Tuple[SymbolStr, Tf, datetime, datetime], asyncio.Future] = {}
+        self.stats: Dict[str, int] = dict(hits=0, partial_hits=0, misses=0, coalesced=0, queries=0, evictions=0)
+
+    async def init(self):
+        await self.provider.init()
+
+    @property
+    def size(self) -> int:
+        return sum(self.sizes.values())
+
+    @property
+    def hit_ratio(self) -> float:
+        requests = self.stats["hits"] + self.stats["partial_hits"] + self.stats["misses"]
+        return self.stats["hits"] / requests if requests > 0 else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, size=self.size, keys=len(self.segments), hit_ratio=self.hit_ratio)
+
+    def _missing(self, key: Tuple[SymbolStr, Tf], start_time: datetime, end_time: datetime) \
+            -> List[Tuple[datetime, datetime]]:
+        # parts of [start_time, end_time) not covered by segments
+        missing = []
+        cursor = start_time
+        for covered_from, covered_to, _ in self.segments.get(key, []):
+            if covered_to <= cursor:
+                continue
+            if covered_from >= end_time:
+                break
+            if covered_from > cursor:
+                missing.append((cursor, covered_from))
+            cursor = max(cursor, covered_to)
+
+        if cursor < end_time:
+            missing.append((cursor, end_time))
+        return missing
+
+    def _insert(self, key: Tuple[SymbolStr, Tf], start_time: datetime, end_time: datetime, candles: pd.DataFrame):
+        # merge with every segment it overlaps or touches, new candles win
+        merged_from, merged_to, parts, segments = start_time, end_time, [candles], []
+        for segment in self.segments.get(key, []):
+            covered_from, covered_to, cached = segment
+            if covered_to < start_time or covered_from > end_time:
+                segments.append(segment)
+                continue
+
+            merged_from, merged_to = min(merged_from, covered_from), max(merged_to, covered_to)
+            parts += [slice_candles(cached, covered_from, start_time), slice_candles(cached, end_time, covered_to)]
+
+        parts = [part for part in parts if len(part) > 0]
+        merged = pd.concat(parts).sort_index() if len(parts) > 1 else candles
+        segments.append((merged_from, merged_to, merged))
+        self._set(key, sorted(segments, key=lambda s: s[0]))
+
+    def _set(self, key: Tuple[SymbolStr, Tf], segments: List[Segment]):
+        self.segments[key] = segments
+        self.segments.move_to_end(key)
+        self.sizes[key] = sum(int(c.memory_usage(index=True).sum()) for _, _, c in segments)
+        self._evict(key)
+
+    def _evict(self, keep: Tuple[SymbolStr, Tf]):
+        while self.size > self.max_size and len(self.segments) > 1:
+            key = next(iter(self.segments))
+            if key == keep:
+                break
+            del self.segments[key]
+            del self.sizes[key]
+            self.stats["evictions"] += 1
+
+    async def _query(self, symbol: SymbolStr, tf: Tf, start_time: datetime, end_time: datetime) -> pd.DataFrame:
+        # single-flight: identical ranges in progress are awaited, not queried again
+        flight_key = (symbol, tf, start_time, end_time)
+        future = self.in_flight.get(flight_key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(self.provider.load_candles(symbol, tf, start_time, end_time))
+        self.in_flight[flight_key] = future
+        self.stats["queries"] += 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if self.in_flight.get(flight_key) is future:
+                del self.in_flight[flight_key]
+
+    async def load_candles(
+            self,
+            symbol: SymbolStr,
+            tf: Tf,
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None,
+    ) -> pd.DataFrame:
+        if start_time is None or end_time is None:
+            return await self.provider.load_candles(symbol, tf, start_time, end_time)
+
+        key = (symbol, tf)
+        # only closed candles are cached, the rest of the range is always queried
+        closed_to = max(min(end_time, round_time_to_tf(datetime.utcnow(), tf)), start_time)
+        missing = self._missing(key, start_time, closed_to)
+        if len(missing) == 0:
+            self.stats["hits"] += 1
+        else:
+            self.stats["partial_hits" if missing != [(start_time, closed_to)] else "misses"] += 1
+
+        # cached parts are taken before awaiting, segments may change meanwhile
+        parts = [slice_candles(c, start_time, closed_to) for f, t, c in self.segments.get(key, [])
+                 if f < closed_to and t > start_time]
+        if key in self.segments:
+            self.segments.move_to_end(key)
+
+        version = self.versions.get(key, 0)
+        queries = missing + ([(closed_to, end_time)] if closed_to < end_time else [])
+        results = await asyncio.gather(*[self._query(symbol, tf, f, t) for f, t in queries])
+        for (f, t), candles in zip(missing, results):
+            # not after a save of the same key - the result may be older than the saved candles.
+            # Covered up to the last returned candle: a lagging db tail is queried again next time
+            if self.versions.get(key, 0) == version and len(candles) > 0:
+                t = min(t, candles.index[-1] + timedelta(minutes=tf_size_minutes(tf)))
+                self._insert(key, f, t, candles)
+
+        parts = [part for part in parts + list(results) if len(part) > 0]
+        if len(parts) == 0:
+            return candles_to_data_frame([])
+        return pd.concat(parts).sort_index() if len(parts) > 1 else parts[0].copy()
+
+    def invalidate(self, symbol: SymbolStr, tf: Tf, start_time: Optional[datetime] = None):
+        # cached ranges end before start_time (everything is dropped without it)
+        key = (symbol, tf)
+        self.versions[key] = self.versions.get(key, 0) + 1
+        if key not in self.segments:
+            return
+
+        segments = []
+        if start_time is not None:
+            for covered_from, covered_to, cached in self.segments[key]:
+                if covered_from >= start_time:
+                    continue
+                if covered_to > start_time:
+                    covered_to, cached = start_time, slice_candles(cached, covered_from, start_time)
+                segments.append((covered_from, covered_to, cached))
+
+        if len(segments) == 0:
+            del self.segments[key]
+            del self.sizes[key]
+        else:
+            self._set(key, segments)
+
+    async def save_candles(self, symbol: SymbolStr, tf: Tf, candles: pd.DataFrame):
+        await self.save_candles_many({(symbol, tf): candles})
+
+    async def save_candles_many(self, candles_by_symbol: Dict[Tuple[SymbolStr, Tf], pd.DataFrame]):
+        await self.provider.save_candles_many(candles_by_symbol)
+        for (symbol, tf), candles in candles_by_symbol.items():
+            if len(candles) > 0:
+                self.invalidate(symbol, tf, candles.index.min())
@@ -1,40 +1,93 @@
 import pandas as pd
 import numpy as np
 from datetime import timedelta
-from typing import Dict
+from typing import Dict, Optional, Tuple
 # import numba
 # from numba import jit
 #
 #
 
 
-# @jit(nopython=True)
-def get_clusters_by_tf(trades: pd.DataFrame, min_price: float,  max_price: float, step: float, tf_size:timedelta):
-    data = trades[["price", "volume"]]
-    clusters_all = {}
-    min_vol = 1e10
-    max_vol = 0
-    for interval in list(pd.cut(data.index, np.arange(trades.index[0], trades.index[-1], tf_size)).categories):
-        print(interval)
-        if not pd.isnull(interval):
-            chunk = data.query("@interval.left <= index < @interval.right")
-            # clusters = chunk['volume'].groupby(pd.cut(chunk.price, np.arange(min_price, max_price, step))).sum()
-            clusters = get_clusters(chunk, chunk.price.min(), chunk.price.max(), step)
-            clusters_all[interval.left] = clusters
-            min_vol = min(clusters[clusters > 0].min(), max_vol)
-            max_vol = max(clusters.max(), max_vol)
-
-    return clusters_all, (min_vol, max_vol)
+def get_footprint(trades: pd.DataFrame, step: float, tf_size: timedelta, min_price: Optional[float] = None,
+                  max_price: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # single pass: (time bucket, price step) integer cell per trade + bincount of volumes
+    # returns bucket start times [n_t], price levels (bucket lower bound) [n_p] and dense volumes [n_t, n_p]
+    times = trades.index.values.astype("datetime64[ns]").astype(np.int64)
+    prices = trades["price"].to_numpy(dtype=np.float64)
+    volumes = trades["volume"].to_numpy(dtype=np.float64)
+
+    mask = np.ones(len(prices), dtype=bool)
+    if min_price is not None:
+        mask &= prices >= min_price
+    if max_price is not None:
+        mask &= prices <= max_price
+    if not mask.all():
+        times, prices, volumes = times[mask], prices[mask], volumes[mask]
+
+    if len(prices) == 0:
+        return np.array([], dtype="datetime64[ns]"), np.array([]), np.zeros((0, 0))
+
+    tf_ns = int(tf_size.total_seconds() * 1e9)
+    time_start = times.min() // tf_ns * tf_ns
+    price_start = np.floor((min_price if min_price is not None else prices.min()) / step) * step
+
+    t_idx = (times - time_start) // tf_ns
+    p_idx = np.floor((prices - price_start) / step).astype(np.int64)
+    n_t = int(t_idx.max()) + 1
+    n_p = int(p_idx.max()) + 1
+
+    dense = np.bincount(t_idx * n_p + p_idx, weights=volumes, minlength=n_t * n_p).reshape(n_t, n_p)
+    bucket_times = (time_start + np.arange(n_t, dtype=np.int64) * tf_ns).astype("datetime64[ns]")
+    price_levels = price_start + np.arange(n_p) * step
+
+    return bucket_times, price_levels, dense
+
+
+def get_footprint_min_max(volumes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # per time bucket min (of non empty cells) and max volume
+    if volumes.size == 0:
+        return np.array([]), np.array([])
+
+    min_vol = np.where(volumes > 0, volumes, np.inf).min(axis=1)
+    min_vol[np.isinf(min_vol)] = 0
+    return min_vol, volumes.max(axis=1)
+
+
+def footprint_to_clusters(bucket_times: np.ndarray, price_levels: np.ndarray, volumes: np.ndarray,
+                          step: float) -> pd.DataFrame:
+    # sparse (COO) form - only non empty cells, columns as in `clusters` table
+    t_idx, p_idx = np.nonzero(volumes)
+    return pd.DataFrame({
+        "timestamp": bucket_times[t_idx],
+        "price_from": price_levels[p_idx],
+        "price_to": price_levels[p_idx] + step,
+        "volume": volumes[t_idx, p_idx],
+    })
+
+
+def get_clusters_by_tf(trades: pd.DataFrame, min_price: float, max_price: float, step: float, tf_size: timedelta):
+    bucket_times, price_levels, volumes = get_footprint(trades, step, tf_size, min_price, max_price)
+    if volumes.size == 0:
+        return {}, (0.0, 0.0)
+
+    intervals = pd.IntervalIndex.from_arrays(price_levels, price_levels + step, closed="left")
+    clusters_all = {pd.Timestamp(t): pd.Series(volumes[i], index=intervals) for i, t in enumerate(bucket_times)}
+
+    non_empty = volumes[volumes > 0]
+    min_vol = non_empty.min() if len(non_empty) > 0 else 0.0
+    return clusters_all, (min_vol, volumes.max())
 
 
 def get_clusters(trades: pd.DataFrame, min_price: float, max_price: float, step: float):
     data = trades[["price", "volume"]]
 
-    clusters = data.volume.groupby(pd.cut(data.price, np.arange(min_price, max_price, step))).sum()
-    if not clusters.empty:
-        min_vol = clusters[clusters > 0].min()
-        max_vol = clusters.max()
-        clusters_result = [(i.left, i.right, c) for i, c in clusters.items()]
+    edges = np.arange(min_price, max_price, step)
+    if len(edges) > 1:
+        volumes, _ = np.histogram(data.price.to_numpy(), bins=edges, weights=data.volume.to_numpy())
+        non_empty = volumes[volumes > 0]
+        min_vol = non_empty.min() if len(non_empty) > 0 else 0.0
+        max_vol = volumes.max()
+        clusters_result = list(zip(edges[:-1], edges[1:], volumes))
     else:
         min_vol = data.volume.min()
         max_vol = data.volume.max()
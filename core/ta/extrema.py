@@ -0,0 +1,149 @@
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.ta.ta import (
+    PRICE_LEVEL_MIN_TOUCHES,
+    PRICE_LEVEL_TOLERANCE,
+    SWING_ORDER,
+    get_price_levels,
+    get_swing_extrema,
+)
+
+SWING_COLUMNS = ["h", "l"]
+CANDLE_ITEM_COLUMNS = ["timestamp", "o", "h", "l", "c", "v"]
+# swing events kept by a level store - live detectors run for the whole session
+PRICE_LEVEL_MAX_EVENTS = 2000
+
+# (timestamp, column, price, is_high)
+SwingEvent = Tuple[datetime, str, float, bool]
+
+
+class ExtremaDetector(object):
+    # Swing high / low of one series: value is >= (<=) every value `order` candles on each side
+    # (fewer on the left at the start of data, like argrelextrema mode="clip").
+    # Confirmed when `order` candles after it have closed. Window max / min by monotonic deques - O(1) amortised.
+    def __init__(self, order: int = SWING_ORDER):
+        self.order = order
+        self.count = 0
+        self._max: Deque[Tuple[int, float]] = deque()  # decreasing values
+        self._min: Deque[Tuple[int, float]] = deque()  # increasing values
+        self._values: Deque[float] = deque(maxlen=order + 1)  # confirmation candidate .. last value
+
+    def _push(self, value: float):
+        index = self.count
+        while len(self._max) > 0 and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((index, value))
+        while len(self._min) > 0 and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((index, value))
+
+        first = index - 2 * self.order
+        while self._max[0][0] < first:
+            self._max.popleft()
+        while self._min[0][0] < first:
+            self._min.popleft()
+
+        self._values.append(value)
+        self.count += 1
+
+    def update(self, value: float) -> Optional[Tuple[int, float, bool, bool]]:
+        # returns (index, value, is_high, is_low) of the candle `order` candles back
+        self._push(value)
+        index = self.count - 1 - self.order
+        if index < 0:
+            return None
+
+        value_ = self._values[0]
+        return index, value_, value_ >= self._max[0][1], value_ <= self._min[0][1]
+
+    def prime(self, values: np.ndarray):
+        # continue after history (already processed by the batch mode) without emitting
+        self.count = len(values) - min(len(values), 2 * self.order)
+        for value in values[self.count:]:
+            self._push(float(value))
+
+
+class PriceLevelStore(object):
+    # swing events (last `max_size`) and price levels clustered from them
+    def __init__(self, max_size: Optional[int] = PRICE_LEVEL_MAX_EVENTS):
+        self.events: Deque[SwingEvent] = deque(maxlen=max_size)
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def add(self, event: SwingEvent):
+        self.events.append(event)
+
+    def extend(self, events: List[SwingEvent]):
+        self.events.extend(events)
+
+    def prices(self, is_high: Optional[bool] = None) -> np.ndarray:
+        return np.array([e[2] for e in self.events if is_high is None or e[3] == is_high], dtype=np.float64)
+
+    def levels(self, tolerance: float = PRICE_LEVEL_TOLERANCE,
+               min_touches: int = PRICE_LEVEL_MIN_TOUCHES) -> np.ndarray:
+        return get_price_levels(self.prices(), tolerance, min_touches)
+
+
+class SwingDetector(object):
+    # Streaming replacement of get_sup_resist_peaks: swing highs / lows of `h` and `l` of closed candles
+    # go to the level store as soon as they are confirmed. `backfill` gives the same events by the batch mode.
+    def __init__(self, order: int = SWING_ORDER, columns: Optional[List[str]] = None,
+                 store: Optional[PriceLevelStore] = None):
+        self.order = order
+        self.columns = columns or SWING_COLUMNS
+        self.store = store if store is not None else PriceLevelStore()
+        self.detectors: Dict[str, ExtremaDetector] = {column: ExtremaDetector(order) for column in self.columns}
+        self._timestamps: Deque[datetime] = deque(maxlen=order + 1)
+
+    def update(self, timestamp: datetime, values: Dict[str, float]) -> List[SwingEvent]:
+        self._timestamps.append(timestamp)
+        events = []
+        for column, detector in self.detectors.items():
+            result = detector.update(values[column])
+            if result is None:
+                continue
+
+            _, price, is_high, is_low = result
+            if is_high:
+                events.append((self._timestamps[0], column, price, True))
+            if is_low:
+                events.append((self._timestamps[0], column, price, False))
+
+        self.store.extend(events)
+        return events
+
+    def update_item(self, candle_item: List[Any]) -> List[SwingEvent]:
+        # [timestamp, o, h, l, c, v]
+        return self.update(
+            candle_item[0], {column: candle_item[CANDLE_ITEM_COLUMNS.index(column)] for column in self.columns}
+        )
+
+    def backfill(self, candles: pd.DataFrame) -> List[SwingEvent]:
+        # vectorized: confirmed extrema of the history, then the streaming state continues from its end
+        timestamps = pd.DatetimeIndex(candles.index).to_pydatetime()
+        items = []  # (candle index, column order, event)
+        for n, column in enumerate(self.columns):
+            values = candles[column].to_numpy(dtype=np.float64)
+            up, down = get_swing_extrema(values, self.order, confirmed=True)
+            for is_high, mask in ((True, up), (False, down)):
+                for i in np.flatnonzero(mask):
+                    items.append((i, n, (timestamps[i], column, float(values[i]), is_high)))
+
+            self.detectors[column].prime(values)
+
+        self._timestamps.extend(timestamps[-self.order - 1:])
+        events = [event for _, _, event in sorted(items, key=lambda item: (item[0], item[1], not item[2][3]))]
+        self.store.extend(events)
+        return events
+
+    @staticmethod
+    def from_candles(candles: pd.DataFrame, **kwargs) -> "SwingDetector":
+        detector = SwingDetector(**kwargs)
+        detector.backfill(candles)
+        return detector
@@ -4,6 +4,17 @@ from typing import Any, Callable, List, Tuple, Union
 import numpy as np
 import pandas as pd
 from scipy import signal as sig
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+
+PRICE_LEVEL_TOLERANCE = 0.05
+PRICE_LEVEL_MIN_TOUCHES = 3
+SWING_ORDER = 15  # candles on each side of a swing high / low
+
+# get_volume_levels params
+VOLUME_N_LARGEST_TO_DROP = 3
+VOLUME_PEAK_HEIGHT_RATIO = 3  # peak height >= dnv mean * ratio
+VOLUME_PEAK_DISTANCE = 90
+VOLUME_LEVEL_RATIO = 2  # season level = season dnv mean * ratio
 
 
 def load_data(file_name: str) -> pd.DataFrame:
@@ -20,7 +31,7 @@ def add_base_indicators(df: pd.DataFrame) -> pd.DataFrame:
     # df["dnv"] = df["v"] * df["c"]
     df["hl"] = df["h"] - df["l"]
     df["oc"] = np.abs(df["o"] - df["c"])
-    df["side"] = df.apply(lambda row: -1 if row["o"] > row["c"] else 1, axis=1)
+    df["side"] = np.where(df["o"] > df["c"], -1, 1)
     return df
 
 
@@ -40,19 +51,22 @@ def get_volume_levels(
     df = df.reset_index(drop=True)
 
     # drop N largest PEAKS
-    N_LARGEST_TO_DROP = 3
-    df_ = df.drop(df.nlargest(N_LARGEST_TO_DROP, 'dnv').index, errors="ignore")
+    df_ = df.drop(df.nlargest(VOLUME_N_LARGEST_TO_DROP, 'dnv').index, errors="ignore")
     # find peaks
-    peaks = sig.find_peaks(df_["dnv"], height=df_["dnv"].mean() * 3, threshold=df_["dnv"].mean(), distance=90)
+    dnv_mean = df_["dnv"].mean()
+    peaks = sig.find_peaks(
+        df_["dnv"], height=dnv_mean * VOLUME_PEAK_HEIGHT_RATIO, threshold=dnv_mean, distance=VOLUME_PEAK_DISTANCE
+    )
+    peaks_index = df_.index[peaks[0]]  # positions in df_ -> df index (N largest rows are dropped)
     levels = []
 
     # splice by "seasons" and calc levels
     v_level = prev_v_level = None
-    for interval in pd.cut(df.index, peaks[0]).categories:
+    for interval in pd.cut(df.index, peaks_index).categories:
         prev_v_level = v_level
         season = df.loc[interval.left:interval.right]
         dnv = season.dnv
-        v_level = dnv.mean() * 2 # + dnv.min() * 2
+        v_level = dnv.mean() * VOLUME_LEVEL_RATIO # + dnv.min() * 2
 
         # make smooth transition to next level
         if prev_v_level is not None:
@@ -65,13 +79,13 @@ def get_volume_levels(
     levels[-1][1] = df.index[-1]
 
     if backtesting:
-        df['v_peak'] = False
-        df.v_peak[df.index.isin(peaks[0])]  = True
-        df['v_level'] = np.nan
+        df['v_peak'] = df.index.isin(peaks_index)
+        v_level = np.full(len(df), np.nan)
         for level in levels:
-            df['v_level'].loc[level[0]:level[1]] = level[2]
+            v_level[level[0]:level[1] + 1] = level[2]  # index is a RangeIndex - label slice is inclusive
+        df['v_level'] = v_level
 
-        df["v_level_breakout"] = df.apply(lambda row: row["dnv"] >= row["v_level"], axis=1)
+        df["v_level_breakout"] = df["dnv"] >= df["v_level"]
         levels_by_timestamp = convert_index_to_timestamp(levels, df)
         df.index = df['timestamp']
         return levels_by_timestamp, levels, df
@@ -110,56 +124,63 @@ def get_volume_levels(
     #     prev_n = n
 
 
-def get_sup_resist_peaks(df: pd.DataFrame) -> Tuple[pd.Series, pd.Series, pd.Series]:
-    num_candles = 15
+def get_swing_extrema(values: np.ndarray, order: int = SWING_ORDER,
+                      confirmed: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    # same as argrelextrema with greater_equal / less_equal (mode="clip"), by sliding max / min filters.
+    # confirmed=True - only points with `order` values after them (what a streaming detector can see)
+    values_ = np.asarray(values, dtype=np.float64)
+    size = 2 * order + 1
+    up = values_ >= maximum_filter1d(values_, size, mode="nearest")
+    down = values_ <= minimum_filter1d(values_, size, mode="nearest")
+    if confirmed:
+        up[max(0, len(values_) - order):] = False
+        down[max(0, len(values_) - order):] = False
 
-    l_up_result = pd.Series(dtype=pd.Float64Dtype())
-    l_down_result = pd.Series(dtype=pd.Float64Dtype())
+    return up, down
 
+
+def get_sup_resist_peaks(df: pd.DataFrame) -> Tuple[pd.Series, pd.Series, pd.Series]:
+    l_up, l_down = [], []
     for i in ["h", "l"]:
-        extrema_down = sig.argrelextrema(df[i].values, np.less_equal, order=num_candles)
-        extrema_up = sig.argrelextrema(
-            df[i].values, np.greater_equal, order=num_candles
-        )
-        l_up = df.iloc[extrema_up[0]][i]
-        l_down = df.iloc[extrema_down[0]][i]
+        up, down = get_swing_extrema(df[i].values, SWING_ORDER)
+        l_up.append(df[i][up])
+        l_down.append(df[i][down])
 
-        l_up_result = pd.concat([l_up_result, l_up])
-        l_down_result = pd.concat([l_down_result, l_down])
+    l_up_result = pd.concat(l_up)
+    l_down_result = pd.concat(l_down)
 
     l_all = pd.concat([l_up_result, l_down_result]).dropna()
     return l_up_result, l_down_result, l_all
 
 
-def get_price_levels(peaks: pd.Series) -> np.array:
-    first_level = peaks.iloc[0]
-    levels = [(first_level, [first_level])]
-
-    def diff_price(p1, p2):
-        diff = abs(p1 - p2)
-        p = diff / p1
-        return p
+def cluster_price_levels(prices: Union[pd.Series, np.ndarray], tolerance: float = PRICE_LEVEL_TOLERANCE,
+                         min_touches: int = PRICE_LEVEL_MIN_TOUCHES) -> Tuple[np.ndarray, np.ndarray]:
+    # sort & sweep: a level starts at the lowest free price and takes every price p with (p - start) / p <= tolerance,
+    # returns levels (mean price) and their strength (number of touches)
+    prices_ = np.sort(np.asarray(prices, dtype=np.float64))
+    prices_ = prices_[~np.isnan(prices_)]
+    if len(prices_) == 0:
+        return np.array([]), np.array([], dtype=np.int64)
 
-    diff_p = 0.05
-    for level_peak in peaks[1:]:
-        has_level = False
-        for l in levels:
-            if diff_price(level_peak, l[0]) <= diff_p:
-                l[1].append(level_peak)
-                has_level = True
-                break
+    starts = []
+    i = 0
+    while i < len(prices_):
+        starts.append(i)
+        i = int(np.searchsorted(prices_, prices_[i] / (1 - tolerance), side="right"))
 
-        if not has_level:
-            levels.append((level_peak, [level_peak]))
+    starts = np.array(starts)
+    touches = np.diff(np.append(starts, len(prices_)))
+    levels = np.add.reduceat(prices_, starts) / touches
 
     # remove weak levels
-    results = []
+    strong = touches >= min_touches
+    return levels[strong], touches[strong]
 
-    for l in levels:
-        if len(l[1]) > 2:
-            results.append(np.mean(l[1]))
 
-    return np.array(results)
+def get_price_levels(peaks: pd.Series, tolerance: float = PRICE_LEVEL_TOLERANCE,
+                     min_touches: int = PRICE_LEVEL_MIN_TOUCHES) -> np.array:
+    levels, _ = cluster_price_levels(peaks, tolerance, min_touches)
+    return levels
 
 
 def select(arr: np.array, condition: Any, default=np.nan) -> float:
@@ -169,32 +190,21 @@ def select(arr: np.array, condition: Any, default=np.nan) -> float:
 
 def add_bound_levels(df: pd.DataFrame, p_levels: np.array):
     p_levels.sort()
+    c = df["c"].to_numpy(dtype=np.float64)
+    levels_ = np.append(p_levels, np.nan)  # index len(p_levels) -> no level
 
-    df["resistance_level"] = df.apply(
-        lambda row: select(p_levels, row["c"] <= p_levels), axis=1
-    )
+    # nearest level above (or equal) close
+    df["resistance_level"] = levels_[np.searchsorted(p_levels, c, side="left")]
     df["c_prev"] = df.c.shift(-1)
     df["resistance_level_prev"] = df.resistance_level.shift(-1)
-    df["support_level"] = df.apply(
-        lambda row: select(p_levels, row["c"] >= p_levels), axis=1
-    )
+    # first (lowest) level below (or equal) close
+    has_support = len(p_levels) > 0 and np.searchsorted(p_levels, c, side="right") > 0
+    df["support_level"] = np.where(has_support, levels_[0], np.nan)
     df["support_level_prev"] = df.support_level.shift(-1)
 
 
 def add_breakouts(df: pd.DataFrame):
-    df["breakout_up"] = df.apply(
-        lambda row: row["c_prev"] <= row["resistance_level_prev"] <= row["c"], axis=1
-    )
-    df["breakout_down"] = df.apply(
-        lambda row: row.shift(-1)["c_prev"]
-        >= row.shift(-1)["support_level_prev"]
-        >= row["c"],
-        axis=1,
-    )
-    df["signal_up"] = df.apply(
-        lambda row: row["v_level_breakout"] and row["breakout_up"], axis=1
-    )
-    df["signal_down"] = df.apply(
-        lambda row: row["v_level_breakout"] and row["breakout_down"], axis=1
-    )
-    pass
+    df["breakout_up"] = (df["c_prev"] <= df["resistance_level_prev"]) & (df["resistance_level_prev"] <= df["c"])
+    df["breakout_down"] = (df["c_prev"] >= df["support_level_prev"]) & (df["support_level_prev"] >= df["c"])
+    df["signal_up"] = df["v_level_breakout"] & df["breakout_up"]
+    df["signal_down"] = df["v_level_breakout"] & df["breakout_down"]
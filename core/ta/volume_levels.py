@@ -0,0 +1,174 @@
+import heapq
+from collections import deque
+from typing import Any, Deque, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.ta.ta import (
+    VOLUME_LEVEL_RATIO,
+    VOLUME_N_LARGEST_TO_DROP,
+    VOLUME_PEAK_DISTANCE,
+    VOLUME_PEAK_HEIGHT_RATIO,
+    get_volume_levels,
+)
+
+
+class VolumeLevelTracker(object):
+    # Streaming version of `get_volume_levels` for closed live candles, O(1) amortised per candle:
+    # - dnv mean without the N largest values (running sum + heap of the N largest)
+    # - a candle is checked as a peak when the next one closes (height, threshold as in find_peaks), a candle pushed
+    #   out of the N largest is checked again if it is within the last `2 * distance` candles
+    # - peaks closer than `distance` - the higher one wins (moves the end of the last closed season)
+    # - season level = season dnv mean * ratio, averaged with the previous level
+    # `levels` are [first index, last index, v_level] by candle number, like get_volume_levels(backtesting=True)
+    def __init__(self, distance: int = VOLUME_PEAK_DISTANCE, height_ratio: float = VOLUME_PEAK_HEIGHT_RATIO,
+                 level_ratio: float = VOLUME_LEVEL_RATIO, n_largest_to_drop: int = VOLUME_N_LARGEST_TO_DROP):
+        self.distance = distance
+        self.height_ratio = height_ratio
+        self.level_ratio = level_ratio
+        self.n_largest_to_drop = n_largest_to_drop
+
+        self.count = 0
+        self.dnv_sum = 0.0
+        self.largest: List[Tuple[float, int]] = []  # min heap of N largest (dnv, index)
+        self.last_dnv: Deque[float] = deque(maxlen=max(3, distance * 2))  # lookback of peak candidates
+
+        self.last_peak: Optional[int] = None
+        self.last_peak_dnv = 0.0
+        self.season_sum = 0.0  # from the last peak to the last candle
+        self.season_count = 0
+        self.closed_sum = 0.0  # last closed season (previous peak .. last peak)
+        self.closed_count = 0
+
+        self.levels: List[List[Any]] = []
+        self.v_level: Optional[float] = None
+        self.breakout = False
+
+    @property
+    def dnv_mean(self) -> float:
+        count = self.count - len(self.largest)
+        return (self.dnv_sum - sum(dnv for dnv, _ in self.largest)) / count if count > 0 else np.nan
+
+    def _add_stats(self, dnv: float) -> Optional[int]:
+        # returns index of the candle pushed out of the N largest
+        self.count += 1
+        self.dnv_sum += dnv
+        if len(self.largest) < self.n_largest_to_drop:
+            heapq.heappush(self.largest, (dnv, self.count - 1))
+        elif self.n_largest_to_drop > 0 and dnv > self.largest[0][0]:
+            return heapq.heapreplace(self.largest, (dnv, self.count - 1))[1]
+        return None
+
+    def _is_largest(self, index: int) -> bool:
+        return any(i == index for _, i in self.largest)
+
+    def _dnv(self, index: int) -> float:
+        return self.last_dnv[index - self.count]
+
+    def _sum(self, first: int, last: int) -> float:
+        # dnv of candles [first, last), all within last_dnv
+        return float(sum(self._dnv(i) for i in range(first, last)))
+
+    def _season_level(self, season_sum: float, season_count: int, prev_level: Optional[float]) -> float:
+        v_level = season_sum / season_count * self.level_ratio
+        return float(v_level if prev_level is None else (v_level + prev_level) / 2)
+
+    def _check_peak(self, index: int):
+        # needs both neighbours in the lookback
+        if index < self.count - len(self.last_dnv) + 1 or index > self.count - 2:
+            return
+
+        left, dnv, right = self._dnv(index - 1), self._dnv(index), self._dnv(index + 1)
+        mean = self.dnv_mean
+        if not (dnv > left and dnv > right) or self._is_largest(index):
+            return
+        if dnv < mean * self.height_ratio or min(dnv - left, dnv - right) < mean:
+            return
+
+        self._add_peak(index, dnv)
+
+    def _add_peak(self, index: int, dnv: float):
+        # season sums already include the candles after the peak
+        tail = self._sum(index + 1, self.count)
+        if self.last_peak is not None and abs(index - self.last_peak) < self.distance:
+            if dnv <= self.last_peak_dnv:
+                return
+
+            # higher peak nearby replaces the last one - the closed season ends at it
+            if len(self.levels) > 0:
+                if index > self.last_peak:
+                    self.closed_sum += self.season_sum - self.last_peak_dnv - tail
+                elif index > self.levels[-1][0]:
+                    self.closed_sum -= self._sum(index + 1, self.last_peak + 1)
+                else:
+                    return
+                self.closed_count += index - self.last_peak
+                prev_level = self.levels[-2][2] if len(self.levels) > 1 else None
+                self.v_level = self._season_level(self.closed_sum, self.closed_count, prev_level)
+                self.levels[-1][1:] = [index, self.v_level]
+        elif self.last_peak is not None:
+            if index < self.last_peak:
+                return
+
+            self.closed_sum = self.season_sum - tail
+            self.closed_count = index + 1 - self.last_peak
+            self.v_level = self._season_level(self.closed_sum, self.closed_count, self.v_level)
+            self.levels.append([self.last_peak, index, self.v_level])
+
+        self.last_peak = index
+        self.last_peak_dnv = dnv
+        self.season_sum = dnv + tail
+        self.season_count = self.count - index
+
+    def update(self, c: float, v: float) -> Tuple[Optional[float], bool]:
+        dnv = c * v
+        self.last_dnv.append(dnv)
+        released = self._add_stats(dnv)
+        if self.last_peak is not None:
+            self.season_sum += dnv
+            self.season_count += 1
+
+        if released is not None and released != self.count - 2:
+            self._check_peak(released)
+        self._check_peak(self.count - 2)
+        self.breakout = self.v_level is not None and dnv >= self.v_level
+        return self.v_level, self.breakout
+
+    def update_item(self, candle_item: List[Any]) -> Tuple[Optional[float], bool]:
+        # [timestamp, o, h, l, c, v]
+        return self.update(candle_item[4], candle_item[5])
+
+    @staticmethod
+    def from_candles(candles: pd.DataFrame, **kwargs) -> "VolumeLevelTracker":
+        # state after history is taken from the batch function, so v_level matches it exactly
+        tracker = VolumeLevelTracker(**kwargs)
+        if len(candles) == 0:
+            return tracker
+
+        dnv = (candles["c"] * candles["v"]).to_numpy(dtype=np.float64)
+        tracker.count = len(dnv)
+        tracker.dnv_sum = float(dnv.sum())
+        largest = np.argsort(dnv, kind="stable")[-tracker.n_largest_to_drop:] if tracker.n_largest_to_drop > 0 else []
+        tracker.largest = [(float(dnv[i]), int(i)) for i in largest]
+        heapq.heapify(tracker.largest)
+        tracker.last_dnv.extend(dnv[-tracker.last_dnv.maxlen:].tolist())
+
+        try:
+            _, levels, df = get_volume_levels(candles[["c", "v"]].copy(), backtesting=True)
+        except (IndexError, ValueError):
+            return tracker  # less than 2 peaks - no levels yet
+
+        peaks = np.flatnonzero(df["v_peak"].to_numpy())
+        tracker.last_peak = int(peaks[-1])
+        tracker.last_peak_dnv = float(dnv[tracker.last_peak])
+        tracker.season_sum = float(dnv[tracker.last_peak:].sum())
+        tracker.season_count = len(dnv) - tracker.last_peak
+
+        levels[-1][1] = tracker.last_peak
+        tracker.levels = [[int(first), int(last), float(v_level)] for first, last, v_level in levels]
+        tracker.closed_sum = float(dnv[levels[-1][0]:tracker.last_peak + 1].sum())
+        tracker.closed_count = tracker.last_peak + 1 - int(levels[-1][0])
+        tracker.v_level = tracker.levels[-1][2]
+        tracker.breakout = bool(dnv[-1] >= tracker.v_level)
+        return tracker
@@ -32,6 +32,12 @@ class RestMethod(Enum):
     DELETE = "DELETE"
 
 
+class OverflowPolicy(Enum):
+    DROP_OLDEST = "DROP_OLDEST"
+    COALESCE = "COALESCE"  # latest message per key replaces the queued one, keyless messages - backpressure
+    BLOCK = "BLOCK"  # reader waits for consumers (backpressure to the socket)
+
+
 OrderId = NewType("OrderId", int)
 
 
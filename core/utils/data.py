@@ -1,8 +1,66 @@
 from typing import Any, List
 
+import numpy as np
 import pandas as pd
 
+# binance kline: open time, o, h, l, c, v, close time, quote volume, trades, taker buy volume, taker buy quote volume
+KLINE_COLUMNS = ["o", "h", "l", "c", "v"]
+KLINE_EXTENDED_COLUMNS = ["qv", "n", "tbv", "tbqv"]
+KLINE_FIELDS = {"o": 1, "h": 2, "l": 3, "c": 4, "v": 5, "qv": 7, "n": 8, "tbv": 9, "tbqv": 10}
+
 
 def candles_to_data_frame(data: List[List[Any]]) -> pd.DataFrame:
     df = pd.DataFrame(data, columns=["timestamp", "o", "h", "l", "c", "v"])
     return df.set_index("timestamp")
+
+
+def klines_to_data_frame(content: List[List[Any]], extended: bool = False) -> pd.DataFrame:
+    # klines response -> numpy columns at once: one object array of the decoded json, string prices
+    # are parsed by the float64 cast, open time (ms) by the datetime64 cast - no per row python objects.
+    # extended - quote volume, trade count and taker buy volumes are kept too
+    columns = KLINE_COLUMNS + KLINE_EXTENDED_COLUMNS if extended else KLINE_COLUMNS
+    if not isinstance(content, list):
+        # error body ({"code": .., "msg": ..}) is not an empty history
+        raise ValueError(f"Unexpected klines response: {content}")
+    if len(content) == 0:
+        return pd.DataFrame({name: np.empty(0, dtype=np.int64 if name == "n" else np.float64) for name in columns},
+                            index=pd.DatetimeIndex([], dtype="datetime64[ns]", name="timestamp"))
+
+    rows = np.array(content, dtype=object)
+    index = pd.DatetimeIndex(rows[:, 0].astype(np.int64).astype("datetime64[ms]").astype("datetime64[ns]"),
+                             name="timestamp")
+    values = {name: rows[:, KLINE_FIELDS[name]].astype(np.int64 if name == "n" else np.float64) for name in columns}
+    return pd.DataFrame(values, index=index, copy=False)
+
+
+if __name__ == "__main__":
+    # same candles as the per row decoding, throughput on a 1000 klines page
+    import time
+    from datetime import datetime
+
+    rng = np.random.default_rng(1)
+    start = 1640995200000
+    page = [[start + i * 60000, *[f"{p:.8f}" for p in 100 + rng.random(5)], start + i * 60000 + 59999,
+             f"{rng.random() * 1e6:.8f}", int(rng.integers(1, 1000)), f"{rng.random():.8f}", f"{rng.random():.8f}", "0"]
+            for i in range(1000)]
+
+    def decode_rows(content):
+        return candles_to_data_frame([[datetime.utcfromtimestamp(c[0] / 1e3), *[float(x) for x in c[1:6]]]
+                                      for c in content])
+
+    pd.testing.assert_frame_equal(klines_to_data_frame(page), decode_rows(page), check_index_type=False)
+    extended = klines_to_data_frame(page, extended=True)
+    assert extended["n"].tolist() == [c[8] for c in page]
+    assert extended["tbqv"].tolist() == [float(c[10]) for c in page]
+    assert len(klines_to_data_frame([])) == 0
+    try:
+        klines_to_data_frame({"code": -1003, "msg": "Too many requests"})
+        raise AssertionError("error body decoded as candles")
+    except ValueError:
+        pass
+
+    for name, decode in (("rows", decode_rows), ("numpy", klines_to_data_frame)):
+        started = time.perf_counter()
+        for _ in range(200):
+            decode(page)
+        print(f"{name}: {(time.perf_counter() - started) / 200 * 1e3:.2f} ms / 1000 klines")
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.types import Tf
+from core.utils.data import candles_to_data_frame
+from core.utils.timeframe import round_time_to_tf, round_times_to_tf, tf_size_minutes
+
+
+def resample_candles(candles: pd.DataFrame, tf: Tf, base_tf: Optional[Tf] = None) -> pd.DataFrame:
+    # OHLCV rollup of base candles (1m, 15m ...) to a higher tf, buckets keyed by round_time_to_tf.
+    # base_tf given - last bucket is dropped if it is not closed yet
+    if len(candles) == 0:
+        return candles_to_data_frame([])
+
+    if not candles.index.is_monotonic_increasing:
+        candles = candles.sort_index()
+
+    keys = round_times_to_tf(pd.DatetimeIndex(candles.index), tf).values
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+
+    result = pd.DataFrame({
+        "o": candles["o"].to_numpy()[starts],
+        "h": np.maximum.reduceat(candles["h"].to_numpy(), starts),
+        "l": np.minimum.reduceat(candles["l"].to_numpy(), starts),
+        "c": candles["c"].to_numpy()[ends],
+        "v": np.add.reduceat(candles["v"].to_numpy(), starts),
+    }, index=pd.DatetimeIndex(keys[starts], name="timestamp"))
+
+    if base_tf is not None and not is_bucket_closed(result.index[-1], candles.index[-1], tf, base_tf):
+        result = result.iloc[:-1]
+
+    return result
+
+
+def can_resample(tf: Tf, base_tf: Tf) -> bool:
+    # tf bucket is a whole number of base candles
+    return tf_size_minutes(tf) > tf_size_minutes(base_tf) and tf_size_minutes(tf) % tf_size_minutes(base_tf) == 0
+
+
+def is_bucket_closed(bucket_start: datetime, last_base_candle: datetime, tf: Tf, base_tf: Tf) -> bool:
+    # last base candle of the bucket is closed
+    return last_base_candle + timedelta(minutes=tf_size_minutes(base_tf)) >= \
+        bucket_start + timedelta(minutes=tf_size_minutes(tf))
+
+
+class CandlesResampler(object):
+    # Incremental rollup of closed base candles to higher tfs: keeps the open bucket of every tf,
+    # a higher tf candle is emitted when the last base candle of its bucket closes
+    # (or when the next bucket starts, if base candles are missing)
+    def __init__(self, tfs: List[Tf], base_tf: Tf = Tf("1m")):
+        self.base_tf = base_tf
+        self.tfs = tfs
+        self.buckets: Dict[Tf, Optional[List[Any]]] = {tf: None for tf in tfs}  # [timestamp, o, h, l, c, v]
+
+    def _update_bucket(self, tf: Tf, candle_item: List[Any]) -> List[List[Any]]:
+        timestamp, o, h, l, c, v = candle_item
+        key = round_time_to_tf(timestamp, tf)
+        closed = []
+        bucket = self.buckets[tf]
+        if bucket is not None and bucket[0] != key:
+            closed.append(bucket)
+            bucket = None
+
+        if bucket is None:
+            bucket = [key, o, h, l, c, v]
+        else:
+            bucket[2] = max(bucket[2], h)
+            bucket[3] = min(bucket[3], l)
+            bucket[4] = c
+            bucket[5] += v
+
+        if is_bucket_closed(key, timestamp, tf, self.base_tf):
+            closed.append(bucket)
+            bucket = None
+
+        self.buckets[tf] = bucket
+        return closed
+
+    def update(self, candle_item: List[Any]) -> List[Tuple[Tf, List[Any]]]:
+        # closed base candle [timestamp, o, h, l, c, v] -> closed candles of higher tfs
+        return [(tf, candle) for tf in self.tfs for candle in self._update_bucket(tf, list(candle_item))]
+
+    def unclosed(self, tf: Tf, candle_item: Optional[List[Any]] = None) -> Optional[List[Any]]:
+        # open bucket of tf (a copy), with the live unclosed base candle when it is given
+        bucket = self.buckets[tf]
+        if candle_item is None:
+            return list(bucket) if bucket is not None else None
+
+        timestamp, o, h, low, c, v = candle_item
+        key = round_time_to_tf(timestamp, tf)
+        if bucket is None or bucket[0] != key:
+            return [key, o, h, low, c, v]
+        return [key, bucket[1], max(bucket[2], h), min(bucket[3], low), c, bucket[5] + v]
+
+    @staticmethod
+    def from_candles(candles: pd.DataFrame, tfs: List[Tf], base_tf: Tf = Tf("1m")) -> "CandlesResampler":
+        # open buckets restored from the tail of stored base candles
+        resampler = CandlesResampler(tfs, base_tf)
+        if len(candles) == 0:
+            return resampler
+
+        for tf in tfs:
+            candles_ = candles[candles.index >= round_time_to_tf(candles.index[-1], tf)]
+            bucket = resample_candles(candles_, tf, base_tf)
+            if len(bucket) == 0:
+                last = resample_candles(candles_, tf).iloc[-1]
+                resampler.buckets[tf] = [last.name.to_pydatetime(), *last[["o", "h", "l", "c", "v"]].tolist()]
+
+        return resampler
+
+
+if __name__ == "__main__":
+    # batch rollup == incremental rollup
+    rng = np.random.default_rng(1)
+    size = 3 * 24 * 60 + 37
+    c = 100 + np.cumsum(rng.normal(0, 0.1, size))
+    candles_1m = pd.DataFrame({"o": c, "h": c + 0.2, "l": c - 0.2, "c": c + 0.05, "v": rng.random(size)},
+                              index=pd.date_range("2022-01-01", periods=size, freq="1min", name="timestamp"))
+    tfs = [Tf("15m"), Tf("1h"), Tf("4h"), Tf("1d")]
+
+    history = 2000
+    resampler = CandlesResampler.from_candles(candles_1m.iloc[:history], tfs)
+    streamed: Dict[Tf, List[List[Any]]] = {tf: [] for tf in tfs}
+    for ts, row in zip(candles_1m.index[history:].to_pydatetime(), candles_1m.iloc[history:].values.tolist()):
+        for tf, candle in resampler.update([ts, *row]):
+            streamed[tf].append(candle)
+
+    for tf in tfs:
+        batch = resample_candles(candles_1m, tf, Tf("1m"))
+        # buckets closed after the history
+        closes = batch.index + timedelta(minutes=tf_size_minutes(tf))
+        batch = batch[closes > candles_1m.index[history - 1] + timedelta(minutes=1)]
+        pd.testing.assert_frame_equal(candles_to_data_frame(streamed[tf]), batch, check_index_type=False,
+                                      check_freq=False)
+        print(tf, len(batch))
@@ -1,4 +1,7 @@
 from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import pandas as pd
 
 from config import MAX_CANDLES
 
@@ -34,6 +37,22 @@ def round_time_to_tf(date, tf) -> datetime:
     raise Exception(f"Invalid time frame {tf} with {date}")
 
 
+def round_times_to_tf(index: pd.DatetimeIndex, tf: str) -> pd.DatetimeIndex:
+    # vectorized round_time_to_tf
+    letter = tf[-1]
+    num = int(tf[:-1]) if len(tf) > 1 else 1
+    if letter == "m":
+        result = index.floor("min")
+        return result - pd.to_timedelta(result.minute % num, unit="min") if num > 1 else result
+    elif letter == "h":
+        result = index.floor("h")
+        return result - pd.to_timedelta(result.hour % num, unit="h") if num > 1 else result
+    elif letter == "d":
+        return index.floor("D")
+
+    raise Exception(f"Invalid time frame {tf}")
+
+
 def round_time(date, tf="1m") -> datetime:
     result = date.replace(second=0, microsecond=0)
     if tf[-1] in ["h", "d"]:
@@ -45,4 +64,29 @@ def round_time(date, tf="1m") -> datetime:
 
 
 def get_time_shift(to_time: datetime, candle_size_minutes: int) -> datetime:
-    return to_time - timedelta(minutes=MAX_CANDLES * candle_size_minutes)
\ No newline at end of file
+    return to_time - timedelta(minutes=MAX_CANDLES * candle_size_minutes)
+
+
+def get_time_pages(from_time: datetime, to_time: datetime, candle_size_minutes: int) -> List[Tuple[datetime, datetime]]:
+    # split [from_time, to_time] into ranges of MAX_CANDLES candles each (one klines request per range)
+    page_size = timedelta(minutes=MAX_CANDLES * candle_size_minutes)
+    last_candle_shift = page_size - timedelta(minutes=candle_size_minutes)
+    pages = []
+    page_from = from_time
+    while page_from <= to_time:
+        pages.append((page_from, min(page_from + last_candle_shift, to_time)))
+        page_from += page_size
+
+    return pages
+
+
+def find_gaps(index: pd.DatetimeIndex, tf: str) -> List[Tuple[datetime, datetime]]:
+    # missing candles inside a sorted index as [first missing, last missing] ranges (vectorized diff)
+    if len(index) < 2:
+        return []
+
+    candle_size = pd.Timedelta(minutes=tf_size_minutes(tf))
+    values = pd.DatetimeIndex(index)
+    holes = (values[1:] - values[:-1]) > candle_size
+    return [(a.to_pydatetime(), b.to_pydatetime()) for a, b in
+            zip(values[:-1][holes] + candle_size, values[1:][holes] - candle_size)]
@@ -4,3 +4,5 @@
 test.lint: ## Lint python files with flake8
 	flake8 ./src --config .flake8
 
+test.unit: ## Run unit tests with pytest
+	python -m pytest
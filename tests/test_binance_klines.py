@@ -0,0 +1,26 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from core.exchange.binance.public import PublicBinance
+
+
+def fake_exchange(content):
+    async def request_url(url, method, params=None):
+        return content, SimpleNamespace(status=200, url=url)
+
+    return SimpleNamespace(request_url=request_url, logger=logging.getLogger(__name__))
+
+
+def test_klines_page_is_decoded():
+    page = [[1640995200000, "1.0", "2.0", "0.5", "1.5", "10.0", 1640995259999, "15.0", 3, "4.0", "6.0", "0"]]
+    candles = asyncio.run(PublicBinance._load_candles(fake_exchange(page), "BTCUSDT", "1m"))
+    assert candles["c"].tolist() == [1.5]
+
+
+def test_unexpected_klines_body_is_not_an_empty_history():
+    exchange = fake_exchange({"code": -1003, "msg": "Too many requests"})
+    with pytest.raises(ValueError):
+        asyncio.run(PublicBinance._load_candles(exchange, "BTCUSDT", "1m"))
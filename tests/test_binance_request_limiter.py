@@ -0,0 +1,65 @@
+import asyncio
+from types import SimpleNamespace
+
+from core.exchange.protectors import binance_request_limiter as limiter_module
+from core.exchange.protectors.binance_request_limiter import (
+    FUTURES_DEFAULT_LIMITS,
+    FUTURES_ENDPOINT_WEIGHTS,
+    BinanceRequestLimiter,
+    RateLimitWindow,
+)
+
+RATE_LIMITS = [{"rateLimitType": "REQUEST_WEIGHT", "interval": "MINUTE", "intervalNum": 1, "limit": 10}]
+
+
+def test_window_resets_at_interval_boundary():
+    window = RateLimitWindow("REQUEST_WEIGHT", "MINUTE", 1, 10)
+    window.roll(125.0)
+    window.used = 8
+
+    assert window.wait_time(2, 125.0) == 0.0
+    assert window.wait_time(3, 125.0) == 55.0  # until 180 - the next calendar minute
+
+    window.roll(180.0)
+    assert window.used == 0 and window.wait_time(10, 180.0) == 0.0
+
+
+def test_used_is_synced_from_header():
+    window = RateLimitWindow("REQUEST_WEIGHT", "MINUTE", 1, 10)
+    window.roll(125.0)
+    window.used = 9
+    window.sync_used(4, 130.0)
+
+    assert window.used == 4
+
+
+def test_no_more_than_limit_per_window(monkeypatch):
+    clock = SimpleNamespace(now=119.0)
+    monkeypatch.setattr(limiter_module.time, "time", lambda: clock.now)
+
+    async def sleep(delay):
+        clock.now += delay
+
+    monkeypatch.setattr(limiter_module.asyncio, "sleep", sleep)
+    limiter = BinanceRequestLimiter()
+    limiter.init(RATE_LIMITS)
+
+    async def main():
+        started = []
+        for _ in range(25):
+            await limiter.acquire_weight(2)
+            started.append(clock.now)
+        return started
+
+    started = asyncio.run(main())
+    windows = [int(t // 60) for t in started]
+    assert max(windows.count(w) for w in set(windows)) == 5  # 5 * 2 weight per calendar minute
+    assert started[5] == 120.0
+
+
+def test_default_limit_weight():
+    limiter = BinanceRequestLimiter(FUTURES_ENDPOINT_WEIGHTS, FUTURES_DEFAULT_LIMITS)
+
+    assert limiter.get_weight("/klines") == limiter.get_weight("/klines", {"limit": 500}) == 5
+    assert limiter.get_weight("/klines", {"limit": 99}) == 1
+    assert BinanceRequestLimiter().get_weight("/depth") == 5
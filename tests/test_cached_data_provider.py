@@ -0,0 +1,91 @@
+import asyncio
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.providers.cached_data_provider import CACHE_COLUMNS, CachedDataProvider
+from core.providers.data_provider import DataProvider
+
+assert_equal = partial(pd.testing.assert_frame_equal, check_freq=False)
+
+SIZE = 5000
+CANDLES = pd.DataFrame({c: np.arange(SIZE, dtype=np.float64) for c in CACHE_COLUMNS},
+                       index=pd.date_range("2022-01-01", periods=SIZE, freq="15min", name="timestamp"))
+TS = CANDLES.index.to_pydatetime()
+
+
+class MemoryDataProvider(DataProvider):
+    def __init__(self, candles: pd.DataFrame):
+        super().__init__()
+        self.candles = candles
+        self.calls = []
+
+    async def load_candles(self, symbol, tf, start_time=None, end_time=None):
+        self.calls.append((start_time, end_time))
+        c = self.candles
+        return c[(c.index >= start_time) & (c.index < end_time)]
+
+    async def save_candles(self, symbol, tf, candles):
+        self.candles = pd.concat([self.candles[~self.candles.index.isin(candles.index)], candles]).sort_index()
+
+
+@pytest.fixture
+def db() -> MemoryDataProvider:
+    return MemoryDataProvider(CANDLES.iloc[:4000])
+
+
+@pytest.fixture
+def cache(db, tmp_path) -> CachedDataProvider:
+    cache = CachedDataProvider(db, str(tmp_path))
+    asyncio.run(cache.init())
+    return cache
+
+
+def test_repeated_and_inner_ranges_are_served_from_disk(db, cache):
+    async def main():
+        expected = db.candles.iloc[1000:3000]
+        assert_equal(await cache.load_candles("BTCUSDT", "15m", TS[1000], TS[3000]), expected)
+        assert_equal(await cache.load_candles("BTCUSDT", "15m", TS[1000], TS[3000]), expected)
+        assert_equal(await cache.load_candles("BTCUSDT", "15m", TS[1500], TS[2000]), db.candles.iloc[1500:2000])
+
+    asyncio.run(main())
+    assert len(db.calls) == 1
+
+
+def test_tail_is_extended_by_saved_candles(db, cache):
+    async def main():
+        await cache.load_candles("BTCUSDT", "15m", TS[1000], TS[3000])
+
+        # db has candles up to 4000, new ones are saved later
+        assert_equal(await cache.load_candles("BTCUSDT", "15m", TS[2000], TS[4500]), CANDLES.iloc[2000:4000])
+        assert db.calls[-1] == (TS[3000], TS[4500])
+
+        await cache.save_candles("BTCUSDT", "15m", CANDLES.iloc[4000:4500])
+        assert_equal(await cache.load_candles("BTCUSDT", "15m", TS[1000], TS[4500]), CANDLES.iloc[1000:4500])
+        assert db.calls[-1] == (TS[4000], TS[4500])
+
+    asyncio.run(main())
+
+
+def test_overwritten_candles_cut_the_cached_range(cache):
+    async def main():
+        await cache.load_candles("BTCUSDT", "15m", TS[1000], TS[3000])
+        changed = CANDLES.iloc[2500:2510] * 2
+        await cache.save_candles("BTCUSDT", "15m", changed)
+        result = await cache.load_candles("BTCUSDT", "15m", TS[2400], TS[2600])
+        assert_equal(result.iloc[100:110], changed)
+
+    asyncio.run(main())
+
+
+def test_least_recently_used_key_is_evicted(cache, tmp_path):
+    async def main():
+        await cache.load_candles("BTCUSDT", "15m", TS[1000], TS[3000])
+        cache.max_size = 3000 * 8 * (len(CACHE_COLUMNS) + 1) + 4096  # room for the new key only
+        await cache.load_candles("ETHUSDT", "15m", TS[0], TS[3000])
+
+    asyncio.run(main())
+    assert not (tmp_path / "BTCUSDT_15m").exists()
+    assert (tmp_path / "ETHUSDT_15m").exists()
@@ -0,0 +1,45 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from core.base import CoreBase
+from core.exchange.binance.public import MAX_REQUEST_ATTEMPTS
+from core.exchange.protectors.binance_request_limiter import BinanceRequestLimiter
+from tools.candles_importer.importer import CandlesImporter
+
+
+class FakeRequest:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    async def request_json(self, url, method, params=None, headers=None):
+        self.calls += 1
+        status = self.statuses.pop(0)
+        response = SimpleNamespace(status=status, url=url, reason="", headers={"retry-after": "0"})
+        return ({"code": -1003, "msg": "Too many requests"} if status != 200 else [1]), response
+
+
+@pytest.fixture
+def importer() -> CandlesImporter:
+    importer = CandlesImporter(db=None)
+    importer.request_limiter = BinanceRequestLimiter()
+    return importer
+
+
+def test_rate_limited_request_is_retried(importer, monkeypatch):
+    request = FakeRequest([429, 418, 200])
+    monkeypatch.setattr(CoreBase, "get_request", classmethod(lambda cls: request))
+
+    assert asyncio.run(importer.request_url("/klines")) == [1]
+    assert request.calls == 3
+
+
+def test_retries_are_bounded(importer, monkeypatch):
+    request = FakeRequest([429] * MAX_REQUEST_ATTEMPTS)
+    monkeypatch.setattr(CoreBase, "get_request", classmethod(lambda cls: request))
+
+    with pytest.raises(Exception):
+        asyncio.run(importer.request_url("/klines"))
+    assert request.calls == MAX_REQUEST_ATTEMPTS
@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+import core.exchange.binance.public as public
+from core.exchange.binance.public import PublicBinance
+from core.types import Tf
+
+
+def test_only_tfs_with_bounded_base_window_are_derived(monkeypatch):
+    monkeypatch.setattr(public, "CANDLES_BASE_TIMEFRAME", "15m")
+    exchange = SimpleNamespace(data_provider=object())
+    tfs = [Tf("1m"), Tf("15m"), Tf("1h"), Tf("4h"), Tf("1d")]
+
+    # 1h: 2000h of 15m candles = 8 pages; 4h (8000h) and 1d (5 years) keep native klines
+    assert PublicBinance.get_derived_tfs(exchange, tfs) == [Tf("1h")]
+
+    monkeypatch.setattr(public, "MAX_DERIVED_BASE_PAGES", 32)
+    assert PublicBinance.get_derived_tfs(exchange, tfs) == [Tf("1h"), Tf("4h")]
+
+
+def test_nothing_is_derived_without_data_provider(monkeypatch):
+    monkeypatch.setattr(public, "CANDLES_BASE_TIMEFRAME", "15m")
+    assert PublicBinance.get_derived_tfs(SimpleNamespace(data_provider=None), [Tf("1h")]) == []
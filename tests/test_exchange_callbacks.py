@@ -0,0 +1,27 @@
+import asyncio
+from functools import partial
+
+import core.exchange.binance  # noqa: F401 - exchange.py is imported through the binance package (import cycle)
+from core.exchange.common.exchange import BaseExchange, ExchangeCallback
+
+
+def test_dispatch_awaits_every_awaitable_callback():
+    called = []
+
+    async def on_candle(name, symbol, tf):
+        called.append((name, symbol, tf))
+
+    class Handler:
+        async def __call__(self, symbol, tf):
+            called.append(("call", symbol, tf))
+
+    callbacks = [
+        ExchangeCallback(1, "BTCUSDT", "kline_1m", partial(on_candle, "async")),
+        ExchangeCallback(2, "BTCUSDT", "kline_1m", partial(on_candle, "partial")),
+        ExchangeCallback(3, "BTCUSDT", "kline_1m", lambda symbol, tf: on_candle("lambda", symbol, tf)),
+        ExchangeCallback(4, "BTCUSDT", "kline_1m", Handler()),
+        ExchangeCallback(5, "BTCUSDT", "kline_1m", lambda symbol, tf: called.append(("plain", symbol, tf))),
+    ]
+    asyncio.run(BaseExchange.dispatch_callbacks(callbacks, "BTCUSDT", "1m"))
+
+    assert sorted(name for name, _, _ in called) == ["async", "call", "lambda", "partial", "plain"]
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import signal as sig
+
+from core.ta.extrema import SWING_COLUMNS, PriceLevelStore, SwingDetector
+from core.ta.ta import SWING_ORDER
+
+SIZE = 3000
+HISTORY = 1700
+
+
+@pytest.fixture
+def candles() -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    c = 100 + np.round(np.cumsum(rng.normal(0, 1, SIZE)))
+    return pd.DataFrame({"h": c + np.round(rng.random(SIZE)), "l": c - np.round(rng.random(SIZE))},
+                        index=pd.date_range("2022-01-01", periods=SIZE, freq="1min"))
+
+
+def stream(detector: SwingDetector, candles: pd.DataFrame) -> SwingDetector:
+    for ts, row in zip(candles.index.to_pydatetime(), candles.to_dict("records")):
+        detector.update(ts, row)
+    return detector
+
+
+def test_streaming_equals_batch_and_argrelextrema(candles):
+    streaming = stream(SwingDetector(store=PriceLevelStore(None)), candles)
+    batch = SwingDetector.from_candles(candles, store=PriceLevelStore(None))
+    assert len(streaming.store) > 0
+    assert list(streaming.store.events) == list(batch.store.events)
+
+    for column in SWING_COLUMNS:
+        # confirmed candles only - `order` candles after the swing have closed
+        highs = sig.argrelextrema(candles[column].values, np.greater_equal, order=SWING_ORDER)[0]
+        highs = highs[highs < SIZE - SWING_ORDER]
+        events = [e[0] for e in streaming.store.events if e[1] == column and e[3]]
+        assert events == list(candles.index[highs].to_pydatetime())
+
+
+def test_backfill_then_streaming_equals_streaming(candles):
+    streaming = stream(SwingDetector(store=PriceLevelStore(None)), candles)
+    resumed = stream(SwingDetector.from_candles(candles.iloc[:HISTORY], store=PriceLevelStore(None)),
+                     candles.iloc[HISTORY:])
+    assert list(resumed.store.events) == list(streaming.store.events)
+
+
+def test_level_store_is_bounded_by_default(candles):
+    unbounded = stream(SwingDetector(store=PriceLevelStore(None)), candles)
+    store = PriceLevelStore(max_size=10)
+    stream(SwingDetector(store=store), candles)
+
+    assert len(store) == 10
+    assert list(store.events) == list(unbounded.store.events)[-10:]
+    assert PriceLevelStore().events.maxlen is not None
@@ -0,0 +1,101 @@
+import asyncio
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.providers.data_provider import DataProvider
+from core.providers.memory_cached_data_provider import MemoryCachedDataProvider, slice_candles
+
+assert_equal = partial(pd.testing.assert_frame_equal, check_freq=False)
+
+SIZE = 5000
+CANDLES = pd.DataFrame({c: np.arange(SIZE, dtype=np.float64) for c in ["o", "h", "l", "c", "v"]},
+                       index=pd.date_range("2022-01-01", periods=SIZE, freq="15min", name="timestamp"))
+TS = CANDLES.index.to_pydatetime()
+
+
+class MemoryDataProvider(DataProvider):
+    def __init__(self, candles: pd.DataFrame):
+        super().__init__()
+        self.candles = candles
+        self.calls = []
+
+    async def load_candles(self, symbol, tf, start_time=None, end_time=None):
+        self.calls.append((start_time, end_time))
+        await asyncio.sleep(0.01)
+        return slice_candles(self.candles, start_time, end_time)
+
+    async def save_candles(self, symbol, tf, candles):
+        self.candles = pd.concat([self.candles[~self.candles.index.isin(candles.index)], candles]).sort_index()
+
+
+@pytest.fixture
+def db() -> MemoryDataProvider:
+    return MemoryDataProvider(CANDLES)
+
+
+@pytest.fixture
+def cache(db) -> MemoryCachedDataProvider:
+    return MemoryCachedDataProvider(db)
+
+
+def test_concurrent_queries_share_one_request(db, cache):
+    async def main():
+        return await asyncio.gather(cache.load_candles("BTCUSDT", "15m", TS[1000], TS[2000]),
+                                    cache.load_candles("BTCUSDT", "15m", TS[1000], TS[2000]))
+
+    a, b = asyncio.run(main())
+    assert_equal(a, CANDLES.iloc[1000:2000])
+    assert_equal(b, CANDLES.iloc[1000:2000])
+    assert len(db.calls) == 1 and cache.stats["coalesced"] == 1
+
+
+def test_overlapping_ranges_query_only_uncovered_parts(db, cache):
+    async def main():
+        await cache.load_candles("BTCUSDT", "15m", TS[1000], TS[2000])
+        assert_equal(await cache.load_candles("BTCUSDT", "15m", TS[1200], TS[1800]), CANDLES.iloc[1200:1800])
+        assert len(db.calls) == 1
+
+        assert_equal(await cache.load_candles("BTCUSDT", "15m", TS[500], TS[2500]), CANDLES.iloc[500:2500])
+        assert db.calls[1:] == [(TS[500], TS[1000]), (TS[2000], TS[2500])]
+        assert len(cache.segments[("BTCUSDT", "15m")]) == 1
+
+        await cache.load_candles("BTCUSDT", "15m", TS[3000], TS[3500])
+        assert_equal(await cache.load_candles("BTCUSDT", "15m", TS[0], TS[4000]), CANDLES.iloc[:4000])
+        assert len(cache.segments[("BTCUSDT", "15m")]) == 1
+
+    asyncio.run(main())
+
+
+def test_saved_candles_replace_cached_ones(cache):
+    async def main():
+        await cache.load_candles("BTCUSDT", "15m", TS[1000], TS[3000])
+        changed = CANDLES.iloc[2000:2010] * 2
+        await cache.save_candles("BTCUSDT", "15m", changed)
+        assert_equal((await cache.load_candles("BTCUSDT", "15m", TS[1990], TS[2020])).iloc[10:20], changed)
+
+    asyncio.run(main())
+
+
+def test_lagging_tail_is_loaded_later(db, cache):
+    async def main():
+        # db tail lags behind - candles saved later by another process are loaded
+        db.candles = CANDLES.iloc[:4500]
+        assert_equal(await cache.load_candles("BTCUSDT", "15m", TS[4000], TS[4999]), CANDLES.iloc[4000:4500])
+        db.candles = CANDLES
+        assert_equal(await cache.load_candles("BTCUSDT", "15m", TS[4000], TS[4999]), CANDLES.iloc[4000:4999])
+        assert db.calls[-1] == (TS[4500], TS[4999])
+
+    asyncio.run(main())
+
+
+def test_least_recently_used_key_is_evicted(cache):
+    async def main():
+        await cache.load_candles("BTCUSDT", "15m", TS[0], TS[4000])
+        cache.max_size = cache.size + 1000
+        await cache.load_candles("ETHUSDT", "15m", TS[0], TS[1000])
+
+    asyncio.run(main())
+    assert ("BTCUSDT", "15m") not in cache.segments and cache.stats["evictions"] == 1
@@ -0,0 +1,73 @@
+import asyncio
+
+from core.exchange.common.message_queue import MessageQueue
+from core.types import OverflowPolicy
+
+
+def depth_key(message):
+    # ("symbol", is coalescable, payload)
+    return message[0] if message[1] else None
+
+
+def test_drop_oldest():
+    async def main():
+        queue = MessageQueue(3)
+        for i in range(5):
+            queue.put_nowait(i)
+        assert await queue.get_batch() == [2, 3, 4]
+        assert queue.dropped == 2
+
+    asyncio.run(main())
+
+
+def test_coalesce_replaces_in_place_and_evicts_oldest_keyed():
+    async def main():
+        queue = MessageQueue(3, OverflowPolicy.COALESCE, coalesce_key=depth_key)
+        for m in [("a", True, 1), ("b", False, 1), ("a", True, 2), ("b", False, 2), ("c", True, 1)]:
+            queue.put_nowait(m)
+        assert await queue.get_batch() == [("b", False, 1), ("b", False, 2), ("c", True, 1)]
+        assert queue.coalesced == 1 and queue.dropped == 1
+
+    asyncio.run(main())
+
+
+def test_coalesce_waits_while_only_keyless_messages_are_queued():
+    async def main():
+        # keyless messages are kept: the keyed one is evicted, then `put` waits for the consumer
+        queue = MessageQueue(2, OverflowPolicy.COALESCE, coalesce_key=depth_key)
+        await queue.put(("a", True, 1))
+        await queue.put(("t", False, 1))
+        await queue.put(("t", False, 2))
+        put = asyncio.create_task(queue.put(("t", False, 3)))
+        await asyncio.sleep(0.01)
+        assert not put.done() and queue.dropped == 1
+
+        assert await queue.get_batch(1) == [("t", False, 1)]
+        await put
+        assert await queue.get_batch() == [("t", False, 2), ("t", False, 3)]
+        assert queue.dropped == 1
+
+    asyncio.run(main())
+
+
+def test_block_keeps_every_message_within_max_size():
+    async def main():
+        queue = MessageQueue(2, OverflowPolicy.BLOCK)
+        consumed = []
+
+        async def consumer():
+            while len(consumed) < 10:
+                consumed.extend(await queue.get_batch(1))
+                await asyncio.sleep(0.001)
+
+        task = asyncio.create_task(consumer())
+        for i in range(10):
+            await queue.put(i)
+            assert len(queue) <= 2
+        await task
+
+        assert consumed == list(range(10))
+        metrics = queue.metrics()
+        assert metrics["dropped"] == 0 and metrics["max_depth"] <= 2
+
+    asyncio.run(main())
@@ -0,0 +1,52 @@
+from core.exchange.common.order_book import OrderBook
+
+BIDS = [(100.0, 1.0), (99.0, 2.0)]
+ASKS = [(101.0, 1.0), (102.0, 2.0)]
+
+
+def test_spot_updates_chain_by_first_update_id():
+    book = OrderBook()
+    assert book.apply_update(8, 10, [(100.0, 5.0)], [])  # buffered until the snapshot
+    assert book.apply_update(11, 12, [(99.0, 0.0)], [])
+    assert book.set_snapshot(10, BIDS, ASKS)
+
+    assert book.last_update_id == 12
+    assert book.depth(5)[0] == [(100.0, 1.0)]  # 8..10 is in the snapshot already
+
+    assert not book.apply_update(14, 15, [], [])  # 13 is missing
+    assert not book.is_synced
+
+
+def test_futures_updates_chain_by_previous_final_update_id():
+    book = OrderBook()
+    book.set_snapshot(100, BIDS, ASKS)
+
+    # futures U is not previous u + 1 - events are chained by pu
+    assert book.apply_update(90, 105, [(100.0, 3.0)], [], 89)
+    assert book.apply_update(110, 120, [(98.0, 1.0)], [], 105)
+    assert book.apply_update(125, 130, [], [(101.0, 0.0)], 120)
+    assert book.last_update_id == 130
+    assert book.top_bid() == (100.0, 3.0) and book.top_ask() == (102.0, 2.0)
+
+    assert not book.apply_update(140, 150, [], [], 135)
+    assert not book.is_synced
+
+
+def test_futures_first_event_must_cover_snapshot():
+    book = OrderBook()
+    book.set_snapshot(100, BIDS, ASKS)
+
+    assert book.apply_update(80, 95, [(100.0, 9.0)], [], 79)  # older than the snapshot
+    assert book.top_bid() == (100.0, 1.0)
+    assert not book.apply_update(101, 110, [], [], 95)  # 100 is not covered
+
+
+def test_failed_replay_keeps_pending_updates():
+    book = OrderBook()
+    book.apply_update(1, 5, [], [])
+    book.apply_update(20, 25, [], [])  # gap after a snapshot of 5
+    book.apply_update(26, 30, [(100.0, 7.0)], [])
+
+    assert not book.set_snapshot(5, BIDS, ASKS)
+    assert book.set_snapshot(19, BIDS, ASKS)  # next snapshot replays the rest
+    assert book.last_update_id == 30 and book.top_bid() == (100.0, 7.0)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.ta.ta import add_bound_levels, add_breakouts, get_sup_resist_peaks, get_volume_levels
+from tools.backtesting.data_processor import plot_df
+
+
+@pytest.fixture
+def candles() -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    size = 1000
+    c = 100 + np.cumsum(rng.normal(0, 0.5, size))
+    v = rng.lognormal(0, 0.5, size)
+    v[rng.choice(size, 20, replace=False)] *= 12
+    return pd.DataFrame({"o": c, "h": c + 0.3, "l": c - 0.3, "c": c + 0.1, "v": v},
+                        index=pd.date_range("2022-01-01", periods=size, freq="1h", name="timestamp"))
+
+
+def test_sup_resist_peaks_are_float64(candles):
+    up, down, levels = get_sup_resist_peaks(candles)
+
+    assert up.dtype == down.dtype == levels.dtype == np.float64
+    assert len(levels) == len(up) + len(down) > 0
+
+
+def test_bound_levels_on_peaks(candles):
+    _, _, df = get_volume_levels(candles.copy(), backtesting=True)
+    _, _, levels = get_sup_resist_peaks(df)
+
+    add_bound_levels(df, levels.values)
+    add_breakouts(df)
+
+    c = df["c"].to_numpy()
+    resistance = df["resistance_level"].to_numpy()
+    has_resistance = ~np.isnan(resistance)
+    assert has_resistance.any() and (resistance[has_resistance] >= c[has_resistance]).all()
+    assert df["breakout_up"].dtype == bool
+
+
+def test_plot_df(candles):
+    fig = plot_df(candles.copy(), "BTCUSDT_1h")
+
+    assert len(fig.data) > 0
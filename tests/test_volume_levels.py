@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.ta.ta import get_volume_levels
+from core.ta.volume_levels import VolumeLevelTracker
+
+LEVEL_TOLERANCE = 0.02
+
+
+@pytest.fixture(scope="module")
+def candles() -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    size = 2000
+    v = rng.lognormal(0, 0.5, size)
+    v[rng.choice(size, 30, replace=False)] *= 12
+    c = 100 + np.cumsum(rng.normal(0, 0.1, size))
+    return pd.DataFrame({"c": c, "v": v}, index=pd.date_range("2022-01-01", periods=size, freq="1min"))
+
+
+def batch_level(candles: pd.DataFrame) -> float:
+    return get_volume_levels(candles[["c", "v"]].copy())[-1][2]
+
+
+def test_from_candles_matches_batch(candles):
+    tracker = VolumeLevelTracker.from_candles(candles)
+
+    assert tracker.v_level == batch_level(candles)
+    assert len(tracker.levels) == len(get_volume_levels(candles[["c", "v"]].copy()))
+
+
+def test_update_follows_batch(candles):
+    warmup = 1500
+    tracker = VolumeLevelTracker.from_candles(candles.iloc[:warmup])
+
+    diffs = []
+    for i in range(warmup, len(candles)):
+        v_level, _ = tracker.update(candles["c"].iat[i], candles["v"].iat[i])
+        expected = batch_level(candles.iloc[:i + 1])
+        diffs.append(abs(v_level - expected) / expected)
+
+    assert max(diffs) < LEVEL_TOLERANCE
+
+
+def test_from_candles_without_levels():
+    tracker = VolumeLevelTracker.from_candles(pd.DataFrame({"c": [1.0, 1.0], "v": [1.0, 2.0]}))
+
+    assert tracker.v_level is None and tracker.levels == []
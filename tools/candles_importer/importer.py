@@ -1,20 +1,24 @@
 from core.exchange.protectors.binance_request_limiter import BinanceRequestLimiter
 from core.exchange.binance import PublicBinance, PublicFuturesBinance
+from core.exchange.binance.public import MAX_REQUEST_ATTEMPTS
 from core.base import CoreBase
 from core.types import RestMethod, Symbol, Tf, SymbolStr
-from typing import Dict, List, Any, Tuple, Optional
-from core.utils.data import candles_to_data_frame
+from typing import Dict, List, Any, Tuple, Optional, Callable, Awaitable
+from core.utils.data import klines_to_data_frame
 from core.utils.utils import string_to_date, get_cluster_size
-from core.utils.timeframe import tf_size_minutes, round_time_to_tf, get_time_shift
+from core.utils.logs import add_traceback
+from core.utils.resample import resample_candles
+from core.utils.timeframe import tf_size_minutes, round_time_to_tf, get_time_pages
 from core.db import TimesScaleDb
+from core.exceptions import apiExceptionFactory
 from core.exchange.common.mappers import symbol_to_binance, binance_to_symbol
 
-from core.exchange.binance.common import get_filter_value
 from datetime import datetime, timezone, timedelta
 import os
 import logging
 import asyncio
 import sys
+import time
 
 BASE_URI = "https://api.binance.com/api/v3"
 BASE_FUTURES_URI = "https://api.binance.com/api/v3"
@@ -22,6 +26,10 @@ MAX_CANDLES = os.getenv("MAX_CANDLES", 1000)
 CANDLES_TIMEFRAMES = os.getenv("CANDLES_TIMEFRAMES", "1d,4h,1h,15m").split(",")
 IMPORT_DATE_FROM = os.getenv("IMPORT_DATE_FROM", "01-01-2017")
 IMPORT_DATE_TO = os.getenv("IMPORT_DATE_TO", None)
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", 4))
+# set (e.g. "15m") - only this tf is downloaded, other CANDLES_TIMEFRAMES are rolled up from it locally
+CANDLES_BASE_TIMEFRAME = os.getenv("CANDLES_BASE_TIMEFRAME", None)
+DERIVE_WINDOW = timedelta(days=30)  # base candles loaded per rollup step (buckets never cross midnight)
 
 
 # IMPORTER_INFLUX_DB_HOST = os.getenv("IMPORTER_INFLUX_DB_HOST", "5.75.137.107")
@@ -29,7 +37,6 @@ IMPORT_DATE_TO = os.getenv("IMPORT_DATE_TO", None)
 
 class CandlesImporter(object):
     request_limiter = BinanceRequestLimiter()
-    last_url_response = None
     db: TimesScaleDb = None
 
     def __init__(self, db: TimesScaleDb, date_from: Optional[str] = None, date_to: Optional[str] = None):
@@ -38,6 +45,7 @@ class CandlesImporter(object):
         self.db = db
         self.date_from = None
         self.date_to = None
+        self.imported_candles = 0
 
     async def init(self):
         # await self.db.init()
@@ -54,14 +62,7 @@ class CandlesImporter(object):
     async def init_spot(self):
         content = await self.request_url("/exchangeInfo")
 
-        rate_limits = content["rateLimits"]
-        weight_limit_1m = int(get_filter_value(rate_limits, "REQUEST_WEIGHT", "limit", name_of_filter="rateLimitType"))
-        raw_requests_5m = int(
-            get_filter_value(
-                rate_limits, "RAW_REQUESTS", "limit", name_of_filter="rateLimitType", default=weight_limit_1m,
-            )
-        )
-        self.request_limiter.init(weight_limit_1m, raw_requests_5m)
+        self.request_limiter.init(content["rateLimits"])
 
         self.spot_symbols = [s['symbol'] for s in content["symbols"]
                              if s["isSpotTradingAllowed"] and s["quoteAsset"] == "USDT"]
@@ -83,14 +84,21 @@ class CandlesImporter(object):
             headers: Dict = {},
             base_url: str = BASE_URI,
     ) -> Any:
-        await self.request_limiter.delay(self.last_url_response)
+        for attempt in range(MAX_REQUEST_ATTEMPTS):
+            await self.request_limiter.acquire(url, params, method)
 
-        content, _ = await CoreBase.get_request().request_json(f"{base_url}{url}", method,
-                                                               params=params, headers=headers)
-        self.last_url_response = _
-        if _.status != 200:
+            content, _ = await CoreBase.get_request().request_json(f"{base_url}{url}", method,
+                                                                   params=params, headers=headers)
+            self.request_limiter.update(_)
+            if _.status == 200:
+                return content
+
+            if _.status in [418, 429] and attempt < MAX_REQUEST_ATTEMPTS - 1:
+                continue  # limiter holds next request until retry-after
+
+            # rate limit / server error must not end the import as if history were complete
             logging.error(f"{_.url} {_.reason}")
-        return content
+            raise apiExceptionFactory(content=content if isinstance(content, dict) else {}, response=_)
 
     async def _load_candles(
             self,
@@ -112,20 +120,7 @@ class CandlesImporter(object):
 
         content = await self.request_url(f"/klines", RestMethod.GET, params=params)
 
-        candles = [
-            [
-                datetime.utcfromtimestamp(c[0] / 1e3),
-                float(c[1]),
-                float(c[2]),
-                float(c[3]),
-                float(c[4]),
-                float(c[5]),
-            ]
-            for c in content
-        ]
-
-        return candles_to_data_frame(candles)
-        # return candles
+        return klines_to_data_frame(content)
 
     async def load_candles(
             self,
@@ -133,80 +128,170 @@ class CandlesImporter(object):
             tf: Tf = "1m",
             start_time: Optional[datetime] = None,
             end_time: Optional[datetime] = None,
-    ):
-        candle_size_minutes = tf_size_minutes(tf)
-
-        async def load_candles_with_cache(from_time, to_time):
-            if (to_time - from_time) <= timedelta(minutes=candle_size_minutes):  # *2
-                return candles_to_data_frame([])
-
-            candles_batch = await self._load_candles(symbol, tf, from_time, to_time)
-            if len(candles_batch) == 0:
-                return candles_to_data_frame([])
-
-            await self.db.save_candles(symbol_to_binance(symbol), tf, candles_batch)
-            return candles_batch
-
-        end_time = round_time_to_tf(
-            end_time or datetime.utcnow(), tf
-        ) - timedelta(minutes=1)  # exclude LAST CANDLE
+    ) -> int:
+        # forward from the last stored candle (checkpoint) or start_time, every page is saved before the next
+        # request, so the DB tail is always the resume point. Returns number of imported candles
+        symbol_str = symbol_to_binance(symbol)
+        candle_size = timedelta(minutes=tf_size_minutes(tf))
+        end_time = round_time_to_tf(end_time or datetime.utcnow(), tf)  # exclude LAST (unclosed) CANDLE
 
-        # end_time = end_time or datetime.utcnow()
-        start_time = start_time or get_time_shift(end_time, candle_size_minutes)
+        last_timestamp = await self.db.load_last_candle_timestamp(symbol_str, tf)
+        if last_timestamp is not None:
+            start_time = last_timestamp + candle_size
+        start_time = start_time or datetime.strptime(IMPORT_DATE_FROM, '%d-%m-%Y')
 
         logging.info(f"Import candles: {symbol}_{tf} - {start_time} - {end_time}.")
+        imported = 0
+        started = time.monotonic()
+        while start_time < end_time:
+            # endTime is not set - binance returns the first candles after startTime (skips pre listing range)
+            candles = await self._load_candles(symbol, tf, start_time)
+            candles = candles[candles.index < end_time]
+            if len(candles) == 0:
+                break
+
+            await self.db.save_candles(symbol_str, tf, candles)
+            imported += len(candles)
+            start_time = candles.index[-1] + candle_size
+
+        elapsed = time.monotonic() - started
+        self.imported_candles += imported
+        logging.info(f"Import candles: {symbol}_{tf} DONE. {imported} candles, "
+                     f"{imported / elapsed if elapsed > 0 else 0:.0f} candles/s")
+        return imported
+
+    async def derive_candles(self, symbol: Symbol, tf: Tf, base_tf: Tf, start_time: Optional[datetime] = None,
+                             end_time: Optional[datetime] = None) -> int:
+        # rollup of stored base candles, continues from the last stored candle of tf
+        symbol_str = symbol_to_binance(symbol)
+        candle_size = timedelta(minutes=tf_size_minutes(tf))
+        end_time = round_time_to_tf(end_time or datetime.utcnow(), base_tf)
+
+        last_timestamp = await self.db.load_last_candle_timestamp(symbol_str, tf)
+        if last_timestamp is not None:
+            start_time = last_timestamp + candle_size
+        start_time = start_time or datetime.strptime(IMPORT_DATE_FROM, '%d-%m-%Y')
+
+        logging.info(f"Derive candles: {symbol}_{tf} from {base_tf} - {start_time} - {end_time}.")
+        derived = 0
+        while start_time < end_time:
+            window_end = min(round_time_to_tf(start_time, "1d") + DERIVE_WINDOW, end_time)
+            base = await self.db.load_candles(symbol_str, base_tf, start_time, window_end)
+            # only the last window can end inside a bucket
+            candles = resample_candles(base, tf, base_tf if window_end == end_time else None)
+            if len(candles) > 0:
+                await self.db.save_candles(symbol_str, tf, candles)
+                derived += len(candles)
+            start_time = window_end
+
+        logging.info(f"Derive candles: {symbol}_{tf} DONE. {derived} candles")
+        return derived
 
-        start_time_ = get_time_shift(end_time, candle_size_minutes)
-
-        candles = await load_candles_with_cache(start_time_, end_time)
-
-        while len(candles) > 0 and candles.index[0] - timedelta(minutes=1) > start_time_:
-            end_time = candles.index[0] - timedelta(minutes=1)
-            start_time_ = get_time_shift(end_time, candle_size_minutes)
-
-            candles = await load_candles_with_cache(start_time_, end_time)
-
-        logging.info(f"Import candles: {symbol}_{tf} DONE.")
-
-    async def import_symbol(self, symbol: Symbol, date_from: Optional[datetime]=None,
-                            tfs: List[Tf]=CANDLES_TIMEFRAMES):
+    async def import_symbol(self, symbol: Symbol, date_from: Optional[datetime] = None,
+                            tfs: List[Tf] = CANDLES_TIMEFRAMES):
         symbol_str = symbol_to_binance(symbol)
         start_import = datetime.utcnow()
 
-        for tf in tfs:
-            d_from = date_from
-            if d_from is None:
-                d_from = (await self.db.get_symbol_status(symbol=symbol_str))["last_sync"]
-                if d_from is None:
-                    d_from = datetime.strptime("01-01-2017", '%d-%m-%Y')
-
-            await self.load_candles(symbol, Tf(tf), d_from, self.date_to)
+        if CANDLES_BASE_TIMEFRAME:
+            base_tf = Tf(CANDLES_BASE_TIMEFRAME)
+            await self.load_candles(symbol, base_tf, date_from, self.date_to)
+            for tf in tfs:
+                if tf != base_tf:
+                    await self.derive_candles(symbol, Tf(tf), base_tf, date_from, self.date_to)
+        else:
+            for tf in tfs:
+                await self.load_candles(symbol, Tf(tf), date_from, self.date_to)
 
         await self.db.update_symbol_status_one_value(symbol_str, last_sync=start_import)
 
-    async def import_symbol(self, symbol: Symbol, date_from: Optional[datetime] = None,
-                            tfs: List[Tf] = CANDLES_TIMEFRAMES):
+    async def repair_gaps(self, symbol: Symbol, tf: Tf, start_time: Optional[datetime] = None,
+                          end_time: Optional[datetime] = None) -> int:
+        # holes inside stored history (the checkpoint only moves the tail): only the pages of missing ranges
+        # are requested. Ranges binance has no candles for (outages) are found again on the next scan
         symbol_str = symbol_to_binance(symbol)
-        start_import = datetime.utcnow()
+        gaps = await self.db.load_candle_gaps(symbol_str, tf, start_time, end_time)
+        if len(gaps) == 0:
+            return 0
 
-        for tf in tfs:
-            d_from = date_from
-            if d_from is None:
-                d_from = (await self.db.get_symbol_status(symbol=symbol_str))["last_sync"]
-                if d_from is None:
-                    d_from = datetime.strptime("01-01-2017", '%d-%m-%Y')
+        candle_size_minutes = tf_size_minutes(tf)
+        pages = [page for gap_from, gap_to in gaps for page in get_time_pages(gap_from, gap_to, candle_size_minutes)]
+        logging.info(f"Repair candles: {symbol}_{tf} - {len(gaps)} gaps, {len(pages)} pages.")
+
+        repaired = 0
+        for page_from, page_to in pages:
+            candles = await self._load_candles(symbol, tf, page_from, page_to)
+            if len(candles) > 0:
+                await self.db.save_candles(symbol_str, tf, candles)
+                repaired += len(candles)
+
+        self.imported_candles += repaired
+        logging.info(f"Repair candles: {symbol}_{tf} DONE. {repaired} candles")
+        return repaired
+
+    async def repair_derived_gaps(self, symbol: Symbol, tf: Tf, base_tf: Tf, start_time: Optional[datetime] = None,
+                                  end_time: Optional[datetime] = None) -> int:
+        # holes of a rolled up tf are derived again from stored base candles of the missing buckets
+        symbol_str = symbol_to_binance(symbol)
+        candle_size = timedelta(minutes=tf_size_minutes(tf))
+        repaired = 0
+        for gap_from, gap_to in await self.db.load_candle_gaps(symbol_str, tf, start_time, end_time):
+            base = await self.db.load_candles(symbol_str, base_tf, gap_from, gap_to + candle_size)
+            candles = resample_candles(base, tf, base_tf)
+            if len(candles) > 0:
+                await self.db.save_candles(symbol_str, tf, candles)
+                repaired += len(candles)
+
+        return repaired
+
+    async def repair_symbol(self, symbol: Symbol, date_from: Optional[datetime] = None,
+                            tfs: List[Tf] = CANDLES_TIMEFRAMES):
+        if CANDLES_BASE_TIMEFRAME:
+            base_tf = Tf(CANDLES_BASE_TIMEFRAME)
+            await self.repair_gaps(symbol, base_tf, date_from, self.date_to)
+            for tf in tfs:
+                if tf != base_tf:
+                    await self.repair_derived_gaps(symbol, Tf(tf), base_tf, date_from, self.date_to)
+        else:
+            for tf in tfs:
+                await self.repair_gaps(symbol, Tf(tf), date_from, self.date_to)
+
+    async def run_all(self, job: Callable[[Symbol, Optional[datetime]], Awaitable[Any]], name: str,
+                      concurrency: int = IMPORT_CONCURRENCY):
+        # N symbols at once, requests share the class request_limiter (db should use a pool)
+        queue: asyncio.Queue = asyncio.Queue()
+        for symbol in self.exportable_symbols:
+            queue.put_nowait(symbol)
 
-            await self.load_candles(symbol, Tf(tf), d_from, self.date_to)
+        total = len(self.exportable_symbols)
+        done = 0
+        self.imported_candles = 0
+        started = time.monotonic()
 
-        await self.db.update_symbol_status_one_value(symbol_str, last_sync=start_import)
+        async def worker():
+            nonlocal done
+            while not queue.empty():
+                symbol = queue.get_nowait()
+                try:
+                    await job(binance_to_symbol(symbol), self.date_from)
+                except Exception as e:
+                    logging.error(f"{name} of {symbol} failed. {add_traceback(e)}")
 
-    async def import_all(self):
-        total = len(self.exportable_symbols)
-        for i, symbol in enumerate(self.exportable_symbols):
-            await self.import_symbol(binance_to_symbol(symbol), self.date_from)
-            logging.info(f"Imported of {symbol} ({i}/{total}) DONE.")
+                done += 1
+                elapsed = time.monotonic() - started
+                logging.info(f"{name} of {symbol} ({done}/{total}) DONE. "
+                             f"{self.imported_candles / elapsed:.0f} candles/s")
+
+        await asyncio.gather(*[worker() for _ in range(min(concurrency, max(total, 1)))])
+
+        elapsed = time.monotonic() - started
+        logging.info(f"{name} ALL from {self.date_from} to {self.date_to}: {self.imported_candles} candles "
+                     f"in {elapsed:.0f}s - {self.imported_candles / elapsed if elapsed > 0 else 0:.0f} candles/s")
+
+    async def import_all(self, concurrency: int = IMPORT_CONCURRENCY):
+        await self.run_all(self.import_symbol, "Import", concurrency)
 
-        logging.info(f"Imported  ALL from {self.date_from} to {self.date_to}")
+    async def repair_all(self, concurrency: int = IMPORT_CONCURRENCY):
+        await self.run_all(self.repair_symbol, "Repair", concurrency)
 
 
 async def get_symbol_names():
@@ -247,6 +332,7 @@ if __name__ == "__main__":
         # 2022-11-17 18:03:12.994060
         await ce.init()
         # await ce.import_all()
+        # await ce.repair_all()
 
         last_sync = string_to_date("2022-11-21 12:00:00")
         names =  await get_symbol_names()
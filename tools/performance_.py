@@ -5,12 +5,15 @@ import asyncio
 import asyncpg
 import logging
 import time
+import tracemalloc
+import pandas as pd
 import psycopg2
 from pgcopy import CopyManager
 from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
 from influxdb_client.client.write_api import PointSettings
 from motor import motor_asyncio as momo
 from urllib.parse import quote_plus
+from core.db.binary_copy import BinaryCopyParser, CANDLES_BINARY_COLUMNS
 
 def get_influxdb():
     return InfluxDBClientAsync(
@@ -190,6 +193,34 @@ async def perf_mongo_ins(client, data):
         await client.insert_many(candles.to_dict('records'))
 
 
+async def load_candles_records(conn, sql, *args):
+    # TimesScaleDb.fetch_as_dataframe before binary copy
+    stmt = await conn.prepare(sql)
+    columns = [a.name for a in stmt.get_attributes()]
+    data = await stmt.fetch(*args)
+    return pd.DataFrame(data, columns=columns).set_index("timestamp")
+
+
+async def load_candles_binary(conn, sql, *args):
+    parser = BinaryCopyParser(CANDLES_BINARY_COLUMNS)
+    await conn.copy_from_query(sql, *args, output=parser.feed, format="binary")
+    return parser.to_data_frame("timestamp")
+
+
+async def perf_load_candles(conn, symbol_tf_id):
+    # rows/s and peak python memory (numpy allocations are traced too)
+    sql = "SELECT timestamp, o, h, l, c, v FROM candles WHERE symbol_tf_id = $1 ORDER BY timestamp ASC"
+    for name, load in [("records", load_candles_records), ("binary", load_candles_binary)]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        df = await load(conn, sql, symbol_tf_id)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name}: {len(df)} rows in {elapsed:.2f}s - {len(df) / elapsed:.0f} rows/s, "
+              f"peak memory {peak / 2 ** 20:.1f} MB")
+
+
 if __name__ == "__main__":
     logging.getLogger().setLevel(logging.INFO)
 
@@ -213,6 +244,10 @@ if __name__ == "__main__":
             print(end - start)
         except Exception as e:
             print(e)
+    # async def main():
+    #     conn = await get_asyncpg_conn()
+    #     await perf_load_candles(conn, symbol_tf_id=1)
+
     # async def main():
     #     try:
     #         conn = get_influxdb()